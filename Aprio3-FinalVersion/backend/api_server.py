@@ -4,17 +4,34 @@ Author: Ludjina
 Description: REST API endpoints for running RHAPSODY algorithm and evaluating policies
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_file, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 import os
-import pandas as pd
-from werkzeug.utils import secure_filename
-import threading
+import json
+import base64
+import hashlib
+import mimetypes
+import numpy as np
+from werkzeug.utils import secure_filename, safe_join
+from werkzeug.wsgi import get_input_stream
+import multiprocessing
+import queue
+import shutil
 import time
+import uuid
+from itertools import chain
 
 # Import our custom modules
-from rhapsody_algorithm import RhapsodyAlgorithm
-from policy_evaluator import PolicyEvaluator
+# pandas and the mining modules are imported by the endpoints that need them,
+# so an evaluation-only node starts without loading them
+from policy_store import PolicyStore, load_policy_artifact
+from policy_registry import PolicyRegistry, POLICY_ID_PATTERN
+from job_manager import (JobManager, preview_file_for, QUEUED, RUNNING, COMPLETED, CANCELLED, FINISHED_STATES,
+                         MINING_JOB, COVERAGE_JOB)
+from compression import negotiate_encoding, compress_response, compressed_copy
+from shared_policy import SharedPolicyWatcher, publish_compiled_policy, withdraw_compiled_policy, load_compiled_artifact
+from policy_diff import diff_policies, summarize_delta
+from evaluation_batcher import EvaluationBatcher
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
@@ -32,10 +49,27 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['RESULTS_FOLDER'] = RESULTS_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Global variables to store algorithm state
-rhapsody_instance = None
-policy_evaluator = None
-mining_status = {
+# Mining job settings
+JOBS_FOLDER = os.path.join(RESULTS_FOLDER, 'jobs')
+MAX_CONCURRENT_JOBS = int(os.environ.get('RHAPSODY_MAX_CONCURRENT_JOBS', 2))
+JOB_TIMEOUT = float(os.environ['RHAPSODY_JOB_TIMEOUT']) if os.environ.get('RHAPSODY_JOB_TIMEOUT') else None
+STATUS_STREAM_KEEPALIVE = 15  # seconds between keep-alive comments on idle status streams
+
+# Multi-worker serving: compiled policy shared by all worker processes (see serve.py)
+SHARED_POLICY_DIR = os.environ.get('RHAPSODY_SHARED_POLICY_DIR')
+
+# Named policies (e.g. one per dataset) loaded on demand under a memory ceiling
+POLICIES_FOLDER = os.path.join(RESULTS_FOLDER, 'policies')
+POLICY_MEMORY_LIMIT = int(float(os.environ.get('RHAPSODY_POLICY_MEMORY_MB', 512)) * 1024 * 1024)
+
+# Warm start: policy artifact restored on boot and its compiled, memory-mapped cache
+POLICY_ARTIFACT = os.environ.get('RHAPSODY_POLICY_ARTIFACT', os.path.join(RESULTS_FOLDER, 'latest_results.json'))
+WARM_START_CACHE = os.path.join(RESULTS_FOLDER, 'warm_start')
+
+# Identifier -> inferred attribute caches shared by all mining jobs
+ATTRIBUTE_CACHE = os.path.join(RESULTS_FOLDER, 'attribute_cache')
+
+INITIAL_MINING_STATUS = {
     'is_running': False,
     'progress': 0,
     'stage': '',
@@ -44,88 +78,148 @@ mining_status = {
     'error': None
 }
 
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def reset_mining_status():
-    """Reset mining status to initial state"""
-    global mining_status
-    mining_status = {
-        'is_running': False,
-        'progress': 0,
-        'stage': '',
-        'message': '',
-        'complete': False,
-        'error': None
-    }
+def publish_job_results(job):
+    """Publish the policy mined by a completed job"""
+    if job['params'].get('kind') == COVERAGE_JOB:
+        # Coverage reports are read through the job endpoints; nothing to publish
+        return {'policy_version': job['params']['policy_version']}
+    
+    policy_evaluator, statistics = load_policy_artifact(job['result_file'])
+    shutil.copyfile(job['result_file'], os.path.join(app.config['RESULTS_FOLDER'], 'latest_results.json'))
+    
+    if job['params'].get('policy_id'):
+        policy_registry.register(job['params']['policy_id'], job['result_file'])
+    
+    if shared_policy_watcher:
+        # Compile into the shared directory; every worker maps it on its next request
+        version = publish_compiled_policy(policy_evaluator, SHARED_POLICY_DIR, statistics)
+        shared_policy_watcher.refresh(force=True)
+        return {'policy_version': version}
+    
+    current = policy_store.current()
+    if current is None:
+        # Swap in the new policy; requests already running keep the old snapshot
+        snapshot = policy_store.publish(policy_evaluator, statistics)
+        return {'policy_version': snapshot.version}
+    
+    # Move a copy of the served policy by its differences to the new one, so
+    # only added rules are compiled and unaffected cached decisions survive
+    delta = diff_policies(current.evaluator, policy_evaluator)
+    evaluator = current.evaluator.copy()
+    applied = evaluator.apply_delta(delta)
+    snapshot = policy_store.publish(evaluator, statistics)
+    print(f"Published policy version {snapshot.version} as a delta: {applied}")
+    return {'policy_version': snapshot.version, 'policy_delta': {**delta['summary'], **applied}}
 
 
-def update_mining_status(progress, stage, message):
-    """Update mining status"""
-    global mining_status
-    mining_status.update({
-        'progress': progress,
-        'stage': stage,
-        'message': message
-    })
+def current_snapshot():
+    """Get the policy snapshot to serve this request with"""
+    if shared_policy_watcher:
+        shared_policy_watcher.refresh()
+    return policy_store.current()
+
+
+def resolve_snapshot(policy_id=None):
+    """
+    Get the snapshot for a named policy, or the current mined policy
+
+    Raises:
+        KeyError: If ``policy_id`` is not registered
+    """
+    if policy_id:
+        return policy_registry.get(policy_id)
+    return current_snapshot()
+
+
+def unknown_policy_response(policy_id):
+    return jsonify({'error': f'Unknown policy: {policy_id}'}), 404
 
 
-def run_rhapsody_mining(data_path, T, K, selected_columns):
-    """Run RHAPSODY mining in a separate thread"""
-    global rhapsody_instance, policy_evaluator, mining_status
+def resolve_results_file(job_id=None, results_file=None):
+    """
+    Find the results JSON of a completed job or under RESULTS_FOLDER
+
+    Returns:
+        Tuple: (path, None), or (None, error response) if it is not available
+    """
+    if job_id:
+        job = job_manager.get(job_id)
+        if job is None:
+            return None, (jsonify({'error': 'Job not found'}), 404)
+        if job['status'] != COMPLETED:
+            return None, (jsonify({'error': f"Job is {job['status']}, no result available"}), 409)
+        return job['result_file'], None
+    if results_file:
+        path = safe_join(app.config['RESULTS_FOLDER'], results_file)
+        if path is None or not os.path.isfile(path):
+            return None, (jsonify({'error': 'Results file not found'}), 404)
+        return path, None
+    return None, (jsonify({'error': 'job_id or results_file required'}), 400)
+
+
+def restore_latest_policy():
+    """Publish the last mined (or configured) policy so evaluation works right after a restart"""
+    if shared_policy_watcher:
+        # Workers serve the shared pointer, which already survives restarts
+        return
+    if not os.path.exists(POLICY_ARTIFACT):
+        return
     
     try:
-        mining_status['is_running'] = True
-        mining_status['stage'] = 'Loading data'
-        mining_status['progress'] = 10
-        
-        # Initialize algorithm
-        update_mining_status(10, 'Initializing', 'Loading data and initializing algorithm...')
-        rhapsody_instance = RhapsodyAlgorithm(selected_columns=selected_columns)
-        
-        if not rhapsody_instance.load_data(data_path):
-            raise Exception("Failed to load data")
-        
-        mining_status['stage'] = 'Preprocessing data'
-        mining_status['progress'] = 20
-        mining_status['message'] = f'Processing {len(rhapsody_instance.data)} rows with {len(selected_columns)} columns'
+        start = time.time()
+        policy_evaluator, statistics = load_compiled_artifact(POLICY_ARTIFACT, WARM_START_CACHE)
+        snapshot = policy_store.publish(policy_evaluator, statistics)
+        print(f"Restored {len(policy_evaluator.rules)} rules from {POLICY_ARTIFACT} "
+              f"as policy version {snapshot.version} in {time.time() - start:.2f}s")
+    except Exception as e:
+        print(f"Could not restore policy from {POLICY_ARTIFACT}: {str(e)}")
 
-        # Stage 1
-        update_mining_status(25, 'Stage 1', 'Computing frequent rules...')
-        time.sleep(1)  # Simulate processing time
-        
-        # Stage 2
-        update_mining_status(50, 'Stage 2', 'Computing reliable rules...')
-        time.sleep(1)  # Simulate processing time
-        
-        # Stage 3
-        update_mining_status(75, 'Stage 3', 'Removing redundant rules...')
-        time.sleep(1)  # Simulate processing time
-        
-        # Run the algorithm
-        final_rules, nUP, nA = rhapsody_instance.run_algorithm(T, K)
-        
-        # Initialize policy evaluator with results
-        policy_evaluator = PolicyEvaluator(final_rules)
-        policy_evaluator.rule_statistics = {'nUP': nUP, 'nA': nA}
 
-        policy_evaluator.set_available_attributes(selected_columns)
-        
-        # Save results
-        results_file = os.path.join(app.config['RESULTS_FOLDER'], 'latest_results.json')
-        rhapsody_instance.save_results(results_file)
-        
-        update_mining_status(100, 'Complete', f'Mining complete! Found {len(final_rules)} rules.')
-        mining_status['complete'] = True
-        mining_status['is_running'] = False
-        
-    except Exception as e:
-        mining_status['error'] = str(e)
-        mining_status['is_running'] = False
-        print(f"Mining error: {e}")
+def mining_status_view(job):
+    """Describe a job in the original /api/status format"""
+    if job is None:
+        return dict(INITIAL_MINING_STATUS)
+    
+    error = job['error']
+    if job['status'] == CANCELLED:
+        error = job['message']
+    
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'is_running': job['status'] in (QUEUED, RUNNING),
+        'progress': job['progress'],
+        'stage': job['stage'],
+        'message': job['message'],
+        'complete': job['status'] == COMPLETED,
+        'error': error,
+        'policy_version': job.get('policy_version'),
+        'policy_delta': job.get('policy_delta'),
+        'preview': job.get('preview'),
+        'profile_files': job.get('profile_files')
+    }
+
+
+# Global variables to store algorithm state
+# Endpoints read policy_store.current() once per request and keep that snapshot
+policy_store = PolicyStore()
+shared_policy_watcher = SharedPolicyWatcher(SHARED_POLICY_DIR, policy_store) if SHARED_POLICY_DIR else None
+policy_registry = PolicyRegistry(POLICIES_FOLDER, max_bytes=POLICY_MEMORY_LIMIT)
+job_manager = JobManager(JOBS_FOLDER, max_concurrent=MAX_CONCURRENT_JOBS,
+                         default_timeout=JOB_TIMEOUT, on_complete=publish_job_results)
+# Concurrent /api/evaluate calls are decided together in short windows
+evaluation_batcher = EvaluationBatcher()
+
+# Mining worker processes re-import this module; only the server restores the policy
+if multiprocessing.parent_process() is None:
+    restore_latest_policy()
 
 
 @app.route('/')
@@ -136,10 +230,14 @@ def index():
         'version': '1.0',
         'endpoints': [
             '/api/upload',
+            '/api/merge',
             '/api/mine',
             '/api/status',
+            '/api/jobs',
             '/api/rules',
+            '/api/policy_diff',
             '/api/evaluate',
+            '/api/coverage',
             '/api/reset'
         ]
     })
@@ -163,6 +261,7 @@ def upload_file():
             
             # Read and analyze CSV structure
             try:
+                import pandas as pd
                 df = pd.read_csv(filepath)
                 
                 # Get all columns
@@ -197,13 +296,50 @@ def upload_file():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/merge', methods=['POST'])
+def merge_uploads():
+    """Merge uploaded CSV files into one deduplicated upload for mining"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No parameters provided'}), 400
+        
+        filenames = data.get('filenames') or []
+        output = data.get('output')
+        columns = data.get('columns') or None
+        if not isinstance(filenames, list) or len(filenames) < 1:
+            return jsonify({'error': 'filenames must be a non-empty list'}), 400
+        if not output or not allowed_file(output):
+            return jsonify({'error': 'A CSV output filename is required'}), 400
+        
+        inputs = [os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(name)) for name in filenames]
+        missing = [name for name, path in zip(filenames, inputs) if not os.path.exists(path)]
+        if missing:
+            return jsonify({'error': f'Files not found: {missing}'}), 404
+        
+        from dataset_merge import merge_datasets
+        output_name = secure_filename(output)
+        try:
+            summary = merge_datasets(inputs, os.path.join(app.config['UPLOAD_FOLDER'], output_name), columns=columns)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'message': 'Files merged successfully',
+            'filename': output_name,
+            'columns': summary['columns'],
+            'rows_read': summary['rows_read'],
+            'rows': summary['unique_rows']
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/mine', methods=['POST'])
 def start_mining():
-    """Start RHAPSODY mining process"""
+    """Queue a RHAPSODY mining job"""
     try:
-        if mining_status['is_running']:
-            return jsonify({'error': 'Mining already in progress'}), 400
-        
         data = request.get_json()
         if not data:
             return jsonify({'error': 'No parameters provided'}), 400
@@ -213,6 +349,13 @@ def start_mining():
         T = data.get('T', 20)
         K = data.get('K', 0.5)
         selected_columns = data.get('selected_columns', [])  # NEW
+        closed = bool(data.get('closed', False))  # mine closed itemsets (same final rules, less work)
+        top_k = data.get('top_k')  # only the top_k highest-coverage rules
+        progressive = bool(data.get('progressive', False))  # preview on samples first
+        sample_sizes = data.get('sample_sizes')
+        infer_attributes = data.get('infer_attributes')  # preset deriving attributes from ID columns
+        collapse_rare = bool(data.get('collapse_rare', False))  # rare values become 'col=<rare>' atoms
+        profile = bool(data.get('profile', False))  # save per-stage profiles (see /api/download)
         
         if not filename:
             return jsonify({'error': 'Filename required'}), 400
@@ -220,32 +363,77 @@ def start_mining():
         if not selected_columns:
             return jsonify({'error': 'Selected columns required'}), 400
         
+        if top_k is not None:
+            try:
+                top_k = int(top_k)
+            except (TypeError, ValueError):
+                top_k = 0
+            if top_k < 1:
+                return jsonify({'error': 'top_k must be a positive integer'}), 400
+        
+        if sample_sizes is not None:
+            if not isinstance(sample_sizes, list) or not all(isinstance(size, int) and size > 0
+                                                            for size in sample_sizes):
+                return jsonify({'error': 'sample_sizes must be a list of positive integers'}), 400
+        
+        # Optional name to register the mined policy under (see /api/policies)
+        policy_id = data.get('policy_id')
+        if policy_id is not None and not POLICY_ID_PATTERN.match(str(policy_id)):
+            return jsonify({'error': "Policy ID must be 1-64 letters, digits, '.', '_' or '-'"}), 400
+        
         # Check if file exists
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 404
         
-        # Validate selected columns exist in the file
+        # Validate selected columns exist in the file (the header is enough)
         try:
-            df = pd.read_csv(filepath)
-            missing_cols = [col for col in selected_columns if col not in df.columns]
+            import pandas as pd
+            df = pd.read_csv(filepath, nrows=0)
+            available = list(df.columns)
+            if infer_attributes:
+                from attribute_inference import AttributeInference, PRESETS
+                if infer_attributes not in PRESETS:
+                    return jsonify({'error': f'Unknown attribute inference preset: {infer_attributes}'}), 400
+                inference = AttributeInference.from_preset(infer_attributes)
+                missing_sources = [col for col in inference.source_columns() if col not in df.columns]
+                if missing_sources:
+                    return jsonify({'error': f'Identifier columns not found in file: {missing_sources}'}), 400
+                available += inference.output_columns()
+            missing_cols = [col for col in selected_columns if col not in available]
             if missing_cols:
                 return jsonify({'error': f'Selected columns not found in file: {missing_cols}'}), 400
         except Exception as e:
             return jsonify({'error': f'Error reading file: {str(e)}'}), 400
         
-        # Reset status and start mining in background thread
-        reset_mining_status()
-        mining_thread = threading.Thread(
-            target=run_rhapsody_mining,
-            args=(filepath, int(T), float(K), selected_columns)  # Pass selected columns
-        )
-        mining_thread.daemon = True
-        mining_thread.start()
+        # Queue the job; it runs in a worker process when a slot is free
+        timeout = data.get('timeout')
+        job = job_manager.submit({
+            'data_path': filepath,
+            'filename': filename,
+            'T': int(T),
+            'K': float(K),
+            'selected_columns': selected_columns,
+            'closed': closed,
+            'top_k': top_k,
+            'progressive': progressive,
+            'sample_sizes': sample_sizes,
+            'policy_id': policy_id,
+            'infer_attributes': infer_attributes,
+            'collapse_rare': collapse_rare,
+            'profile': profile,
+            'profile_dir': app.config['RESULTS_FOLDER'],
+            'attribute_cache': ATTRIBUTE_CACHE
+        }, timeout=float(timeout) if timeout is not None else None)
         
         return jsonify({
             'message': 'Mining started successfully',
-            'parameters': {'T': T, 'K': K, 'filename': filename, 'selected_columns': selected_columns}
+            'job_id': job['id'],
+            'status': job['status'],
+            'parameters': {'T': T, 'K': K, 'filename': filename, 'selected_columns': selected_columns,
+                           'closed': closed, 'top_k': top_k, 'progressive': progressive,
+                           'policy_id': policy_id, 'infer_attributes': infer_attributes,
+                           'collapse_rare': collapse_rare, 'profile': profile}
         })
         
     except Exception as e:
@@ -253,30 +441,319 @@ def start_mining():
 
 @app.route('/api/status', methods=['GET'])
 def get_mining_status():
-    """Get current mining status"""
-    return jsonify(mining_status)
+    """Get status of the latest mining job (or of ?job_id=...)"""
+    job_id = request.args.get('job_id')
+    if job_id:
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+    else:
+        job = job_manager.latest(MINING_JOB)
+    return jsonify(mining_status_view(job))
+
+
+@app.route('/api/status/stream', methods=['GET'])
+def stream_mining_status():
+    """Push mining status changes as Server-Sent Events (same payload as /api/status)"""
+    job_id = request.args.get('job_id')
+    if job_id and job_manager.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    # Subscribe before reading the current state so no change is missed
+    updates = job_manager.subscribe()
+    
+    def current_job():
+        return job_manager.get(job_id) if job_id else job_manager.latest(MINING_JOB)
+    
+    def event(status, event_id):
+        return f"id: {event_id}\nevent: status\ndata: {json.dumps(status)}\n\n"
+    
+    def generate():
+        try:
+            event_id = 0
+            job = current_job()
+            yield event(mining_status_view(job), event_id)
+            while not (job_id and job and job['status'] in FINISHED_STATES):
+                try:
+                    changed = updates.get(timeout=STATUS_STREAM_KEEPALIVE)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                job = current_job()
+                if job is None or changed['id'] != job['id']:
+                    continue
+                event_id += 1
+                yield event(mining_status_view(changed), event_id)
+                job = changed
+        finally:
+            # Runs when the client disconnects, too
+            job_manager.unsubscribe(updates)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List mining jobs, newest first"""
+    try:
+        jobs = job_manager.list_jobs()
+        return jsonify({'jobs': jobs, 'count': len(jobs)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get one mining job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Get the rules mined by a completed job"""
+    try:
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if job['status'] != COMPLETED:
+            return jsonify({'error': f"Job is {job['status']}, no result available"}), 409
+        
+        with open(job['result_file'], 'r') as f:
+            result = json.load(f)
+        
+        return jsonify({'job_id': job_id, 'policy_version': job.get('policy_version'), **result})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>/preview', methods=['GET'])
+def get_job_preview(job_id):
+    """Get the provisional rules of a progressive job's latest sample"""
+    try:
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        preview_file = preview_file_for(job['result_file'])
+        if not os.path.exists(preview_file):
+            return jsonify({'error': 'No preview available yet'}), 404
+        
+        with open(preview_file, 'r') as f:
+            preview = json.load(f)
+        
+        # Once the job completes, its result supersedes the preview
+        return jsonify({'job_id': job_id, 'status': job['status'],
+                        'final': job['status'] == COMPLETED, **preview})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running mining job"""
+    try:
+        job = job_manager.cancel(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/policies', methods=['GET'])
+def list_policies():
+    """List named policies and which of them are loaded"""
+    try:
+        return jsonify({'policies': policy_registry.list_policies(), **policy_registry.memory_usage()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/policies', methods=['POST'])
+def register_policy():
+    """Register a named policy from a completed job or a results file"""
+    try:
+        data = request.get_json()
+        if not data or not data.get('policy_id'):
+            return jsonify({'error': 'policy_id required'}), 400
+
+        results_file, error = resolve_results_file(data.get('job_id'), data.get('results_file'))
+        if error:
+            return error
+
+        try:
+            entry = policy_registry.register(data['policy_id'], results_file)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(entry)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/policies/<policy_id>', methods=['DELETE'])
+def unregister_policy(policy_id):
+    """Remove a named policy"""
+    try:
+        if not policy_registry.unregister(policy_id):
+            return unknown_policy_response(policy_id)
+        return jsonify({'message': f'Policy {policy_id} removed'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/policy_diff', methods=['POST'])
+def policy_diff():
+    """
+    Compare two policies: rules added, removed and with changed nUP/nA
+    
+    Body: the target as job_id or results_file, and optionally the base as
+    base_job_id or base_results_file (default: the policy being served).
+    With full=true the response also holds the target's rules and
+    statistics, i.e. the complete delta.
+    """
+    try:
+        data = request.get_json() or {}
+        target, error = resolve_results_file(data.get('job_id'), data.get('results_file'))
+        if error:
+            return error
+        
+        if data.get('base_job_id') or data.get('base_results_file'):
+            base, error = resolve_results_file(data.get('base_job_id'), data.get('base_results_file'))
+            if error:
+                return error
+            base_version = None
+        else:
+            snapshot = current_snapshot()
+            if snapshot is None:
+                return jsonify({'error': 'No policies available. Complete mining first.'}), 400
+            base, base_version = snapshot.evaluator, snapshot.version
+        
+        delta = diff_policies(base, target)
+        if not data.get('full'):
+            delta = summarize_delta(delta)
+        return jsonify({'base_policy_version': base_version, **delta})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def rules_filter_key(attribute, value, min_coverage):
+    """Short hash of the /api/rules filters, so a cursor only pages the result set it came from"""
+    return hashlib.sha256(json.dumps([attribute, value, min_coverage]).encode()).hexdigest()[:16]
+
+
+def encode_rules_cursor(version, filter_key, offset):
+    """Opaque /api/rules cursor tied to the policy version and filters it was issued for"""
+    payload = json.dumps({'v': version, 'f': filter_key, 'o': offset}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_rules_cursor(cursor):
+    """Inverse of encode_rules_cursor; returns (version, filter_key, offset)"""
+    payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    return int(payload['v']), str(payload['f']), int(payload['o'])
 
 
 @app.route('/api/rules', methods=['GET'])
 def get_rules():
-    """Get mined rules"""
+    """
+    Get mined rules
+    
+    Query parameters (all optional; without them every final rule and the
+    full nUP/nA dictionaries are returned as before):
+        attribute, value: only rules with this attribute (and value)
+        min_coverage: only rules with nUP >= min_coverage
+        limit, cursor: page size and the next_cursor of the previous page
+        stats: 'all' (nUP/nA for every frequent rule), 'final' (only the
+            returned rules) or 'none'
+    """
     try:
-        if not rhapsody_instance or not mining_status['complete']:
+        snapshot = current_snapshot()
+        if snapshot is None:
             return jsonify({'error': 'No rules available. Complete mining first.'}), 400
         
-        stats = rhapsody_instance.get_rule_statistics()
+        stats = snapshot.statistics
+        rules = snapshot.evaluator.rules
+        attribute = request.args.get('attribute')
+        value = request.args.get('value')
+        min_coverage = request.args.get('min_coverage', type=int)
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        stats_mode = request.args.get('stats', 'all')
         
-        return jsonify({
-            'rules': stats['rules']['final'],
+        if value is not None and attribute is None:
+            return jsonify({'error': 'value filter requires attribute'}), 400
+        if stats_mode not in ('all', 'final', 'none'):
+            return jsonify({'error': "stats must be 'all', 'final' or 'none'"}), 400
+        
+        # Filter on the evaluator's rule index instead of re-parsing rule strings
+        selected = np.ones(len(rules), dtype=bool)
+        if attribute is not None:
+            index = snapshot.evaluator._get_rule_index()
+            if attribute in index['attributes']:
+                pos = index['attributes'].index(attribute)
+                column = index['codes'][:, pos]
+                if value is None:
+                    selected &= column >= 0
+                else:
+                    selected &= column == index['value_codes'][pos].get(value, -3)
+            else:
+                selected[:] = False
+        if min_coverage is not None:
+            nUP = snapshot.evaluator.rule_statistics.get('nUP', {})
+            coverage = np.fromiter((nUP.get(rule, 0) for rule in rules), dtype=np.int64, count=len(rules))
+            selected &= coverage >= min_coverage
+        positions = np.flatnonzero(selected)
+        
+        # Cursor pagination over the filtered positions
+        offset = 0
+        filter_key = rules_filter_key(attribute, value, min_coverage)
+        if cursor:
+            try:
+                cursor_version, cursor_filter_key, offset = decode_rules_cursor(cursor)
+            except (ValueError, KeyError, TypeError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+            if cursor_filter_key != filter_key:
+                return jsonify({'error': 'Cursor was issued for other filters; repeat the same attribute, '
+                                         'value and min_coverage or start again without a cursor'}), 400
+            if cursor_version != snapshot.version:
+                return jsonify({'error': 'Policy changed since this cursor was issued; start again without a cursor',
+                                'policy_version': snapshot.version}), 409
+            if not 0 <= offset <= len(positions):
+                return jsonify({'error': 'Invalid cursor'}), 400
+        end = len(positions) if limit is None else offset + max(limit, 1)
+        page = [rules[pos] for pos in positions[offset:end]]
+        
+        response = {
+            'policy_version': snapshot.version,
+            'rules': page,
             'statistics': {
                 'total_transactions': stats['total_transactions'],
                 'frequent_rules': stats['frequent_rules_count'],
                 'reliable_rules': stats['reliable_rules_count'],
                 'final_rules': stats['final_rules_count']
             },
-            'nUP': stats['nUP'],
-            'nA': stats['nA']
-        })
+            'total_matching': len(positions)
+        }
+        if limit is not None or cursor:
+            response['next_cursor'] = encode_rules_cursor(snapshot.version, filter_key, end) if end < len(positions) else None
+        if stats_mode == 'all':
+            # Shared compiled policies keep these as read-only mappings
+            response['nUP'] = dict(stats['nUP'])
+            response['nA'] = dict(stats['nA'])
+        elif stats_mode == 'final':
+            response['nUP'] = {rule: stats['nUP'].get(rule) for rule in page}
+            response['nA'] = {rule: stats['nA'].get(rule) for rule in page}
+        
+        return compress_response(jsonify(response), negotiate_encoding(request.accept_encodings))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -285,12 +762,15 @@ def get_rules():
 def get_available_attributes():
     """Get available attributes from mined rules"""
     try:
-        if not policy_evaluator or not mining_status['complete']:
+        snapshot = current_snapshot()
+        if snapshot is None:
             return jsonify({'error': 'No policies available. Complete mining first.'}), 400
+        policy_evaluator = snapshot.evaluator
         
         attributes = policy_evaluator.get_available_attributes()
         
         return jsonify({
+            'policy_version': snapshot.version,
             'attributes': attributes,
             'count': len(attributes)
         })
@@ -300,15 +780,21 @@ def get_available_attributes():
 
 @app.route('/api/evaluate', methods=['POST'])
 def evaluate_request():
-    """Evaluate access request against mined policies"""
+    """Evaluate access request against mined policies (?policy_id= selects a named policy)"""
     try:
-        if not policy_evaluator or not mining_status['complete']:
-            return jsonify({'error': 'No policies available. Complete mining first.'}), 400
-        
         data = request.get_json()
         if not data:
             return jsonify({'error': 'No request data provided'}), 400
         
+        policy_id = request.args.get('policy_id') or data.get('policy_id')
+        try:
+            snapshot = resolve_snapshot(policy_id)
+        except KeyError:
+            return unknown_policy_response(policy_id)
+        if snapshot is None:
+            return jsonify({'error': 'No policies available. Complete mining first.'}), 400
+        policy_evaluator = snapshot.evaluator
+        
         # Create access request
         # Get available attributes from policy evaluator
         available_attrs = policy_evaluator.get_available_attributes()
@@ -319,8 +805,11 @@ def evaluate_request():
             if attr in data:
                 access_request[attr] = data.get(attr, '')
         
-        # Evaluate request
-        result = policy_evaluator.evaluate_request(access_request)
+        # Evaluate request (batched with concurrent callers on the same snapshot)
+        result = evaluation_batcher.evaluate(policy_evaluator, access_request)
+        result['policy_version'] = snapshot.version
+        if policy_id:
+            result['policy_id'] = policy_id
         
         return jsonify(result)
         
@@ -330,15 +819,21 @@ def evaluate_request():
 
 @app.route('/api/batch_evaluate', methods=['POST'])
 def batch_evaluate():
-    """Evaluate multiple access requests"""
+    """Evaluate multiple access requests (?policy_id= selects a named policy)"""
     try:
-        if not policy_evaluator or not mining_status['complete']:
-            return jsonify({'error': 'No policies available. Complete mining first.'}), 400
-        
         data = request.get_json()
         if not data or 'requests' not in data:
             return jsonify({'error': 'No requests provided'}), 400
         
+        policy_id = request.args.get('policy_id') or data.get('policy_id')
+        try:
+            snapshot = resolve_snapshot(policy_id)
+        except KeyError:
+            return unknown_policy_response(policy_id)
+        if snapshot is None:
+            return jsonify({'error': 'No policies available. Complete mining first.'}), 400
+        policy_evaluator = snapshot.evaluator
+        
         requests = data['requests']
         available_attrs = policy_evaluator.get_available_attributes()
         filtered_requests = []
@@ -353,6 +848,8 @@ def batch_evaluate():
         denied_count = len(results) - granted_count
         
         return jsonify({
+            'policy_id': policy_id,
+            'policy_version': snapshot.version,
             'results': results,
             'summary': {
                 'total': len(results),
@@ -366,17 +863,125 @@ def batch_evaluate():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/batch_evaluate/stream', methods=['POST'])
+def batch_evaluate_stream():
+    """Evaluate newline-delimited JSON requests, streaming decisions back as they are made"""
+    policy_id = request.args.get('policy_id')
+    try:
+        snapshot = resolve_snapshot(policy_id)
+    except KeyError:
+        return unknown_policy_response(policy_id)
+    if snapshot is None:
+        return jsonify({'error': 'No policies available. Complete mining first.'}), 400
+    policy_evaluator = snapshot.evaluator
+    
+    batch_size = max(request.args.get('batch_size', 1000, type=int), 1)
+    include_details = request.args.get('details', 'false').lower() in ('1', 'true', 'yes')
+    available_attrs = policy_evaluator.get_available_attributes()
+    # Read the body directly so it is not buffered or capped by MAX_CONTENT_LENGTH
+    input_stream = get_input_stream(request.environ, max_content_length=None)
+    
+    def evaluate_lines(lines):
+        """Evaluate one micro-batch and render one output line per input line"""
+        parsed = []
+        for index, line in lines:
+            try:
+                req = json.loads(line)
+                if not isinstance(req, dict):
+                    raise ValueError('request must be a JSON object')
+                parsed.append((index, {attr: req.get(attr, '') for attr in available_attrs if attr in req}))
+            except ValueError as e:
+                parsed.append((index, e))
+        
+        valid = [req for _, req in parsed if isinstance(req, dict)]
+        results = iter(policy_evaluator.batch_evaluate(valid))
+        output = []
+        for index, req in parsed:
+            if not isinstance(req, dict):
+                output.append({'index': index, 'error': f'Invalid request: {req}'})
+                continue
+            result = next(results)
+            if include_details:
+                output.append({'index': index, **result})
+            else:
+                output.append({'index': index, 'granted': result['granted'],
+                               'matching_rule': result['matching_rule']})
+        return output
+    
+    def generate():
+        counters = {'total': 0, 'granted': 0, 'denied': 0, 'invalid': 0}
+        pending = []
+        index = 0
+        
+        def flush():
+            lines = []
+            for record in evaluate_lines(pending):
+                if 'error' in record:
+                    counters['invalid'] += 1
+                else:
+                    counters['total'] += 1
+                    counters['granted' if record['granted'] else 'denied'] += 1
+                lines.append(json.dumps(record))
+            pending.clear()
+            return '\n'.join(lines) + '\n'
+        
+        for raw_line in input_stream:
+            line = raw_line.strip()
+            if not line:
+                continue
+            pending.append((index, line))
+            index += 1
+            if len(pending) >= batch_size:
+                yield flush()
+        if pending:
+            yield flush()
+        
+        counters['grant_rate'] = counters['granted'] / counters['total'] if counters['total'] else 0
+        yield json.dumps({'summary': counters, 'policy_id': policy_id,
+                          'policy_version': snapshot.version}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.route('/api/generate_test_requests', methods=['GET'])
 def generate_test_requests():
     """Generate test requests based on mined rules"""
     try:
-        if not policy_evaluator or not mining_status['complete']:
+        snapshot = current_snapshot()
+        if snapshot is None:
             return jsonify({'error': 'No policies available. Complete mining first.'}), 400
+        policy_evaluator = snapshot.evaluator
         
         num_requests = request.args.get('count', 10, type=int)
-        test_requests = policy_evaluator.generate_test_requests(num_requests)
+        seed = request.args.get('seed', None, type=int)
+        
+        if request.args.get('format') == 'ndjson':
+            # Stream seeded requests batch by batch instead of building one response
+            batches = policy_evaluator.iter_test_request_batches(
+                num_requests,
+                batch_size=request.args.get('batch_size', 10000, type=int),
+                seed=seed,
+                grant_ratio=request.args.get('grant_ratio', 0.5, type=float),
+                near_miss_ratio=request.args.get('near_miss_ratio', 0.25, type=float)
+            )
+            # Pull the first batch here so parameter errors still get a 400/500 response
+            first_batch = next(batches, [])
+            
+            def generate():
+                yield ''.join(json.dumps(req) + '\n' for req in first_batch)
+                for batch in batches:
+                    yield ''.join(json.dumps(req) + '\n' for req in batch)
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        if seed is not None:
+            test_requests = next(policy_evaluator.iter_test_request_batches(
+                num_requests, batch_size=max(num_requests, 1), seed=seed), [])
+        else:
+            test_requests = policy_evaluator.generate_test_requests(num_requests)
         
         return jsonify({
+            'policy_version': snapshot.version,
             'test_requests': test_requests,
             'count': len(test_requests)
         })
@@ -389,13 +994,16 @@ def generate_test_requests():
 def get_rule_statistics():
     """Get detailed rule statistics and coverage information"""
     try:
-        if not policy_evaluator or not mining_status['complete']:
+        snapshot = current_snapshot()
+        if snapshot is None:
             return jsonify({'error': 'No policies available. Complete mining first.'}), 400
+        policy_evaluator = snapshot.evaluator
         
         stats = policy_evaluator.get_rule_coverage_stats()
         conflicts = policy_evaluator.find_conflicting_rules()
         
         return jsonify({
+            'policy_version': snapshot.version,
             'coverage_stats': stats,
             'conflicting_rules': conflicts,
             'conflict_count': len(conflicts)
@@ -405,15 +1013,100 @@ def get_rule_statistics():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/coverage', methods=['POST'])
+def evaluate_coverage():
+    """
+    Start a coverage job: per-rule coverage and confusion statistics over a labeled uploaded file
+    
+    The job scores the policy version current at submission. Follow it
+    with /api/jobs/<job_id>; /api/jobs/<job_id>/result returns its report.
+    """
+    try:
+        snapshot = current_snapshot()
+        if snapshot is None:
+            return jsonify({'error': 'No policies available. Complete mining first.'}), 400
+        
+        data = request.get_json()
+        if not data or not data.get('filename'):
+            return jsonify({'error': 'Filename required'}), 400
+        
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(data['filename']))
+        if not os.path.exists(filepath):
+            return jsonify({'error': 'File not found'}), 404
+        
+        import pandas as pd
+        from coverage_engine import LABEL_COLUMN
+        label_column = data.get('label_column', LABEL_COLUMN)
+        if label_column not in pd.read_csv(filepath, nrows=0).columns:
+            return jsonify({'error': f"Dataset must contain a '{label_column}' column"}), 400
+        
+        # The worker process gets its own copy of the snapshot's rules
+        evaluator = snapshot.evaluator
+        os.makedirs(JOBS_FOLDER, exist_ok=True)
+        policy_file = os.path.join(JOBS_FOLDER, f'coverage_policy_{uuid.uuid4().hex}.json')
+        with open(policy_file, 'w') as f:
+            json.dump({'final_rules': list(evaluator.rules),
+                       'working_columns': sorted(evaluator.available_attributes)}, f)
+        
+        timeout = data.get('timeout')
+        job = job_manager.submit({
+            'kind': COVERAGE_JOB,
+            'policy_file': policy_file,
+            'policy_version': snapshot.version,
+            'data_path': filepath,
+            'filename': data['filename'],
+            'label_column': label_column
+        }, timeout=float(timeout) if timeout is not None else None)
+        
+        return jsonify({
+            'message': 'Coverage evaluation started',
+            'job_id': job['id'],
+            'status': job['status'],
+            'policy_version': snapshot.version
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/export_report', methods=['POST'])
 def export_evaluation_report():
     """Export comprehensive evaluation report"""
     try:
-        if not policy_evaluator or not mining_status['complete']:
+        snapshot = current_snapshot()
+        if snapshot is None:
             return jsonify({'error': 'No policies available. Complete mining first.'}), 400
+        policy_evaluator = snapshot.evaluator
         
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'No request data provided'}), 400
         requests = data.get('requests', [])
+        if not isinstance(requests, list):
+            return jsonify({'error': 'requests must be a list'}), 400
+        
+        if data.get('format') == 'jsonl':
+            count, seed, chunk_size = data.get('count', 20), data.get('seed'), data.get('chunk_size', 10000)
+            try:
+                count, chunk_size = int(count), int(chunk_size)
+                seed = int(seed) if seed is not None else None
+            except (TypeError, ValueError):
+                return jsonify({'error': 'count, seed and chunk_size must be integers'}), 400
+            if count < 1 or chunk_size < 1:
+                return jsonify({'error': 'count and chunk_size must be positive integers'}), 400
+            
+            # Streamed report: evaluated in chunks, memory stays flat
+            if not requests:
+                requests = chain.from_iterable(policy_evaluator.iter_test_request_batches(count, seed=seed))
+            report_file = os.path.join(app.config['RESULTS_FOLDER'], 'evaluation_report.jsonl')
+            summary = policy_evaluator.stream_evaluation_report(requests, report_file, chunk_size=chunk_size)
+            
+            return jsonify({
+                'message': 'Report generated successfully',
+                'policy_version': snapshot.version,
+                'report_file': 'evaluation_report.jsonl',
+                'summary': summary['evaluation_summary']
+            })
         
         if not requests:
             # Generate sample requests if none provided
@@ -425,6 +1118,7 @@ def export_evaluation_report():
         
         return jsonify({
             'message': 'Report generated successfully',
+            'policy_version': snapshot.version,
             'report_file': 'evaluation_report.json',
             'summary': report['evaluation_summary']
         })
@@ -436,16 +1130,15 @@ def export_evaluation_report():
 @app.route('/api/reset', methods=['POST'])
 def reset_system():
     """Reset the system state"""
-    global rhapsody_instance, policy_evaluator
-    
     try:
-        if mining_status['is_running']:
+        if job_manager.has_active():
             return jsonify({'error': 'Cannot reset while mining is in progress'}), 400
         
-        # Reset global variables
-        rhapsody_instance = None
-        policy_evaluator = None
-        reset_mining_status()
+        # Withdraw the published policy and forget finished jobs
+        if SHARED_POLICY_DIR:
+            withdraw_compiled_policy(SHARED_POLICY_DIR)
+        policy_store.clear()
+        job_manager.forget_finished()
         
         return jsonify({'message': 'System reset successfully'})
         
@@ -455,9 +1148,22 @@ def reset_system():
 
 @app.route('/api/download/<filename>', methods=['GET'])
 def download_file(filename):
-    """Download result files"""
+    """Download result files, compressed when the client accepts gzip/zstd"""
     try:
-        return send_from_directory(app.config['RESULTS_FOLDER'], filename)
+        encoding = negotiate_encoding(request.accept_encodings)
+        filepath = safe_join(app.config['RESULTS_FOLDER'], filename)
+        if not encoding or filepath is None or not os.path.isfile(filepath):
+            response = send_from_directory(app.config['RESULTS_FOLDER'], filename)
+            response.vary.add('Accept-Encoding')
+            return response
+        
+        # Serve a cached compressed copy under the original name and type
+        response = send_file(os.path.abspath(compressed_copy(filepath, encoding)),
+                             mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                             as_attachment=True, download_name=filename)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 404
 
@@ -484,12 +1190,23 @@ if __name__ == '__main__':
     print("  POST /api/upload - Upload CSV data file")
     print("  POST /api/mine - Start mining process")
     print("  GET  /api/status - Get mining status")
+    print("  GET  /api/status/stream - Mining status as Server-Sent Events")
+    print("  GET  /api/jobs - List mining jobs")
+    print("  GET  /api/jobs/<id> - Get mining job status")
+    print("  GET  /api/jobs/<id>/result - Get mining job result")
+    print("  GET  /api/jobs/<id>/preview - Get provisional rules of a progressive job")
+    print("  POST /api/jobs/<id>/cancel - Cancel mining job")
     print("  GET  /api/rules - Get mined rules")
+    print("  GET  /api/policies - List named policies")
+    print("  POST /api/policies - Register a named policy from a results artifact")
+    print("  DELETE /api/policies/<id> - Remove a named policy")
     print("  POST /api/evaluate - Evaluate single access request")
     print("  POST /api/batch_evaluate - Evaluate multiple requests")
+    print("  POST /api/batch_evaluate/stream - Evaluate NDJSON requests as a stream")
     print("  GET  /api/generate_test_requests - Generate test requests")
     print("  GET  /api/rule_statistics - Get rule statistics")
     print("  POST /api/export_report - Export evaluation report")
+    print("  POST /api/coverage - Coverage and confusion analytics for a labeled file")
     print("  POST /api/reset - Reset system state")
     print("  GET  /api/download/<filename> - Download result files")
     
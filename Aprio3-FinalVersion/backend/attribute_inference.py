@@ -0,0 +1,314 @@
+"""
+Attribute Inference for RHAPSODY
+Author: Ludjina
+Description: Derives attributes (role, department, course, ...) from identifier-encoded columns before mining
+
+Usage:
+    python attribute_inference.py --preset university --input train.csv --output train_annotated.csv
+
+Identifiers such as 'stu12-3' or 'roster12' encode attributes in their
+text. Each rule extracts regex groups from one identifier column and maps
+them to attribute columns. Extraction runs with vectorized str.extract over
+the distinct identifiers only and the results are broadcast back to the
+rows, so the cost grows with distinct identifiers, not rows. Results are
+kept in a cache on disk (one file per rule, keyed by identifier), so the
+same identifiers in other splits or later runs are not parsed again.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_VALUE = '-'
+MATCH_OPERATIONS = ('startswith', 'contains', 'equals')
+
+# Identifier layouts used by the university datasets: 'typeX-Y' (course X,
+# department Y), 'typeXtext' (course X, extra text) and anything else
+UNIVERSITY_PATTERNS = [
+    r'(?P<kind>[a-zA-Z]+)(?P<course>\d+)-(?P<department>\d+)',
+    r'(?P<kind>[a-zA-Z]+)(?P<course>\d+)(?P<extra>[a-zA-Z]*)',
+    r'(?P<kind>.*)'
+]
+
+# Rules are plain JSON-compatible dicts:
+#   source      column holding the identifiers
+#   patterns    regexes with named groups, tried in order (first match wins,
+#               matched at the start of the identifier like re.match)
+#   lower       groups to lower-case
+#   attributes  output column -> {'group': name} to copy a group, or
+#               {'match': [[operation, groups, text, value], ...]} to pick the
+#               value of the first condition where any of the groups
+#               startswith/contains/equals the text
+UNIVERSITY_RULES = [
+    {
+        'source': 'userID',
+        'patterns': UNIVERSITY_PATTERNS,
+        'lower': ['kind', 'extra'],
+        'attributes': {
+            'user_role': {'match': [
+                ['startswith', ['kind'], 'stu', 'student'],
+                ['startswith', ['kind'], 'fac', 'faculty'],
+                ['startswith', ['kind'], 'chair', 'chair'],
+                ['startswith', ['kind'], 'registrar', 'registrar'],
+                ['startswith', ['kind'], 'admissions', 'admissions'],
+                ['startswith', ['kind'], 'app', 'applicant'],
+                ['contains', ['kind'], 'chair', 'chair'],
+                ['contains', ['kind'], 'stu', 'student'],
+                ['contains', ['kind'], 'fac', 'faculty']
+            ]},
+            'user_department': {'group': 'department'},
+            'user_course': {'group': 'course'}
+        }
+    },
+    {
+        'source': 'resourceID',
+        'patterns': UNIVERSITY_PATTERNS,
+        'lower': ['kind', 'extra'],
+        'attributes': {
+            'resource_type': {'match': [
+                ['startswith', ['kind'], 'roster', 'roster'],
+                ['startswith', ['kind'], 'transcript', 'academic_transcript'],
+                ['startswith', ['kind'], 'application', 'student_application'],
+                ['startswith', ['kind'], 'gradebook', 'gradebook'],
+                ['startswith', ['kind'], 'stu', 'student_application'],
+                ['equals', ['kind', 'extra'], 'trans', 'academic_transcript'],
+                ['equals', ['kind', 'extra'], 'gradebook', 'gradebook'],
+                ['equals', ['kind', 'extra'], 'application', 'student_application'],
+                ['equals', ['kind', 'extra'], 'roster', 'roster']
+            ]},
+            'resource_department': {'group': 'department'},
+            'resource_course': {'group': 'course'}
+        }
+    }
+]
+
+# Row-level attributes computed from inferred ones: 'crs' when the user's
+# course is the resource's course (and known), 'NOT_crs' otherwise
+UNIVERSITY_DERIVED = [
+    {'name': 'crs_taught', 'same': ['user_course', 'resource_course'], 'values': ['crs', 'NOT_crs']}
+]
+
+PRESETS = {
+    'university': {'rules': UNIVERSITY_RULES, 'derived': UNIVERSITY_DERIVED}
+}
+
+
+def rule_fingerprint(rule: Dict) -> str:
+    """Short hash of a rule, so cached values are dropped when the rule changes"""
+    return hashlib.sha1(json.dumps(rule, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def extract_attributes(identifiers: pd.Series, rule: Dict) -> pd.DataFrame:
+    """
+    Apply one rule to distinct identifiers
+
+    Args:
+        identifiers (pd.Series): Distinct identifiers as strings
+        rule (Dict): Rule as described above
+
+    Returns:
+        pd.DataFrame: One column per attribute of the rule, aligned with identifiers
+    """
+    identifiers = identifiers.reset_index(drop=True)
+    groups = pd.DataFrame(index=identifiers.index)
+    remaining = pd.Series(True, index=identifiers.index)
+
+    for pattern in rule['patterns']:
+        if not remaining.any():
+            break
+        candidates = identifiers[remaining]
+        matched = candidates.str.match(pattern)
+        # str.extract searches, but a match at the start is the leftmost one
+        extracted = candidates[matched].str.extract(pattern, expand=True)
+        groups = groups.combine_first(extracted) if len(groups.columns) else extracted.reindex(identifiers.index)
+        remaining &= ~identifiers.index.isin(extracted.index)
+
+    for group in rule.get('lower', []):
+        if group in groups.columns:
+            groups[group] = groups[group].str.lower()
+
+    attributes = {}
+    for name, spec in rule['attributes'].items():
+        if 'group' in spec:
+            column = groups[spec['group']] if spec['group'] in groups.columns else pd.Series(np.nan, index=groups.index)
+            attributes[name] = column.fillna(DEFAULT_VALUE).astype(str)
+            continue
+
+        conditions, values = [], []
+        for operation, condition_groups, text, value in spec['match']:
+            if operation not in MATCH_OPERATIONS:
+                raise ValueError(f"Unknown match operation '{operation}' (expected one of {MATCH_OPERATIONS})")
+            hit = np.zeros(len(groups), dtype=bool)
+            for group in condition_groups:
+                if group not in groups.columns:
+                    continue
+                column = groups[group].fillna('')
+                if operation == 'startswith':
+                    hit |= column.str.startswith(text).to_numpy()
+                elif operation == 'contains':
+                    hit |= column.str.contains(text, regex=False).to_numpy()
+                else:
+                    hit |= (column == text).to_numpy()
+            conditions.append(hit)
+            values.append(value)
+        attributes[name] = pd.Series(np.select(conditions, values, default=DEFAULT_VALUE) if conditions
+                                     else DEFAULT_VALUE, index=groups.index, dtype=object)
+
+    return pd.DataFrame(attributes, index=identifiers.index)
+
+
+class AttributeInference:
+    """
+    Declarative identifier -> attribute enrichment with a persistent cache
+
+    Cache files live in ``cache_dir`` as ``<source>_<rule hash>.json`` and
+    map each identifier to its attribute values; editing a rule changes its
+    hash, so stale values are never reused.
+    """
+
+    def __init__(self, rules: List[Dict], derived: Optional[List[Dict]] = None, cache_dir: Optional[str] = None):
+        """
+        Initialize the AttributeInference
+
+        Args:
+            rules (List[Dict]): Identifier rules (see UNIVERSITY_RULES)
+            derived (List[Dict]): Row-level attributes comparing inferred ones
+            cache_dir (str): Directory for the identifier caches (None for no cache)
+        """
+        self.rules = rules
+        self.derived = derived or []
+        self.cache_dir = cache_dir
+        self._caches = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_preset(cls, name: str, cache_dir: Optional[str] = None) -> 'AttributeInference':
+        """Build an AttributeInference from one of PRESETS"""
+        if name not in PRESETS:
+            raise ValueError(f"Unknown attribute inference preset: {name} (expected one of {sorted(PRESETS)})")
+        preset = PRESETS[name]
+        return cls(preset['rules'], preset.get('derived'), cache_dir=cache_dir)
+
+    def source_columns(self) -> List[str]:
+        """Identifier columns the rules read"""
+        return [rule['source'] for rule in self.rules]
+
+    def output_columns(self) -> List[str]:
+        """Columns added by apply()"""
+        columns = [name for rule in self.rules for name in rule['attributes']]
+        return columns + [spec['name'] for spec in self.derived]
+
+    def _cache_file(self, rule: Dict) -> str:
+        return os.path.join(self.cache_dir, f"{rule['source']}_{rule_fingerprint(rule)}.json")
+
+    def _load_cache(self, rule: Dict) -> Dict[str, List[str]]:
+        key = rule_fingerprint(rule)
+        if key not in self._caches:
+            cache = {}
+            if self.cache_dir and os.path.exists(self._cache_file(rule)):
+                try:
+                    with open(self._cache_file(rule), 'r') as f:
+                        cache = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Ignoring unreadable attribute cache {self._cache_file(rule)}: {e}")
+            self._caches[key] = cache
+        return self._caches[key]
+
+    def _save_cache(self, rule: Dict, cache: Dict[str, List[str]]):
+        if not self.cache_dir:
+            return
+        cache_file = self._cache_file(rule)
+        tmp_file = cache_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, cache_file)
+
+    def infer(self, identifiers: pd.Series, rule: Dict) -> pd.DataFrame:
+        """
+        Attributes of every identifier in a column, using and filling the cache
+
+        Args:
+            identifiers (pd.Series): The identifier column (any length)
+            rule (Dict): Rule for this column
+
+        Returns:
+            pd.DataFrame: One row per input row, one column per attribute
+        """
+        columns = list(rule['attributes'])
+        codes, distinct = pd.factorize(identifiers.astype(str), sort=False)
+        distinct = pd.Series(distinct, dtype=object)
+
+        cache = self._load_cache(rule)
+        new_ids = distinct[~distinct.isin(cache.keys())]
+        if len(new_ids):
+            extracted = extract_attributes(new_ids, rule)
+            cache.update(zip(new_ids, extracted[columns].values.tolist()))
+            self._save_cache(rule, cache)
+
+        table = np.array([cache[identifier] for identifier in distinct], dtype=object).reshape(len(distinct), len(columns))
+        # factorize codes NaN as -1; those rows get the default value
+        rows = np.full((len(codes), len(columns)), DEFAULT_VALUE, dtype=object)
+        known = codes >= 0
+        rows[known] = table[codes[known]]
+        return pd.DataFrame(rows, columns=columns, index=identifiers.index)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add the inferred (and derived) attribute columns to a DataFrame
+
+        Args:
+            df (pd.DataFrame): Data with the rules' identifier columns
+
+        Returns:
+            pd.DataFrame: A copy of df with the attribute columns added
+        """
+        missing = [source for source in self.source_columns() if source not in df.columns]
+        if missing:
+            raise ValueError(f"Identifier columns not found in data: {missing}")
+
+        start = time.time()
+        df = df.copy()
+        for rule in self.rules:
+            attributes = self.infer(df[rule['source']], rule)
+            for column in attributes.columns:
+                df[column] = attributes[column]
+
+        for spec in self.derived:
+            left, right = (df[column].astype(str) for column in spec['same'])
+            same = (left == right) & ~left.str.contains(DEFAULT_VALUE, regex=False)
+            df[spec['name']] = np.where(same, spec['values'][0], spec['values'][1])
+
+        distinct = {rule['source']: df[rule['source']].nunique() for rule in self.rules}
+        print(f"Inferred {len(self.output_columns())} attributes for {len(df)} rows "
+              f"({distinct} distinct identifiers) in {time.time() - start:.2f}s")
+        return df
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Add attributes inferred from identifiers to a CSV')
+    parser.add_argument('--preset', default='university', choices=sorted(PRESETS))
+    parser.add_argument('--input', required=True, nargs='+', help='CSV files (e.g. train, test and val splits)')
+    parser.add_argument('--output', nargs='+', help='Output CSVs (default: <input>_annotated.csv)')
+    parser.add_argument('--cache-dir', default=os.path.join('results', 'attribute_cache'))
+    args = parser.parse_args(argv)
+
+    outputs = args.output or [os.path.splitext(path)[0] + '_annotated.csv' for path in args.input]
+    if len(outputs) != len(args.input):
+        parser.error('--output needs one path per --input file')
+
+    inference = AttributeInference.from_preset(args.preset, cache_dir=args.cache_dir)
+    for input_path, output_path in zip(args.input, outputs):
+        inference.apply(pd.read_csv(input_path)).to_csv(output_path, index=False)
+        print(f"Wrote {output_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+CERT Log Ingestion for RHAPSODY
+Author: Ludjina
+Description: Streams CERT logon/device/file logs into mining-ready access transactions
+
+Usage:
+    python cert_ingest.py --logon logon.csv --device device.csv --file file.csv \
+        --output uploads/cert_transactions.csv
+
+The output is a CSV that RhapsodyAlgorithm.load_data (and /api/mine) reads
+as is: one row per transaction, one column per attribute.
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+
+LOG_TYPES = ('logon', 'device', 'file')
+DATE_FORMAT = '%m/%d/%Y %H:%M:%S'
+CHUNK_SIZE = 500000
+
+# Work hours as in the CERT notebooks: 7 AM to 7 PM
+WORK_START = 7
+WORK_END = 19
+HOUR_BUCKET_EDGES = [0, WORK_START, 12, WORK_END, 24]
+HOUR_BUCKETS = ['night', 'morning', 'afternoon', 'evening']
+
+# file.csv has no activity column; its events get this activity
+DEFAULT_ACTIVITY = {'file': 'File'}
+
+COUNT_BUCKET_EDGES = [0, 1, 5, 20, 100, np.inf]
+COUNT_BUCKETS = ['1', '2-5', '6-20', '21-100', '>100']
+
+EVENT_KEY = ['log', 'user', 'pc', 'activity', 'hour_bucket', 'outside_work_hours']
+OUTPUT_COLUMNS = EVENT_KEY + ['user_pc_count', 'pc_user_count', 'pc_in_logon_pcs']
+
+
+def event_hours(dates: pd.Series) -> np.ndarray:
+    """
+    Hour of day of CERT timestamps ('MM/DD/YYYY HH:MM:SS')
+
+    The hour is sliced out of the fixed-width text; timestamps in any other
+    layout are parsed with pandas.
+    """
+    hours = pd.to_numeric(dates.str.slice(11, 13), errors='coerce')
+    odd = hours.isna() | (dates.str.len() != 19)
+    if odd.any():
+        hours[odd] = pd.to_datetime(dates[odd], format=DATE_FORMAT, errors='coerce').dt.hour
+    return hours.to_numpy(dtype=np.float64)
+
+
+def read_events(path: str, log_type: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CERT log as chunks of access events
+
+    Only date, user, pc and activity are read (file.csv's content column
+    is skipped entirely).
+
+    Args:
+        path (str): logon.csv, device.csv or file.csv
+        log_type (str): 'logon', 'device' or 'file'
+        chunk_size (int): Rows per chunk
+
+    Yields:
+        pd.DataFrame: Categorical columns log, user, pc, activity,
+        hour_bucket and outside_work_hours
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [col for col in ('date', 'user', 'pc', 'activity') if col in header]
+    missing = {'date', 'user', 'pc'} - set(usecols)
+    if missing:
+        raise ValueError(f"{path} is missing columns: {sorted(missing)}")
+
+    dtypes = {'user': 'category', 'pc': 'category', 'activity': 'category', 'date': str}
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunk_size):
+        hours = event_hours(chunk['date'])
+        valid = ~np.isnan(hours)
+        chunk, hours = chunk[valid], hours[valid]
+
+        if 'activity' in chunk.columns:
+            activity = chunk['activity']
+        else:
+            activity = pd.Categorical([DEFAULT_ACTIVITY.get(log_type, log_type)] * len(chunk))
+
+        yield pd.DataFrame({
+            'log': pd.Categorical([log_type] * len(chunk)),
+            'user': chunk['user'].to_numpy(),
+            'pc': chunk['pc'].to_numpy(),
+            'activity': activity,
+            'hour_bucket': pd.cut(hours, HOUR_BUCKET_EDGES, right=False, labels=HOUR_BUCKETS),
+            'outside_work_hours': (hours < WORK_START) | (hours >= WORK_END)
+        })
+
+
+def count_buckets(counts: pd.Series) -> pd.Series:
+    """Bucket distinct counts (e.g. PCs per user) into coarse mining values"""
+    return pd.cut(counts, COUNT_BUCKET_EDGES, labels=COUNT_BUCKETS).astype(str)
+
+
+class CertIngestor:
+    """
+    Turns CERT logs into RHAPSODY transactions
+
+    Events are aggregated per chunk with categorical group-bys, so memory is
+    bounded by the number of distinct (log, user, pc, activity, hour bucket,
+    after-hours) combinations rather than by the number of events. Per-user
+    and per-PC attributes are derived once from that aggregate:
+
+    - user_pc_count: distinct PCs the user touched in that log (bucketed)
+    - pc_user_count: distinct users of the PC in that log (bucketed)
+    - pc_in_logon_pcs: for device/file events, whether the user also logged
+      on to that PC (empty when no logon log was ingested)
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        """
+        Initialize the CertIngestor
+
+        Args:
+            chunk_size (int): Rows read per chunk
+        """
+        self.chunk_size = chunk_size
+        self._aggregates = []
+        self.events_read = {}
+
+    def add_log(self, path: str, log_type: str):
+        """
+        Stream one log into the aggregate
+
+        Args:
+            path (str): Path of the CSV log
+            log_type (str): 'logon', 'device' or 'file'
+        """
+        if log_type not in LOG_TYPES:
+            raise ValueError(f"Unknown log type: {log_type} (expected one of {LOG_TYPES})")
+
+        start = time.time()
+        parts = []
+        events = 0
+        for chunk in read_events(path, log_type, self.chunk_size):
+            events += len(chunk)
+            parts.append(chunk.groupby(EVENT_KEY, observed=True).size().rename('events').reset_index())
+
+        if parts:
+            counts = pd.concat(parts, ignore_index=True)
+            # Chunks have their own categories; merge them as plain values
+            counts[EVENT_KEY] = counts[EVENT_KEY].astype(str)
+            self._aggregates.append(counts.groupby(EVENT_KEY, as_index=False)['events'].sum())
+
+        self.events_read[log_type] = self.events_read.get(log_type, 0) + events
+        print(f"Read {events:,} {log_type} events from {path} in {time.time() - start:.1f}s")
+
+    def transactions(self, distinct: bool = True) -> pd.DataFrame:
+        """
+        Build the transaction table
+
+        Args:
+            distinct (bool): One row per distinct combination (True) or one row
+                per event (False, so support counts events)
+
+        Returns:
+            pd.DataFrame: Columns OUTPUT_COLUMNS
+        """
+        if not self._aggregates:
+            return pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+        table = pd.concat(self._aggregates, ignore_index=True)
+        table = table.groupby(EVENT_KEY, as_index=False)['events'].sum()
+
+        pairs = table[['log', 'user', 'pc']].drop_duplicates()
+        user_pcs = pairs.groupby(['log', 'user'])['pc'].nunique().rename('user_pc_count')
+        pc_users = pairs.groupby(['log', 'pc'])['user'].nunique().rename('pc_user_count')
+        table = table.join(count_buckets(user_pcs), on=['log', 'user'])
+        table = table.join(count_buckets(pc_users), on=['log', 'pc'])
+
+        logon_pairs = pairs.loc[pairs['log'] == 'logon', ['user', 'pc']]
+        if len(logon_pairs):
+            logon_keys = pd.MultiIndex.from_frame(logon_pairs)
+            in_logon = pd.MultiIndex.from_frame(table[['user', 'pc']]).isin(logon_keys)
+            table['pc_in_logon_pcs'] = np.where(in_logon, 'True', 'False')
+            table.loc[table['log'] == 'logon', 'pc_in_logon_pcs'] = None
+        else:
+            table['pc_in_logon_pcs'] = None
+
+        if distinct:
+            return table[OUTPUT_COLUMNS]
+        return table.loc[table.index.repeat(table['events']), OUTPUT_COLUMNS].reset_index(drop=True)
+
+    def write(self, output_path: str, distinct: bool = True) -> Dict:
+        """
+        Write the transactions as a CSV RhapsodyAlgorithm can load
+
+        Args:
+            output_path (str): Destination CSV
+            distinct (bool): See transactions()
+
+        Returns:
+            Dict: Events read per log and transactions written
+        """
+        table = self.transactions(distinct=distinct)
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        table.to_csv(output_path, index=False)
+        print(f"Wrote {len(table):,} transactions to {output_path}")
+        return {'events_read': dict(self.events_read), 'transactions': len(table),
+                'columns': list(table.columns), 'output': output_path}
+
+
+def ingest_cert_logs(logs: Dict[str, str], output_path: str, distinct: bool = True,
+                     chunk_size: int = CHUNK_SIZE) -> Dict:
+    """
+    Convert CERT logs into a RHAPSODY transaction CSV
+
+    Args:
+        logs (Dict[str, str]): Log type ('logon', 'device', 'file') -> CSV path
+        output_path (str): Destination CSV
+        distinct (bool): One row per distinct combination instead of per event
+        chunk_size (int): Rows read per chunk
+
+    Returns:
+        Dict: Summary from CertIngestor.write
+    """
+    ingestor = CertIngestor(chunk_size=chunk_size)
+    for log_type in LOG_TYPES:
+        if logs.get(log_type):
+            ingestor.add_log(logs[log_type], log_type)
+    return ingestor.write(output_path, distinct=distinct)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Convert CERT logs into RHAPSODY transactions')
+    for log_type in LOG_TYPES:
+        parser.add_argument(f'--{log_type}', help=f'Path of {log_type}.csv')
+    parser.add_argument('--output', default=os.path.join('uploads', 'cert_transactions.csv'))
+    parser.add_argument('--per-event', action='store_true',
+                        help='Write one row per event instead of per distinct combination')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    logs = {log_type: getattr(args, log_type) for log_type in LOG_TYPES}
+    if not any(logs.values()):
+        parser.error('at least one of --logon, --device or --file is required')
+    ingest_cert_logs(logs, args.output, distinct=not args.per_event, chunk_size=args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Response Compression for RHAPSODY API Server
+Author: Ludjina
+Description: Accept-Encoding negotiation and gzip/zstd compression of responses and result files
+"""
+
+import gzip
+import os
+import tempfile
+from typing import Optional
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+# Responses smaller than this are sent as they are
+MIN_COMPRESS_SIZE = 1024
+
+FILE_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def supported_encodings():
+    """Encodings this server can produce, most preferred first"""
+    return ['zstd', 'gzip'] if ZSTD_AVAILABLE else ['gzip']
+
+
+def negotiate_encoding(accept_encodings) -> Optional[str]:
+    """
+    Pick the response encoding for a request
+
+    Args:
+        accept_encodings: The request's parsed Accept-Encoding header
+            (werkzeug Accept, e.g. flask.request.accept_encodings)
+
+    Returns:
+        str: 'zstd', 'gzip' or None for no compression
+    """
+    best = None
+    best_quality = 0
+    for encoding in supported_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    """Compress a payload with the given encoding"""
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_response(response, encoding: Optional[str]):
+    """
+    Compress a buffered Flask response in place
+
+    Args:
+        response (flask.Response): Response with a buffered body
+        encoding (str): Result of negotiate_encoding
+
+    Returns:
+        flask.Response: The same response
+    """
+    response.vary.add('Accept-Encoding')
+    if not encoding or response.direct_passthrough or response.is_streamed:
+        return response
+
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+
+    response.set_data(compress_bytes(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def compressed_copy(path: str, encoding: str) -> str:
+    """
+    Get a compressed copy of a file, creating or refreshing it if needed
+
+    The copy sits next to the original (``name.gz`` / ``name.zst``) and is
+    rebuilt only when the original is newer, so repeated downloads of the
+    same result file are compressed once.
+
+    Args:
+        path (str): File to compress
+        encoding (str): 'gzip' or 'zstd'
+
+    Returns:
+        str: Path of the compressed copy
+    """
+    compressed_path = path + FILE_SUFFIXES[encoding]
+    if (os.path.exists(compressed_path)
+            and os.path.getmtime(compressed_path) >= os.path.getmtime(path)):
+        return compressed_path
+
+    # Unique temp name: concurrent downloads of the same file each write their own
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(compressed_path) or '.',
+                                    prefix=os.path.basename(compressed_path) + '.', suffix='.tmp')
+    try:
+        with open(path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+            if encoding == 'zstd':
+                zstandard.ZstdCompressor(level=3).copy_stream(source, target)
+            else:
+                with gzip.GzipFile(fileobj=target, mode='wb', compresslevel=6) as gz:
+                    while True:
+                        chunk = source.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        gz.write(chunk)
+        os.replace(tmp_path, compressed_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return compressed_path
@@ -0,0 +1,171 @@
+"""
+Coverage Engine for RHAPSODY Policies
+Author: Ludjina
+Description: Per-rule coverage and confusion analytics of a mined policy over labeled request tables
+"""
+
+import json
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from policy_evaluator import PolicyEvaluator
+
+
+LABEL_COLUMN = 'access_granted'
+TRUE_LABELS = {'true', '1', 'yes', 'granted', 'allow'}
+
+
+class CoverageEngine:
+    """
+    Coverage and confusion analytics for a PolicyEvaluator
+
+    The labeled table is encoded against the evaluator's rule index one
+    chunk at a time, and every chunk is scored with one match bitmap per
+    rule. A request is predicted granted when any rule matches it.
+    """
+
+    def __init__(self, evaluator: PolicyEvaluator):
+        """
+        Initialize the CoverageEngine
+
+        Args:
+            evaluator (PolicyEvaluator): Evaluator holding the policy to analyze
+        """
+        self.evaluator = evaluator
+
+    def encode_table(self, table: pd.DataFrame) -> np.ndarray:
+        """
+        Encode a request table the same way PolicyEvaluator.encode_requests does
+
+        Args:
+            table (pd.DataFrame): Requests, one column per attribute
+
+        Returns:
+            np.ndarray: int32 array of shape (rows, rule attributes)
+        """
+        index = self.evaluator._get_rule_index()
+        codes = np.full((len(table), len(index['attributes'])), -1, dtype=np.int32)
+
+        for pos, attr in enumerate(index['attributes']):
+            if attr not in table.columns:
+                continue
+            column = table[attr]
+            filled = column.notna().to_numpy()
+            values = column.astype(str).str.strip()
+            filled &= (values != '').to_numpy()
+            mapped = values.map(index['value_codes'][pos]).fillna(-2).to_numpy(dtype=np.int32)
+            codes[:, pos] = np.where(filled, mapped, -1)
+
+        return codes
+
+    def evaluate(self, table: pd.DataFrame, label_column: str = LABEL_COLUMN,
+                 chunk_size: int = 100000, progress_callback=None) -> Dict:
+        """
+        Compute per-rule and overall coverage statistics
+
+        Args:
+            table (pd.DataFrame): Labeled requests
+            label_column (str): Column holding the true decision
+            chunk_size (int): Rows scored per chunk (bounds bitmap memory)
+            progress_callback (callable): Called as (progress, stage, message)
+                after each chunk, with progress from 20 to 95
+
+        Returns:
+            Dict: 'summary' (confusion counts, precision/recall/F1, coverage),
+            'rules' (per-rule matches/TP/FP, in policy order) and
+            'uncovered' (row positions of granted requests no rule covers)
+        """
+        if label_column not in table.columns:
+            raise ValueError(f"Dataset must contain a '{label_column}' column")
+
+        labels = self._labels_to_bool(table[label_column])
+        num_rules = len(self.evaluator.rules)
+        rule_tp = np.zeros(num_rules, dtype=np.int64)
+        rule_fp = np.zeros(num_rules, dtype=np.int64)
+        covered = np.zeros(len(table), dtype=bool)
+
+        for start in range(0, len(table), chunk_size):
+            chunk = table.iloc[start:start + chunk_size]
+            chunk_labels = labels[start:start + chunk_size]
+            bitmaps = self.evaluator.match_bitmaps(self.encode_table(chunk))
+            rule_tp += (bitmaps & chunk_labels).sum(axis=1)
+            rule_fp += (bitmaps & ~chunk_labels).sum(axis=1)
+            covered[start:start + chunk_size] = bitmaps.any(axis=0)
+            if progress_callback:
+                done = min(start + chunk_size, len(table))
+                progress_callback(20 + int(75 * done / len(table)), 'Scoring',
+                                  f"Scored {done} of {len(table)} requests against {num_rules} rules")
+
+        tp = int((covered & labels).sum())
+        fp = int((covered & ~labels).sum())
+        fn = int((~covered & labels).sum())
+        tn = int((~covered & ~labels).sum())
+        precision = tp / (tp + fp) if (tp + fp) > 0 else 0
+        recall = tp / (tp + fn) if (tp + fn) > 0 else 0
+        f1_score = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0
+
+        rules = []
+        for rule, rule_tp_count, rule_fp_count in zip(self.evaluator.rules, rule_tp, rule_fp):
+            matches = int(rule_tp_count + rule_fp_count)
+            rules.append({
+                'rule': rule,
+                'matches': matches,
+                'tp': int(rule_tp_count),
+                'fp': int(rule_fp_count),
+                'precision': int(rule_tp_count) / matches if matches else 0
+            })
+
+        return {
+            'summary': {
+                'total_requests': len(table),
+                'tp': tp,
+                'fp': fp,
+                'tn': tn,
+                'fn': fn,
+                'accuracy': (tp + tn) / len(table) if len(table) else 0,
+                'precision': precision,
+                'recall': recall,
+                'f1_score': f1_score,
+                'fpr': fp / (fp + tn) if (fp + tn) > 0 else 0,
+                'coverage': int(covered.sum()) / len(table) if len(table) else 0,
+                'uncovered_count': int((~covered).sum()),
+                'unused_rules': int((rule_tp + rule_fp == 0).sum())
+            },
+            'rules': rules,
+            'uncovered': np.flatnonzero(~covered & labels).tolist()
+        }
+
+    def evaluate_file(self, data_path: str, output_file: str = None,
+                      label_column: str = LABEL_COLUMN, progress_callback=None) -> Dict:
+        """
+        Run evaluate() on a CSV file and optionally save the report as JSON
+
+        Args:
+            data_path (str): Path to the labeled CSV file
+            output_file (str): Optional JSON output path
+            label_column (str): Column holding the true decision
+            progress_callback (callable): See evaluate
+
+        Returns:
+            Dict: Coverage report (see evaluate)
+        """
+        table = pd.read_csv(data_path)
+        report = self.evaluate(table, label_column=label_column, progress_callback=progress_callback)
+
+        if output_file:
+            with open(output_file, 'w') as f:
+                json.dump(report, f)
+            print(f"Coverage report saved to {output_file}")
+
+        return report
+
+    @staticmethod
+    def _labels_to_bool(labels: pd.Series) -> np.ndarray:
+        """Normalize bool, 0/1 or 'True'/'False' style labels to a bool array"""
+        if labels.dtype == bool:
+            return labels.to_numpy()
+        if pd.api.types.is_numeric_dtype(labels):
+            return labels.fillna(0).to_numpy() != 0
+        return labels.astype(str).str.strip().str.lower().isin(TRUE_LABELS).to_numpy()
@@ -0,0 +1,218 @@
+"""
+Cross-Validation Runner for RHAPSODY
+Author: Ludjina
+Description: Parallel, resumable k-fold cross-validation of RHAPSODY parameters
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from typing import Dict, List
+
+import pandas as pd
+from sklearn.model_selection import KFold
+
+from rhapsody_algorithm import RhapsodyAlgorithm
+from policy_evaluator import PolicyEvaluator
+from coverage_engine import CoverageEngine, LABEL_COLUMN
+
+
+# Dataset shared by every task of a worker process, set once by _init_worker
+_shared_data = None
+
+
+def _init_worker(data):
+    """Keep the dataset in the worker (inherited on fork, unpickled once on spawn)"""
+    global _shared_data
+    _shared_data = data
+
+
+def _run_fold(T, K, fold, train_idx, test_idx, selected_columns, label_column,
+              mine_granted_only):
+    """Mine on one training fold and score the matching test fold"""
+    labels = CoverageEngine._labels_to_bool(_shared_data[label_column])
+    train = _shared_data.iloc[train_idx]
+    if mine_granted_only:
+        train = train[labels[train_idx]]
+
+    # The algorithm reports progress with print; keep workers quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        rhapsody = RhapsodyAlgorithm(selected_columns=selected_columns)
+        rhapsody.load_data_from_dataframe(train)
+        final_rules, nUP, nA = rhapsody.run_algorithm(T, K)
+        mine_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        evaluator = PolicyEvaluator(final_rules)
+        evaluator.rule_statistics = {'nUP': nUP, 'nA': nA}
+        report = CoverageEngine(evaluator).evaluate(_shared_data.iloc[test_idx],
+                                                    label_column=label_column)
+        eval_seconds = time.perf_counter() - start
+
+    summary = report['summary']
+    return {
+        'T': T,
+        'K': K,
+        'fold': fold,
+        'rules_count': len(final_rules),
+        'train_size': len(train),
+        'test_size': len(test_idx),
+        'tp': summary['tp'],
+        'fp': summary['fp'],
+        'tn': summary['tn'],
+        'fn': summary['fn'],
+        'accuracy': summary['accuracy'],
+        'precision': summary['precision'],
+        'recall': summary['recall'],
+        'f1_score': summary['f1_score'],
+        'fpr': summary['fpr'],
+        'mine_seconds': mine_seconds,
+        'eval_seconds': eval_seconds
+    }
+
+
+class CrossValidationRunner:
+    """
+    K-fold cross-validation over a (T, K) parameter grid
+
+    Every (T, K, fold) combination is one task in a process pool. Workers
+    receive the dataset once when they start, not with every task.
+    Finished tasks are appended to a JSON Lines file as they complete;
+    rerunning with the same file skips them, so an interrupted sweep
+    resumes where it stopped.
+    """
+
+    def __init__(self, data: pd.DataFrame, selected_columns: List[str],
+                 label_column: str = LABEL_COLUMN, n_folds: int = 5,
+                 random_state: int = 42, mine_granted_only: bool = True):
+        """
+        Initialize the CrossValidationRunner
+
+        Args:
+            data (pd.DataFrame): Labeled dataset
+            selected_columns (List[str]): Attribute columns to mine
+            label_column (str): Column holding the true decision
+            n_folds (int): Number of folds
+            random_state (int): Seed for the fold split
+            mine_granted_only (bool): Mine only on granted training rows
+        """
+        missing_cols = [col for col in selected_columns + [label_column] if col not in data.columns]
+        if missing_cols:
+            raise ValueError(f"Columns not found in data: {missing_cols}")
+
+        self.data = data[selected_columns + [label_column]].reset_index(drop=True)
+        self.selected_columns = list(selected_columns)
+        self.label_column = label_column
+        self.n_folds = n_folds
+        self.random_state = random_state
+        self.mine_granted_only = mine_granted_only
+        # Rows (values and order) the folds are cut from; a resumed run must use the same
+        self.data_fingerprint = hashlib.sha256(
+            pd.util.hash_pandas_object(self.data, index=False).to_numpy().tobytes()).hexdigest()
+
+    def run(self, T_values: List[int], K_values: List[float], results_file: str = None,
+            max_workers: int = None) -> pd.DataFrame:
+        """
+        Run the sweep
+
+        Args:
+            T_values (List[int]): Support thresholds to try
+            K_values (List[float]): Reliability thresholds to try
+            results_file (str): JSON Lines file for incremental results (enables resume)
+            max_workers (int): Worker processes (defaults to the CPU count)
+
+        Returns:
+            pd.DataFrame: One row per (T, K, fold) with metrics and timings
+        """
+        folds = list(KFold(n_splits=self.n_folds, shuffle=True,
+                           random_state=self.random_state).split(self.data))
+
+        records = self._load_finished(results_file)
+        done = {(r['T'], r['K'], r['fold']) for r in records}
+        tasks = [(T, K, fold) for T, K, fold in product(T_values, K_values, range(self.n_folds))
+                 if (T, K, fold) not in done]
+
+        if done:
+            print(f"Resuming: {len(done)} finished, {len(tasks)} remaining")
+
+        if tasks:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(self.data,)) as pool:
+                futures = [
+                    pool.submit(_run_fold, T, K, fold, folds[fold][0], folds[fold][1],
+                                self.selected_columns, self.label_column,
+                                self.mine_granted_only)
+                    for T, K, fold in tasks
+                ]
+                for future in as_completed(futures):
+                    record = future.result()
+                    records.append(record)
+                    if results_file:
+                        self._append_record(results_file, record)
+
+        if not records:
+            return pd.DataFrame()
+        return pd.DataFrame(records).sort_values(['T', 'K', 'fold']).reset_index(drop=True)
+
+    def _run_key(self) -> Dict:
+        """Settings a results file must match to be resumed"""
+        return {
+            'n_folds': self.n_folds,
+            'random_state': self.random_state,
+            'selected_columns': self.selected_columns,
+            'label_column': self.label_column,
+            'mine_granted_only': self.mine_granted_only,
+            'data_fingerprint': self.data_fingerprint
+        }
+
+    def _load_finished(self, results_file: str) -> List[Dict]:
+        """Read finished records written by an earlier run with the same settings"""
+        if not results_file or not os.path.exists(results_file):
+            return []
+
+        run_key = self._run_key()
+        records = []
+        with open(results_file, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by an interruption; that task reruns
+                    continue
+                if record.pop('run', None) == run_key:
+                    records.append(record)
+        return records
+
+    def _append_record(self, results_file: str, record: Dict):
+        """Append one finished task to the results file"""
+        with open(results_file, 'a') as f:
+            f.write(json.dumps({**record, 'run': self._run_key()}) + '\n')
+
+
+def summarize_cross_validation(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Average fold metrics per (T, K)
+
+    Args:
+        results (pd.DataFrame): Output of CrossValidationRunner.run
+
+    Returns:
+        pd.DataFrame: Mean and std of the metrics plus total time per (T, K)
+    """
+    if results.empty:
+        return results
+
+    metrics = ['rules_count', 'accuracy', 'precision', 'recall', 'f1_score', 'fpr']
+    summary = results.groupby(['T', 'K'])[metrics].agg(['mean', 'std'])
+    summary.columns = [f"{metric}_{stat}" for metric, stat in summary.columns]
+    timing = results.groupby(['T', 'K'])[['mine_seconds', 'eval_seconds']].sum()
+    return summary.join(timing).reset_index()
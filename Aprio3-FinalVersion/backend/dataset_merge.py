@@ -0,0 +1,233 @@
+"""
+Dataset Merge for RHAPSODY
+Author: Ludjina
+Description: Merges CSV splits/folders into one deduplicated mining dataset
+
+Usage:
+    python dataset_merge.py --input data/train data/val data/test.csv \
+        --columns userID resourceID operation --output uploads/merged.csv
+
+Replaces the notebook pattern of reading every file, concatenating them and
+calling drop_duplicates. Files are read in parallel threads in chunks, each
+row is reduced to a 64-bit hash of the selected columns and only rows whose
+hash has not been seen yet are appended to the output. Memory therefore
+holds the hashes of the unique rows plus a few chunks in flight, not every
+input at once. The result is the same as concatenating the files in the
+given order and keeping the first of each duplicate.
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+CHUNK_SIZE = 200000
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+# Chunks a reader may run ahead of the writer
+READ_AHEAD = 2
+
+_DONE = object()
+
+
+def _put(out: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put on a bounded queue unless the merge was stopped; False if stopped"""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class SeenHashes:
+    """
+    Set of 64-bit row hashes kept as sorted numpy arrays
+
+    New hashes form a sorted run; runs of similar size are merged, so a
+    lookup is a vectorized searchsorted over a handful of runs and each
+    hash costs 8 bytes.
+    """
+
+    def __init__(self):
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs)
+
+    def add_new(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Add distinct hashes and return the mask of those not seen before
+
+        Args:
+            hashes (np.ndarray): uint64 hashes without repeats
+
+        Returns:
+            np.ndarray: True where the hash is new
+        """
+        # Sorted lookups walk each run once instead of jumping around it
+        order = np.argsort(hashes)
+        ordered = hashes[order]
+        new_ordered = np.ones(len(ordered), dtype=bool)
+        for run in self._runs:
+            positions = np.minimum(np.searchsorted(run, ordered), len(run) - 1)
+            new_ordered &= run[positions] != ordered
+        if new_ordered.any():
+            self._runs.append(ordered[new_ordered])
+            while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+                last = self._runs.pop()
+                self._runs[-1] = np.sort(np.concatenate([self._runs[-1], last]), kind='mergesort')
+
+        new = np.empty(len(hashes), dtype=bool)
+        new[order] = new_ordered
+        return new
+
+
+def list_csv_files(paths: Iterable[str]) -> List[str]:
+    """Expand folders into their CSV files (sorted); files are kept as given"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith('.csv'))
+        else:
+            files.append(path)
+    return files
+
+
+def row_hashes(chunk: pd.DataFrame) -> np.ndarray:
+    """64-bit hash of each row (values only, index ignored)"""
+    return pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+
+
+def _read_file(path: str, columns: List[str], chunk_size: int, out: queue.Queue, stop: threading.Event):
+    """
+    Reader thread: put (chunk, hashes) pairs for one file on ``out``
+
+    Rows repeated inside a chunk are dropped here; rows already seen in
+    earlier chunks or files are dropped by the writer. Any exception is
+    passed to the writer instead of a chunk.
+    """
+    if stop.is_set():
+        return
+    try:
+        header = pd.read_csv(path, nrows=0).columns
+        missing = [col for col in columns if col not in header]
+        if missing:
+            raise ValueError(f"{path} is missing columns: {missing}")
+
+        # Read values as text so they are written back exactly as they were
+        for chunk in pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=False,
+                                 chunksize=chunk_size):
+            chunk = chunk[columns]
+            rows = len(chunk)
+            hashes = row_hashes(chunk)
+            _, first = np.unique(hashes, return_index=True)
+            first.sort()
+            if len(first) < rows:
+                chunk, hashes = chunk.iloc[first], hashes[first]
+            if not _put(out, (rows, chunk, hashes), stop):
+                return
+        _put(out, _DONE, stop)
+    except Exception as e:
+        _put(out, e, stop)
+
+
+def merge_datasets(inputs: List[str], output_path: str, columns: Optional[List[str]] = None,
+                   chunk_size: int = CHUNK_SIZE, max_workers: int = MAX_WORKERS) -> Dict:
+    """
+    Merge CSV files into one deduplicated CSV
+
+    Args:
+        inputs (List[str]): CSV files and/or folders of CSV files, in merge order
+        output_path (str): Destination CSV
+        columns (List[str]): Columns to keep and deduplicate on (default: the
+            first file's columns)
+        chunk_size (int): Rows per chunk
+        max_workers (int): Files read concurrently
+
+    Returns:
+        Dict: Files, rows read, unique rows written and timing
+    """
+    files = list_csv_files(inputs)
+    if not files:
+        raise ValueError('No CSV files to merge')
+    if not columns:
+        columns = list(pd.read_csv(files[0], nrows=0).columns)
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    start = time.time()
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=READ_AHEAD) for _ in files]
+    seen = SeenHashes()
+    rows_read = 0
+    rows_written = 0
+    tmp_file = output_path + '.tmp'
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # Readers start in file order; the writer drains them in the same
+        # order so the output does not depend on which thread finishes first
+        for path, out in zip(files, queues):
+            executor.submit(_read_file, path, columns, chunk_size, out, stop)
+
+        try:
+            with open(tmp_file, 'w', newline='') as f:
+                pd.DataFrame(columns=columns).to_csv(f, index=False)
+                for path, out in zip(files, queues):
+                    while True:
+                        item = out.get()
+                        if item is _DONE:
+                            break
+                        if isinstance(item, Exception):
+                            raise item
+                        rows, chunk, hashes = item
+                        rows_read += rows
+                        new = seen.add_new(hashes)
+                        if new.any():
+                            chunk[new].to_csv(f, header=False, index=False)
+                            rows_written += int(new.sum())
+            os.replace(tmp_file, output_path)
+        except BaseException:
+            # Readers waiting on a full queue (or not started yet) give up
+            stop.set()
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    elapsed = time.time() - start
+    print(f"Merged {len(files)} files: {rows_read:,} rows read, {rows_written:,} unique rows "
+          f"written to {output_path} in {elapsed:.1f}s")
+    return {
+        'files': files,
+        'columns': columns,
+        'rows_read': rows_read,
+        'unique_rows': rows_written,
+        'output': output_path,
+        'seconds': round(elapsed, 3)
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Merge CSV files into one deduplicated RHAPSODY dataset')
+    parser.add_argument('--input', required=True, nargs='+', help='CSV files and/or folders, in merge order')
+    parser.add_argument('--output', default=os.path.join('uploads', 'merged.csv'))
+    parser.add_argument('--columns', nargs='+', help='Columns to keep and deduplicate on')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    args = parser.parse_args(argv)
+    merge_datasets(args.input, args.output, columns=args.columns, chunk_size=args.chunk_size,
+                   max_workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Evaluation Batcher for RHAPSODY API Server
+Author: Ludjina
+Description: Coalesces concurrent single-request evaluations into vectorized batches
+
+Each /api/evaluate call runs on its own server thread. Instead of
+scanning the rules once per call, the thread hands its request to the
+batcher and waits. A worker thread takes the first waiting request, keeps
+collecting for a short window (or until the batch is full), evaluates the
+whole window with one PolicyEvaluator.batch_evaluate call and hands each
+caller its own result. A caller waits at most the window plus the batch's
+evaluation time; under load many requests share one pass over the rules.
+
+Requests are grouped by evaluator, so each is decided by the policy
+snapshot its caller resolved, even if a new version is published while
+it waits. A window holding a single request uses evaluate_request, which
+answers repeated requests from its decision memo.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+
+from policy_evaluator import PolicyEvaluator
+
+
+# Seconds a window stays open after its first request (0 disables batching)
+BATCH_WINDOW = float(os.environ.get('RHAPSODY_EVALUATE_BATCH_WINDOW_MS', 0.5)) / 1000
+MAX_BATCH_SIZE = int(os.environ.get('RHAPSODY_EVALUATE_MAX_BATCH', 256))
+
+
+class EvaluationBatcher:
+    """
+    Front end for evaluate_request that batches concurrent callers
+
+    evaluate() has the same result as evaluator.evaluate_request(); the
+    worker thread starts on first use, so processes that never evaluate
+    (e.g. mining workers importing the API module) do not start it.
+    """
+
+    def __init__(self, window: float = BATCH_WINDOW, max_batch_size: int = MAX_BATCH_SIZE):
+        """
+        Initialize the EvaluationBatcher
+
+        Args:
+            window (float): Seconds to keep collecting after the first request
+            max_batch_size (int): Requests evaluated together at most
+        """
+        self.window = window
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_batch_size > 1
+
+    def evaluate(self, evaluator: PolicyEvaluator, request: Dict[str, str]) -> Dict:
+        """
+        Evaluate one access request, batched with concurrent callers
+
+        Args:
+            evaluator (PolicyEvaluator): Evaluator of the caller's snapshot
+            request (Dict[str, str]): Access request with attributes
+
+        Returns:
+            Dict: Evaluation result (same as evaluate_request)
+        """
+        if not self.enabled:
+            return evaluator.evaluate_request(request)
+
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((evaluator, request, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='evaluation-batcher', daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> List[Tuple[PolicyEvaluator, Dict, Future]]:
+        """Block for one request, then gather more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Whatever is already queued joins even after the deadline
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[0]), []).append(item)
+            for items in groups.values():
+                evaluator = items[0][0]
+                if len(items) > 1:
+                    try:
+                        results = evaluator.batch_evaluate([request for _, request, _ in items])
+                    except Exception:
+                        # Decide each request on its own below, so only a bad one fails
+                        pass
+                    else:
+                        for (_, _, future), result in zip(items, results):
+                            future.set_result(result)
+                        continue
+                for _, request, future in items:
+                    try:
+                        future.set_result(evaluator.evaluate_request(request))
+                    except Exception as e:
+                        future.set_exception(e)
@@ -0,0 +1,588 @@
+"""
+Mining Job Manager for RHAPSODY API Server
+Author: Ludjina
+Description: Queued, concurrent RHAPSODY mining jobs in worker processes with cancellation and timeouts
+"""
+
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process claims, run jobs from one process
+    fcntl = None
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMED_OUT = 'timed_out'
+
+FINISHED_STATES = {COMPLETED, FAILED, CANCELLED, TIMED_OUT}
+
+# Seconds between reloads of other processes' job records while a status stream is open
+RECORD_SYNC_INTERVAL = 1.0
+
+# Job kinds (params['kind']); jobs without one are mining jobs
+MINING_JOB = 'mining'
+COVERAGE_JOB = 'coverage'
+
+
+def preview_file_for(result_file: str) -> str:
+    """Where a progressive job writes its latest preview"""
+    return result_file.replace('_results.json', '_preview.json')
+
+
+def _mining_worker(job_id, params, result_file, events):
+    """
+    Run one mining job in a worker process
+
+    Progress, completion and errors are sent to the parent as
+    (job_id, event, payload) tuples on the events queue.
+    """
+    rhapsody = None
+    try:
+        from rhapsody_algorithm import RhapsodyAlgorithm
+
+        def progress(value, stage, message):
+            events.put((job_id, 'progress', {'progress': value, 'stage': stage, 'message': message}))
+
+        progress(10, 'Initializing', 'Loading data and initializing algorithm...')
+        inference = None
+        if params.get('infer_attributes'):
+            from attribute_inference import AttributeInference
+            inference = AttributeInference.from_preset(params['infer_attributes'],
+                                                       cache_dir=params.get('attribute_cache'))
+        rhapsody = RhapsodyAlgorithm(selected_columns=params['selected_columns'], inference=inference,
+                                     collapse_rare=params.get('collapse_rare', False))
+        if not rhapsody.load_data(params['data_path']):
+            raise Exception("Failed to load data")
+
+        progress(20, 'Preprocessing data',
+                 f"Processing {len(rhapsody.data)} rows with {len(params['selected_columns'])} columns")
+        mining_options = {'closed': params.get('closed', False), 'top_k': params.get('top_k'),
+                          'profile': bool(params.get('profile'))}
+        if params.get('progressive'):
+            preview_file = preview_file_for(result_file)
+
+            def publish_preview(preview):
+                # Each refinement replaces the previous preview
+                tmp_file = preview_file + '.tmp'
+                with open(tmp_file, 'w') as f:
+                    json.dump(preview, f)
+                os.replace(tmp_file, preview_file)
+                events.put((job_id, 'progress', {
+                    'progress': 20,
+                    'stage': 'Preview',
+                    'message': f"Preview on {preview['sample_size']} of {preview['total_rows']} rows: "
+                               f"{len(preview['rules'])} provisional rules",
+                    'preview': {key: preview[key] for key in
+                                ('refinement', 'sample_size', 'total_rows', 'scaled_T', 'confidence')}
+                }))
+
+            final_rules, nUP, nA = rhapsody.run_progressive(
+                params['T'], params['K'], sample_sizes=params.get('sample_sizes'),
+                on_preview=publish_preview, progress_callback=progress, **mining_options)
+        else:
+            final_rules, nUP, nA = rhapsody.run_algorithm(params['T'], params['K'], progress_callback=progress,
+                                                         **mining_options)
+        rhapsody.save_results(result_file)
+
+        completed = {'final_rules_count': len(final_rules)}
+        if rhapsody.profiler is not None:
+            completed['profile_files'] = save_job_profile(rhapsody.profiler, job_id, params)
+        events.put((job_id, 'completed', completed))
+    except Exception as e:
+        failed = {'error': str(e)}
+        # A profile of the stages that ran is most useful when a job fails
+        if rhapsody is not None and rhapsody.profiler is not None and rhapsody.profiler.stages:
+            failed['profile_files'] = save_job_profile(rhapsody.profiler, job_id, params)
+        events.put((job_id, 'failed', failed))
+
+
+def _coverage_worker(job_id, params, result_file, events):
+    """
+    Score a policy against a labeled file in a worker process
+
+    params: 'policy_file' (results JSON of the policy), 'data_path' and
+    'label_column'. The report is written to result_file; events are sent
+    as in _mining_worker.
+    """
+    try:
+        from coverage_engine import CoverageEngine
+        from policy_store import load_policy_artifact
+
+        def progress(value, stage, message):
+            events.put((job_id, 'progress', {'progress': value, 'stage': stage, 'message': message}))
+
+        progress(10, 'Initializing', 'Loading policy and labeled data...')
+        evaluator, _ = load_policy_artifact(params['policy_file'])
+        report = CoverageEngine(evaluator).evaluate_file(params['data_path'], result_file,
+                                                         label_column=params['label_column'],
+                                                         progress_callback=progress)
+        summary = report['summary']
+        events.put((job_id, 'completed', {
+            'message': f"Coverage complete! {summary['coverage']:.1%} of "
+                       f"{summary['total_requests']} requests covered."
+        }))
+    except Exception as e:
+        events.put((job_id, 'failed', {'error': str(e)}))
+    finally:
+        # The policy copy was written for this job only
+        if os.path.exists(params['policy_file']):
+            os.remove(params['policy_file'])
+
+
+_WORKERS = {MINING_JOB: _mining_worker, COVERAGE_JOB: _coverage_worker}
+
+
+def save_job_profile(profiler, job_id, params):
+    """Save a job's stage profiles into params['profile_dir']; returns the file names"""
+    profile_dir = params.get('profile_dir') or '.'
+    try:
+        paths = profiler.save(os.path.join(profile_dir, f'job_{job_id}'))
+    except OSError as e:
+        print(f"Could not save the profile of job {job_id}: {e}")
+        return []
+    return [os.path.basename(path) for path in paths]
+
+
+class JobManager:
+    """
+    Queue and run mining jobs in worker processes
+
+    Up to ``max_concurrent`` jobs run at once, each in its own process so
+    they do not compete for the GIL with each other or with the server.
+    Job records are written to ``jobs_folder`` on every state change. When
+    the manager starts, jobs that were queued or running in a previous
+    server run are queued again, and finished jobs keep their results.
+
+    Several server processes may share ``jobs_folder`` (see serve.py). A
+    process only runs jobs it has claimed: it holds an exclusive lock on
+    the job's claim file from submission (or requeueing) until the job
+    finishes. The lock goes away with the process, so after a worker dies
+    its unfinished jobs are requeued by the next process that restores,
+    and never by two processes at once. Other processes read those jobs
+    from their records (reloaded when they change) and cancel them by
+    leaving a cancel file, which the owning process acts on.
+
+    Work starts lazily on the first call, so importing the server module in
+    a worker process does not start another scheduler.
+    """
+
+    def __init__(self, jobs_folder: str, max_concurrent: int = 2,
+                 default_timeout: Optional[float] = None,
+                 on_complete: Callable[[Dict], None] = None):
+        """
+        Initialize the JobManager
+
+        Args:
+            jobs_folder (str): Folder for job records and result files
+            max_concurrent (int): Maximum number of jobs running at once
+            default_timeout (float): Seconds before a running job is killed (None = no limit)
+            on_complete (callable): Called with the job record when a job's worker
+                finishes; a returned dict is merged into the record
+        """
+        self.jobs_folder = jobs_folder
+        self.max_concurrent = max_concurrent
+        self.default_timeout = default_timeout
+        self.on_complete = on_complete
+
+        self._jobs = {}
+        self._queue = []
+        self._processes = {}
+        self._lock = threading.RLock()
+        self._context = multiprocessing.get_context('spawn')
+        self._events = None
+        self._started = False
+        self._subscribers = set()
+        self._claims = {}
+        self._record_stamps = {}  # job id -> (mtime, size) of the record last read from disk
+        self._last_sync = 0.0
+
+    def submit(self, params: Dict, timeout: Optional[float] = None) -> Dict:
+        """
+        Queue a mining job
+
+        Args:
+            params (Dict): 'data_path', 'T', 'K' and 'selected_columns'
+            timeout (float): Seconds allowed once running (defaults to default_timeout)
+
+        Returns:
+            Dict: The new job record
+        """
+        self._ensure_started()
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'status': QUEUED,
+            'params': params,
+            'timeout': timeout if timeout is not None else self.default_timeout,
+            'progress': 0,
+            'stage': 'Queued',
+            'message': 'Waiting for a free worker...',
+            'error': None,
+            'result_file': os.path.join(self.jobs_folder, f'job_{job_id}_results.json'),
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None
+        }
+        with self._lock:
+            self._claim(job_id)
+            self._jobs[job_id] = job
+            self._queue.append(job_id)
+            self._save(job)
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Get a copy of a job record, or None if unknown"""
+        self._ensure_started()
+        with self._lock:
+            self._load_record(job_id)
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self) -> List[Dict]:
+        """Get copies of all job records (including other processes' jobs), newest first"""
+        self._ensure_started()
+        with self._lock:
+            self._sync_records()
+            jobs = [dict(job) for job in self._jobs.values()]
+        return sorted(jobs, key=lambda job: job['submitted_at'], reverse=True)
+
+    def latest(self, kind: Optional[str] = None) -> Optional[Dict]:
+        """Get the most recently submitted job (of one kind, if given)"""
+        jobs = [job for job in self.list_jobs()
+                if kind is None or job['params'].get('kind', MINING_JOB) == kind]
+        return jobs[0] if jobs else None
+
+    def has_active(self) -> bool:
+        """Check whether any job is queued or running"""
+        return any(job['status'] not in FINISHED_STATES for job in self.list_jobs())
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """
+        Cancel a queued or running job
+
+        Returns:
+            Dict: The updated job record, or None if unknown
+        """
+        self._ensure_started()
+        with self._lock:
+            self._load_record(job_id)
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] not in FINISHED_STATES and not self._owns(job_id):
+                # Another process runs it; its scheduler picks up the request
+                with open(self._cancel_file(job_id), 'w'):
+                    pass
+                return dict(job, cancel_requested=True)
+            if job['status'] == QUEUED:
+                self._queue.remove(job_id)
+                self._finish(job, CANCELLED, 'Job cancelled before it started')
+            elif job['status'] == RUNNING:
+                self._kill(job_id)
+                self._finish(job, CANCELLED, 'Job cancelled')
+            return dict(job)
+
+    def forget_finished(self):
+        """Drop records of finished jobs (their result files are kept)"""
+        self._ensure_started()
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job['status'] in FINISHED_STATES:
+                    del self._jobs[job_id]
+                    self._record_stamps.pop(job_id, None)
+                    for path in (self._record_file(job_id), self._claim_file(job_id),
+                                 self._cancel_file(job_id)):
+                        if os.path.exists(path):
+                            os.remove(path)
+
+    def subscribe(self, max_pending: int = 16) -> queue.Queue:
+        """
+        Receive a copy of every job record as it changes
+
+        The queue is bounded. A subscriber that falls behind loses its
+        oldest pending updates, never blocks the scheduler and always
+        ends with the latest state.
+
+        Args:
+            max_pending (int): Updates kept for a slow subscriber
+
+        Returns:
+            queue.Queue: Queue of job records; pass it to unsubscribe when done
+        """
+        self._ensure_started()
+        updates = queue.Queue(maxsize=max_pending)
+        with self._lock:
+            self._subscribers.add(updates)
+        return updates
+
+    def unsubscribe(self, updates: queue.Queue):
+        """Stop delivering updates to a queue returned by subscribe"""
+        with self._lock:
+            self._subscribers.discard(updates)
+
+    def _notify(self, job: Dict):
+        """Push a job record to every subscriber without blocking"""
+        for updates in list(self._subscribers):
+            record = dict(job)
+            while True:
+                try:
+                    updates.put_nowait(record)
+                    break
+                except queue.Full:
+                    try:
+                        updates.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _ensure_started(self):
+        """Restore saved jobs and start the scheduler thread on first use"""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            os.makedirs(self.jobs_folder, exist_ok=True)
+            self._events = self._context.Queue()
+            self._restore()
+            self._started = True
+            scheduler = threading.Thread(target=self._run_scheduler, daemon=True)
+            scheduler.start()
+
+    def _restore(self):
+        """Load job records left by a previous run (or by other server processes)"""
+        for filename in os.listdir(self.jobs_folder):
+            if not (filename.startswith('job_') and filename.endswith('.record.json')):
+                continue
+            try:
+                with open(os.path.join(self.jobs_folder, filename), 'r') as f:
+                    job = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Skipping unreadable job record {filename}: {e}")
+                continue
+            if job['status'] not in FINISHED_STATES and self._claim(job['id']):
+                # Re-read: the process that ran it may have finished it meanwhile
+                job = self._read_record(job['id']) or job
+            if job['status'] in FINISHED_STATES:
+                self._release(job['id'])
+            elif job['id'] in self._claims:
+                job.update({'status': QUEUED, 'progress': 0, 'stage': 'Queued',
+                            'message': 'Requeued after server restart', 'started_at': None,
+                            'preview': None})
+                self._save(job)
+            self._jobs[job['id']] = job
+        # Only claimed jobs are ours to run
+        self._queue = sorted((job_id for job_id, job in self._jobs.items()
+                              if job['status'] == QUEUED and self._owns(job_id)),
+                             key=lambda job_id: self._jobs[job_id]['submitted_at'])
+
+    def _run_scheduler(self):
+        """Start queued jobs, apply worker events and enforce timeouts"""
+        while True:
+            try:
+                job_id, event, payload = self._events.get(timeout=0.2)
+                self._handle_event(job_id, event, payload)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                print(f"Job scheduler error: {e}")
+
+            with self._lock:
+                self._check_cancel_requests()
+                self._check_running()
+                if self._subscribers and time.time() - self._last_sync >= RECORD_SYNC_INTERVAL:
+                    # Streams also follow jobs other processes run
+                    self._sync_records()
+                while self._queue and len(self._processes) < self.max_concurrent:
+                    self._start(self._queue.pop(0))
+
+    def _start(self, job_id: str):
+        """Start the worker process of a queued job"""
+        job = self._jobs[job_id]
+        process = self._context.Process(
+            target=_WORKERS[job['params'].get('kind', MINING_JOB)],
+            args=(job_id, job['params'], job['result_file'], self._events),
+            daemon=True
+        )
+        process.start()
+        self._processes[job_id] = process
+        job.update({'status': RUNNING, 'started_at': time.time(), 'progress': 5,
+                    'stage': 'Starting', 'message': 'Starting worker process...'})
+        self._save(job)
+
+    def _handle_event(self, job_id: str, event: str, payload: Dict):
+        """Apply one event sent by a worker"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != RUNNING:
+                # Late event from a job that was cancelled or timed out
+                return
+            if event == 'progress':
+                job.update(payload)
+                self._save(job)
+                return
+            self._processes.pop(job_id, None)
+            if payload.get('profile_files'):
+                job['profile_files'] = payload['profile_files']
+            if event == 'failed':
+                job['error'] = payload['error']
+                self._finish(job, FAILED, f"Mining failed: {payload['error']}")
+                return
+            completed_job = dict(job)
+
+        # Publish before the job reads as completed, so clients that see
+        # 'completed' also see its results
+        extra = {}
+        try:
+            if self.on_complete:
+                extra = self.on_complete(completed_job) or {}
+        except Exception as e:
+            with self._lock:
+                job['error'] = f"Error publishing results: {e}"
+                self._finish(job, FAILED, job['error'])
+            return
+
+        with self._lock:
+            if job['status'] != RUNNING:
+                return
+            job.update(extra)
+            self._finish(job, COMPLETED, payload.get('message') or
+                         f"Mining complete! Found {payload['final_rules_count']} rules.")
+
+    def _check_cancel_requests(self):
+        """Cancel own jobs that another process asked to cancel"""
+        for job_id in list(self._claims):
+            cancel_file = self._cancel_file(job_id)
+            if os.path.exists(cancel_file):
+                os.remove(cancel_file)
+                self.cancel(job_id)
+
+    def _check_running(self):
+        """Kill jobs past their timeout and fail workers that died silently"""
+        now = time.time()
+        for job_id, process in list(self._processes.items()):
+            job = self._jobs[job_id]
+            if job['timeout'] is not None and now - job['started_at'] > job['timeout']:
+                self._kill(job_id)
+                job['error'] = f"Job exceeded its timeout of {job['timeout']} seconds"
+                self._finish(job, TIMED_OUT, job['error'])
+            elif not process.is_alive() and process.exitcode not in (0, None):
+                # Crashed without reporting (e.g. out of memory)
+                self._processes.pop(job_id)
+                job['error'] = f"Worker process exited with code {process.exitcode}"
+                self._finish(job, FAILED, job['error'])
+
+    def _kill(self, job_id: str):
+        """Terminate the worker process of a running job"""
+        process = self._processes.pop(job_id, None)
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+
+    def _finish(self, job: Dict, status: str, message: str):
+        """Move a job to a finished state"""
+        job.update({'status': status, 'message': message, 'finished_at': time.time()})
+        if status == COMPLETED:
+            job.update({'progress': 100, 'stage': 'Complete'})
+        self._save(job)
+        self._release(job['id'])
+
+    def _record_file(self, job_id: str) -> str:
+        return os.path.join(self.jobs_folder, f'job_{job_id}.record.json')
+
+    def _claim_file(self, job_id: str) -> str:
+        return os.path.join(self.jobs_folder, f'job_{job_id}.claim')
+
+    def _cancel_file(self, job_id: str) -> str:
+        return os.path.join(self.jobs_folder, f'job_{job_id}.cancel')
+
+    def _read_record(self, job_id: str) -> Optional[Dict]:
+        try:
+            with open(self._record_file(job_id), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _claim(self, job_id: str) -> bool:
+        """Lock the job's claim file; False if another live process holds it"""
+        if fcntl is None or job_id in self._claims:
+            return True
+        handle = open(self._claim_file(job_id), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._claims[job_id] = handle
+        return True
+
+    def _release(self, job_id: str):
+        """Give up the claim on a job (closing the file drops the lock)"""
+        handle = self._claims.pop(job_id, None)
+        if handle is not None:
+            handle.close()
+
+    def _owns(self, job_id: str) -> bool:
+        """Whether this process runs the job (always, without cross-process claims)"""
+        return fcntl is None or job_id in self._claims
+
+    def _load_record(self, job_id: str):
+        """
+        Reload a job another process may have submitted or updated
+
+        Jobs this process runs are never reloaded (it writes their records),
+        nor are finished ones; a record is only read again once it changed
+        on disk. Subscribers are notified of what changed.
+        """
+        if self._owns(job_id):
+            return
+        job = self._jobs.get(job_id)
+        if job is not None and job['status'] in FINISHED_STATES:
+            return
+        try:
+            stat = os.stat(self._record_file(job_id))
+        except OSError:
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if self._record_stamps.get(job_id) == stamp:
+            return
+        record = self._read_record(job_id)
+        if record is None:
+            return
+        self._record_stamps[job_id] = stamp
+        if job is None:
+            self._jobs[job_id] = job = record
+        elif record != job:
+            job.update(record)
+        else:
+            return
+        self._notify(job)
+
+    def _sync_records(self):
+        """Reload the records of every job other processes submitted or updated"""
+        self._last_sync = time.time()
+        if fcntl is None:
+            return
+        for filename in os.listdir(self.jobs_folder):
+            if filename.startswith('job_') and filename.endswith('.record.json'):
+                self._load_record(filename[len('job_'):-len('.record.json')])
+
+    def _save(self, job: Dict):
+        """Write a job record atomically and notify subscribers"""
+        record_file = self._record_file(job['id'])
+        tmp_file = record_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_file, record_file)
+        self._notify(job)
@@ -0,0 +1,353 @@
+"""
+Load Testing for RHAPSODY API
+Author: Ludjina
+Description: Drives /api/evaluate, /api/batch_evaluate and /api/rules and reports throughput and latency percentiles
+
+Usage:
+    python load_test.py --rate 500 --duration 20 --concurrency 32 --workers 4
+    python load_test.py --policy results/latest_results.json --rate 0 --output report.json
+    python load_test.py --url http://10.0.0.5:5000 --endpoints evaluate --rate 2000
+
+Without --url a server is started locally through serve.py (in a scratch
+directory, with --workers processes) and a saved or synthetic policy is
+loaded into it. Requests are open loop: request i is due at
+start + i / rate whether or not earlier ones have returned, and latency
+is measured from that due time, so queueing inside the server shows up in
+the percentiles instead of silently lowering the send rate. --rate 0
+switches to closed loop (every connection sends back to back) to find
+the maximum throughput.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+ENDPOINTS = ('evaluate', 'batch_evaluate', 'rules')
+PERCENTILES = (50, 95, 99)
+STARTUP_TIMEOUT = 60
+
+
+def synthetic_policy(path: str, attributes: int = 6, values: int = 20, rules: int = 500, seed: int = 0) -> str:
+    """
+    Write a results artifact with random rules over synthetic attributes
+
+    Args:
+        path (str): Destination JSON (same layout as RhapsodyAlgorithm.save_results)
+        attributes (int): Number of attributes (attr0, attr1, ...)
+        values (int): Values per attribute
+        rules (int): Number of final rules (1 to 3 atoms each)
+        seed (int): Random seed
+
+    Returns:
+        str: path
+    """
+    rng = random.Random(seed)
+    columns = [f'attr{index}' for index in range(attributes)]
+    final_rules = set()
+    while len(final_rules) < rules:
+        chosen = rng.sample(columns, rng.randint(1, min(3, attributes)))
+        final_rules.add(" ∧ ".join(sorted(f"{col}=v{rng.randrange(values)}" for col in chosen)))
+    final_rules = sorted(final_rules)
+    coverage = {rule: rng.randint(20, 5000) for rule in final_rules}
+
+    with open(path, 'w') as f:
+        json.dump({
+            'total_transactions': 100000,
+            'frequent_rules_count': len(final_rules),
+            'reliable_rules_count': len(final_rules),
+            'final_rules_count': len(final_rules),
+            'working_columns': columns,
+            'final_rules': final_rules,
+            'nUP': coverage,
+            'nA': dict(coverage)
+        }, f)
+    return path
+
+
+class LocalServer:
+    """serve.py running in a scratch directory for the duration of a test"""
+
+    def __init__(self, policy: str, port: int, workers: int):
+        """
+        Initialize the LocalServer
+
+        Args:
+            policy (str): Results artifact to serve
+            port (int): Port to listen on (127.0.0.1)
+            workers (int): Worker processes
+        """
+        self.policy = os.path.abspath(policy)
+        self.port = port
+        self.workers = workers
+        self.url = f'http://127.0.0.1:{port}'
+        self._workdir = None
+        self._process = None
+
+    def __enter__(self):
+        self._workdir = tempfile.TemporaryDirectory(prefix='rhapsody-load-')
+        serve = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')
+        self._log = open(os.path.join(self._workdir.name, 'server.log'), 'w')
+        self._process = subprocess.Popen(
+            [sys.executable, serve, '--host', '127.0.0.1', '--port', str(self.port),
+             '--workers', str(self.workers), '--policy', self.policy,
+             '--shared-dir', os.path.join(self._workdir.name, 'compiled')],
+            cwd=self._workdir.name, stdout=self._log, stderr=subprocess.STDOUT,
+            env=dict(os.environ, PYTHONPATH=os.path.dirname(serve))
+        )
+
+        deadline = time.time() + STARTUP_TIMEOUT
+        while time.time() < deadline:
+            if self._process.poll() is not None:
+                break
+            try:
+                status, _ = request(self.url, 'GET', '/api/rules?limit=1')
+                if status == 200:
+                    return self
+            except OSError:
+                pass
+            time.sleep(0.2)
+        exited = self._process.poll() is not None
+        self._stop(dump_log=True)
+        if exited:
+            raise RuntimeError(f"Server exited with code {self._process.returncode} during startup (see its log above)")
+        raise RuntimeError(f"Server did not start within {STARTUP_TIMEOUT}s (see its log above)")
+
+    def __exit__(self, *exc):
+        self._stop(dump_log=False)
+
+    def _stop(self, dump_log: bool):
+        """
+        Terminate the server and remove its directory
+
+        Args:
+            dump_log (bool): Print the end of the server log even if it was
+                terminated by us (startup failures); otherwise only a crash prints it
+        """
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        crashed = self._process is not None and self._process.returncode not in (0, None, -15)
+        self._log.close()
+        if dump_log or crashed:
+            with open(self._log.name) as f:
+                print(f.read()[-2000:], file=sys.stderr)
+        self._workdir.cleanup()
+
+
+def request(url: str, method: str, path: str, body: Optional[Dict] = None, timeout: float = 30):
+    """One-off request (setup and health checks); returns (status, parsed JSON)"""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+    try:
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, json.loads(data) if data else None
+    finally:
+        conn.close()
+
+
+def fetch_test_requests(url: str, count: int, seed: int) -> List[Dict]:
+    """Access requests generated by the server from its own policy"""
+    status, data = request(url, 'GET', f'/api/generate_test_requests?count={count}&seed={seed}')
+    if status != 200:
+        raise RuntimeError(f"Could not generate test requests: {data}")
+    return data['test_requests']
+
+
+def build_scenario(endpoint: str, test_requests: List[Dict], batch_size: int):
+    """(method, path, bodies) for an endpoint; bodies are pre-encoded and reused round robin"""
+    if endpoint == 'evaluate':
+        return 'POST', '/api/evaluate', [json.dumps(req).encode('utf-8') for req in test_requests]
+    if endpoint == 'batch_evaluate':
+        batches = [test_requests[start:start + batch_size]
+                   for start in range(0, len(test_requests), batch_size)]
+        return 'POST', '/api/batch_evaluate', [json.dumps({'requests': batch}).encode('utf-8')
+                                               for batch in batches if batch]
+    if endpoint == 'rules':
+        return 'GET', '/api/rules', [None]
+    raise ValueError(f"Unknown endpoint: {endpoint} (expected one of {ENDPOINTS})")
+
+
+def run_scenario(url: str, method: str, path: str, bodies: List[Optional[bytes]], rate: float,
+                 duration: float, concurrency: int, timeout: float = 30) -> Dict:
+    """
+    Send requests for ``duration`` seconds and measure them
+
+    Args:
+        url (str): Server base URL
+        method (str): HTTP method
+        path (str): Request path
+        bodies (List[bytes]): Request bodies, used round robin
+        rate (float): Requests per second (open loop); 0 for closed loop
+        duration (float): Seconds to send for
+        concurrency (int): Connections (threads) sending
+        timeout (float): Per-request timeout
+
+    Returns:
+        Dict: Counts, throughput and latency percentiles in milliseconds
+    """
+    parts = urlsplit(url)
+    counter = itertools.count()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start = time.perf_counter() + 0.1
+    end = start + duration
+
+    def sender():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+        local_latencies, local_errors = [], []
+        while True:
+            index = next(counter)
+            if rate > 0:
+                due = start + index / rate
+                if due >= end:
+                    break
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                due = time.perf_counter()
+                if due >= end:
+                    break
+
+            body = bodies[index % len(bodies)]
+            try:
+                headers = {'Content-Type': 'application/json'} if body is not None else {}
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                finished = time.perf_counter()
+                if response.status != 200:
+                    local_errors.append(f'HTTP {response.status}')
+                else:
+                    local_latencies.append(finished - due)
+                if response.will_close:
+                    conn.close()
+            except (OSError, http.client.HTTPException) as e:
+                local_errors.append(type(e).__name__)
+                conn.close()
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors.extend(local_errors)
+
+    threads = [threading.Thread(target=sender, daemon=True) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    result = {
+        'requests': len(latencies) + len(errors),
+        'ok': len(latencies),
+        'errors': len(errors),
+        'error_types': {error: errors.count(error) for error in sorted(set(errors))},
+        'elapsed_seconds': round(elapsed, 3),
+        'target_rate': rate or None,
+        'throughput': round(len(latencies) / elapsed, 1)
+    }
+    if latencies:
+        milliseconds = np.array(latencies) * 1000
+        result['latency_ms'] = {
+            **{f'p{p}': round(float(np.percentile(milliseconds, p)), 3) for p in PERCENTILES},
+            'max': round(float(milliseconds.max()), 3),
+            'mean': round(float(milliseconds.mean()), 3)
+        }
+    return result
+
+
+def run_load_test(url: str, endpoints: List[str], rate: float, duration: float, concurrency: int,
+                  batch_size: int = 100, request_count: int = 1000, seed: int = 0,
+                  warmup: float = 1.0) -> Dict:
+    """
+    Run every scenario against a running server
+
+    Returns:
+        Dict: One result per endpoint (see run_scenario)
+    """
+    test_requests = fetch_test_requests(url, request_count, seed)
+    if not test_requests:
+        raise RuntimeError("The server generated no test requests (is a policy loaded?)")
+
+    scenarios = {}
+    for endpoint in endpoints:
+        method, path, bodies = build_scenario(endpoint, test_requests, batch_size)
+        if warmup > 0:
+            run_scenario(url, method, path, bodies, 0, warmup, concurrency)
+        result = run_scenario(url, method, path, bodies, rate, duration, concurrency)
+        if endpoint == 'batch_evaluate':
+            result['batch_size'] = batch_size
+            result['evaluations_per_second'] = round(result['throughput'] * batch_size, 1)
+        scenarios[endpoint] = result
+
+        latency = result.get('latency_ms', {})
+        print(f"{endpoint}: {result['throughput']} req/s, p50 {latency.get('p50')} ms, "
+              f"p99 {latency.get('p99')} ms, {result['errors']} errors", file=sys.stderr)
+    return scenarios
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Load test the RHAPSODY API')
+    parser.add_argument('--url', help='Test a running server instead of starting one')
+    parser.add_argument('--policy', help='Results JSON to serve (default: a synthetic policy)')
+    parser.add_argument('--synthetic-rules', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=1, help='serve.py worker processes')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument('--rate', type=float, default=200, help='Requests per second; 0 for closed loop')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per endpoint')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--warmup', type=float, default=1.0, help='Closed-loop seconds before measuring')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Also write the JSON report here')
+    args = parser.parse_args(argv)
+
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    config.update({'python': platform.python_version(), 'cpus': os.cpu_count()})
+
+    if args.url:
+        scenarios = run_load_test(args.url, args.endpoints, args.rate, args.duration, args.concurrency,
+                                  args.batch_size, seed=args.seed, warmup=args.warmup)
+    else:
+        with tempfile.TemporaryDirectory(prefix='rhapsody-policy-') as policy_dir:
+            policy = args.policy or synthetic_policy(os.path.join(policy_dir, 'synthetic_results.json'),
+                                                     rules=args.synthetic_rules, seed=args.seed)
+            with LocalServer(policy, args.port, args.workers) as server:
+                scenarios = run_load_test(server.url, args.endpoints, args.rate, args.duration,
+                                          args.concurrency, args.batch_size, seed=args.seed,
+                                          warmup=args.warmup)
+
+    report = {'config': config, 'scenarios': scenarios, 'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
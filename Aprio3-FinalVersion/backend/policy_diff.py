@@ -0,0 +1,121 @@
+"""
+Policy Diff for RHAPSODY
+Author: Ludjina
+Description: Differences between two mined policies, as deltas PolicyEvaluator.apply_delta can apply
+"""
+
+import json
+import sys
+from typing import Dict, FrozenSet, List
+
+
+def rule_atoms(rule: str) -> FrozenSet[str]:
+    """Atoms of a rule as an interned set, so rules compare regardless of atom order"""
+    return frozenset(sys.intern(atom.strip()) for atom in rule.split(' ∧ ') if atom.strip())
+
+
+def policy_results(source) -> Dict:
+    """
+    Final rules and statistics of a policy
+
+    Args:
+        source: Results JSON path, results dict (RhapsodyAlgorithm.save_results
+            layout), RhapsodyAlgorithm or PolicyEvaluator
+
+    Returns:
+        Dict: 'final_rules', 'nUP', 'nA' and 'working_columns'
+    """
+    if isinstance(source, str):
+        with open(source, 'r') as f:
+            source = json.load(f)
+    if isinstance(source, dict):
+        return {
+            'final_rules': list(source.get('final_rules', [])),
+            'nUP': source.get('nUP', {}),
+            'nA': source.get('nA', {}),
+            'working_columns': source.get('working_columns')
+        }
+    if hasattr(source, 'final_rules'):
+        # RhapsodyAlgorithm after a run
+        return {'final_rules': list(source.final_rules), 'nUP': source.nUP, 'nA': source.nA,
+                'working_columns': source.working_columns}
+    if hasattr(source, 'rule_statistics'):
+        # PolicyEvaluator (e.g. the one being served)
+        return {'final_rules': list(source.rules),
+                'nUP': source.rule_statistics.get('nUP', {}),
+                'nA': source.rule_statistics.get('nA', {}),
+                'working_columns': sorted(source.available_attributes) or None}
+    raise TypeError(f"Cannot read a policy from {type(source).__name__}")
+
+
+def diff_policies(old, new) -> Dict:
+    """
+    Compare the final rules of two policies
+
+    Rules are matched by their atom sets. A rule in both policies whose
+    nUP or nA differs is 'changed'; one written with its atoms in another
+    order is 'renamed' (old text -> new text).
+
+    Args:
+        old: Policy before (anything policy_results accepts)
+        new: Policy after
+
+    Returns:
+        Dict: 'added', 'removed', 'changed' (rule -> {'nUP': [old, new],
+        'nA': [old, new]}), 'renamed', 'rules' (the new final rules in
+        order), 'nUP'/'nA' of the new final rules, 'working_columns' and a
+        'summary' of counts
+    """
+    old, new = policy_results(old), policy_results(new)
+    old_texts, new_texts = set(old['final_rules']), set(new['final_rules'])
+
+    # Identical texts are the same rule; only the rest are compared by atoms
+    old_by_atoms = {rule_atoms(rule): rule for rule in old['final_rules'] if rule not in new_texts}
+    new_by_atoms = {rule_atoms(rule): rule for rule in new['final_rules'] if rule not in old_texts}
+    added = [rule for atoms, rule in new_by_atoms.items() if atoms not in old_by_atoms]
+    removed = [rule for atoms, rule in old_by_atoms.items() if atoms not in new_by_atoms]
+    renamed = {old_by_atoms[atoms]: rule for atoms, rule in new_by_atoms.items() if atoms in old_by_atoms}
+
+    previous = {new_rule: old_rule for old_rule, new_rule in renamed.items()}
+    changed = {}
+    for rule in new['final_rules']:
+        old_rule = rule if rule in old_texts else previous.get(rule)
+        if old_rule is None:
+            continue
+        counts = {}
+        for stat in ('nUP', 'nA'):
+            before, after = old[stat].get(old_rule), new[stat].get(rule)
+            if before != after:
+                counts[stat] = [before, after]
+        if counts:
+            changed[rule] = counts
+
+    new_rules = new['final_rules']
+    return {
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'renamed': renamed,
+        'rules': list(new_rules),
+        'nUP': {rule: new['nUP'][rule] for rule in new_rules if rule in new['nUP']},
+        'nA': {rule: new['nA'][rule] for rule in new_rules if rule in new['nA']},
+        'working_columns': new['working_columns'],
+        'summary': {
+            'added': len(added),
+            'removed': len(removed),
+            'changed': len(changed),
+            'unchanged': len(new['final_rules']) - len(added) - len(changed),
+            'rules_before': len(old['final_rules']),
+            'rules_after': len(new_rules)
+        }
+    }
+
+
+def summarize_delta(delta: Dict) -> Dict:
+    """The delta without the full rule list and statistics (for responses and job records)"""
+    return {key: value for key, value in delta.items() if key not in ('rules', 'nUP', 'nA')}
+
+
+def changed_rules(delta: Dict) -> List[str]:
+    """Rules of the new policy whose presence or statistics differ"""
+    return list(delta['added']) + list(delta['changed'])
@@ -5,7 +5,52 @@ Description: Evaluates access requests against mined ABAC policies
 """
 
 import json
-from typing import Dict, List, Tuple
+import random
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Mapping
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Value used by generated near-miss requests when an attribute has no other value
+UNSEEN_VALUE = '<unseen>'
+# Decisions of single-request evaluation remembered per evaluator (0 disables)
+DECISION_CACHE_SIZE = 65536
+# (request, rule) candidate pairs checked at once by first_matching_rules
+MATCH_PAIR_BUDGET = 1 << 21
+
+_UNDECIDED = object()
+
+
+def request_value(value) -> str:
+    """A request attribute value as compared with rule values: text, stripped ('' if missing)"""
+    return '' if value is None else str(value).strip()
+
+
+def _increasing_subsequence_mask(sequence: List[int]) -> np.ndarray:
+    """Mask of one longest increasing subsequence of distinct integers"""
+    tails = []
+    tail_positions = []
+    previous = [-1] * len(sequence)
+    for position, value in enumerate(sequence):
+        length = bisect_left(tails, value)
+        if length == len(tails):
+            tails.append(value)
+            tail_positions.append(position)
+        else:
+            tails[length] = value
+            tail_positions[length] = position
+        previous[position] = tail_positions[length - 1] if length else -1
+
+    mask = np.zeros(len(sequence), dtype=bool)
+    position = tail_positions[-1] if tail_positions else -1
+    while position >= 0:
+        mask[position] = True
+        position = previous[position]
+    return mask
 
 
 class PolicyEvaluator:
@@ -26,6 +71,15 @@ class PolicyEvaluator:
         self.rules = rules or []
         self.rule_statistics = {}
         self.available_attributes = set()
+        self._rule_index = None
+        self._rule_index_source = None
+        self._postings = None
+        self._postings_source = None
+        # Request key -> first matching rule (None = denied), most recent last;
+        # valid while ``self.rules`` is the list in ``_decisions_source``
+        self._decisions = OrderedDict()
+        self._decisions_source = self.rules
+        self._decisions_lock = threading.Lock()
         
     def load_rules(self, rules: List[str]):
         """
@@ -85,7 +139,109 @@ class PolicyEvaluator:
                 rule_dict[attr.strip()] = value.strip()
                 
         return rule_dict
-    
+
+    def _get_rule_index(self) -> Dict:
+        """
+        Get the encoded form of the loaded rules, building it on first use
+
+        Every attribute gets a column and every value seen for it in the rules
+        gets an integer code. The index is cached until ``self.rules`` is
+        replaced.
+
+        Returns:
+            Dict: 'attributes' (sorted names), 'values' (sorted values per
+            attribute), 'value_codes' (value -> code per attribute) and
+            'codes' (int32 array of shape (rules, attributes), -1 = absent)
+        """
+        if self._rule_index is not None and self._rule_index_source is self.rules:
+            return self._rule_index
+
+        parsed_rules = [self.parse_rule(rule) for rule in self.rules]
+
+        all_attrs = {}
+        for rule_attrs in parsed_rules:
+            for attr, value in rule_attrs.items():
+                all_attrs.setdefault(attr, set()).add(value)
+
+        attributes = sorted(all_attrs)
+        values = [sorted(all_attrs[attr]) for attr in attributes]
+        value_codes = [{value: code for code, value in enumerate(attr_values)}
+                       for attr_values in values]
+        attr_positions = {attr: pos for pos, attr in enumerate(attributes)}
+
+        codes = np.full((len(parsed_rules), len(attributes)), -1, dtype=np.int32)
+        for row, rule_attrs in enumerate(parsed_rules):
+            for attr, value in rule_attrs.items():
+                pos = attr_positions[attr]
+                codes[row, pos] = value_codes[pos][value]
+
+        self._rule_index = {
+            'attributes': attributes,
+            'values': values,
+            'value_codes': value_codes,
+            'codes': codes
+        }
+        self._rule_index_source = self.rules
+        return self._rule_index
+
+    def encode_requests(self, requests: List[Dict[str, str]]) -> np.ndarray:
+        """
+        Encode requests against the rule index
+
+        Args:
+            requests (List[Dict[str, str]]): Access requests
+
+        Returns:
+            np.ndarray: int32 array of shape (requests, attributes) with the
+            value code per attribute, -1 for a missing or empty value and -2
+            for a value that no rule uses
+        """
+        index = self._get_rule_index()
+        attributes = index['attributes']
+        codes = np.full((len(requests), len(attributes)), -1, dtype=np.int32)
+
+        for pos, attr in enumerate(attributes):
+            value_codes = index['value_codes'][pos]
+            column = codes[:, pos]
+            for row, request in enumerate(requests):
+                value = request_value(request.get(attr))
+                if value:
+                    column[row] = value_codes.get(value, -2)
+
+        return codes
+
+    def match_bitmaps(self, request_codes: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Compute which rules match which encoded requests
+
+        Uses the same semantics as rule_matches_request: every rule attribute
+        the request fills in must have the rule's value, and at least one
+        must be filled in.
+
+        Args:
+            request_codes (np.ndarray): Output of encode_requests (or an
+                equivalent encoding)
+            rows (np.ndarray): Positions of the rules to test (default: all)
+
+        Returns:
+            np.ndarray: bool array of shape (rules, requests)
+        """
+        rule_codes = self._get_rule_index()['codes']
+        if rows is not None:
+            rule_codes = rule_codes[rows]
+        bitmaps = np.zeros((len(rule_codes), len(request_codes)), dtype=bool)
+
+        for row, codes in enumerate(rule_codes):
+            present = np.flatnonzero(codes >= 0)
+            if not len(present):
+                continue
+            requested = request_codes[:, present]
+            equal = requested == codes[present]
+            conflict = ((requested != -1) & ~equal).any(axis=1)
+            bitmaps[row] = equal.any(axis=1) & ~conflict
+
+        return bitmaps
+
     def rule_matches_request(self, rule: str, request: Dict[str, str]) -> bool:
         """
         Check if a rule matches an access request
@@ -94,21 +250,21 @@ class PolicyEvaluator:
         
         # Check if all rule attributes that have values in request match
         for attr, rule_value in rule_attrs.items():
-            request_value = request.get(attr, '').strip()
+            value = request_value(request.get(attr))
             
             # Skip if request doesn't have this attribute or it's empty
-            if not request_value:
+            if not value:
                 continue
                 
             # Must match exactly if both have values
-            if request_value != rule_value:
+            if value != rule_value:
                 return False
         
         # Must have at least one matching attribute
         matching_attrs = 0
         for attr, rule_value in rule_attrs.items():
-            request_value = request.get(attr, '').strip()
-            if request_value and request_value == rule_value:
+            value = request_value(request.get(attr))
+            if value and value == rule_value:
                 matching_attrs += 1
         
         return matching_attrs > 0
@@ -133,7 +289,7 @@ class PolicyEvaluator:
         
         # Check if request has at least one attribute filled
         has_attributes = any(
-            value.strip() != '' for key, value in request.items() 
+            request_value(value) != '' for key, value in request.items() 
             if key in self.available_attributes
         )
         if not has_attributes:
@@ -144,16 +300,21 @@ class PolicyEvaluator:
                 'request_details': request
             }
         
-        # Find matching rule
-        for rule in self.rules:
-            if self.rule_matches_request(rule, request):
-                return {
-                    'granted': True,
-                    'message': "Access Granted! Request matches a mined policy rule.",
-                    'matching_rule': rule,
-                    'request_details': request,
-                    'rule_statistics': self.rule_statistics.get('nUP', {}).get(rule, 'N/A')
-                }
+        # Find matching rule (repeated requests are answered from the memo)
+        key = self._decision_key(request)
+        rule = self._cached_decision(key)
+        if rule is _UNDECIDED:
+            rule = next((rule for rule in self.rules if self.rule_matches_request(rule, request)), None)
+            self._remember_decision(key, rule)
+        
+        if rule is not None:
+            return {
+                'granted': True,
+                'message': "Access Granted! Request matches a mined policy rule.",
+                'matching_rule': rule,
+                'request_details': request,
+                'rule_statistics': self.rule_statistics.get('nUP', {}).get(rule, 'N/A')
+            }
         
         return {
             'granted': False,
@@ -162,6 +323,184 @@ class PolicyEvaluator:
             'request_details': request
         }
     
+    @staticmethod
+    def _decision_key(request: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        """The filled-in attributes of a request, which alone decide its first matching rule"""
+        values = ((attr, request_value(value)) for attr, value in request.items())
+        return tuple(sorted((attr, value) for attr, value in values if value))
+
+    def _sync_decisions(self):
+        """Forget remembered decisions once ``self.rules`` was replaced (call under the lock)"""
+        if self._decisions_source is not self.rules:
+            self._decisions = OrderedDict()
+            self._decisions_source = self.rules
+
+    def _cached_decision(self, key):
+        if not DECISION_CACHE_SIZE:
+            return _UNDECIDED
+        with self._decisions_lock:
+            self._sync_decisions()
+            rule = self._decisions.get(key, _UNDECIDED)
+            if rule is not _UNDECIDED:
+                self._decisions.move_to_end(key)
+        return rule
+
+    def _remember_decision(self, key, rule: Optional[str]):
+        if not DECISION_CACHE_SIZE:
+            return
+        with self._decisions_lock:
+            self._sync_decisions()
+            self._decisions[key] = rule
+            if len(self._decisions) > DECISION_CACHE_SIZE:
+                self._decisions.popitem(last=False)
+
+    def copy(self) -> 'PolicyEvaluator':
+        """
+        Copy the evaluator, sharing its (never modified) rule index
+
+        Used to apply a delta without touching a published evaluator.
+
+        Returns:
+            PolicyEvaluator: Evaluator with the same rules, statistics,
+            attributes and remembered decisions
+        """
+        clone = PolicyEvaluator(list(self.rules))
+        clone.rule_statistics = {
+            key: dict(value) if isinstance(value, Mapping) else value
+            for key, value in self.rule_statistics.items()
+        }
+        clone.available_attributes = set(self.available_attributes)
+        clone._rule_index = self._get_rule_index()
+        clone._rule_index_source = clone.rules
+        clone._postings, clone._postings_source = self._postings, self._postings_source
+        with self._decisions_lock:
+            self._sync_decisions()
+            clone._decisions = OrderedDict(self._decisions)
+        clone._decisions_source = clone.rules
+        return clone
+
+    def apply_delta(self, delta: Dict) -> Dict:
+        """
+        Move the evaluator to a new policy given as a delta (policy_diff.diff_policies)
+
+        Only the added rules are parsed. The rule index is rebuilt from the
+        codes of the kept rules, giving the same index as building it from
+        the new rules. Remembered decisions stay valid unless the request
+        matches an added rule or a rule whose position relative to the
+        other kept rules changed (removed rules only invalidate the
+        requests they decided), so only those entries are dropped.
+
+        Args:
+            delta (Dict): Output of diff_policies with this evaluator's
+                rules as the old policy
+
+        Returns:
+            Dict: Counts of added, removed and moved rules and of the
+            remembered decisions dropped and kept
+
+        Raises:
+            ValueError: If the delta was not computed against these rules
+        """
+        index = self._get_rule_index()
+        with self._decisions_lock:
+            self._sync_decisions()
+        renamed = delta.get('renamed', {})
+        removed = set(delta.get('removed', []))
+        new_rules = list(delta['rules'])
+
+        old_rows = {renamed.get(rule, rule): row for row, rule in enumerate(self.rules) if rule not in removed}
+        kept_rows = np.array([old_rows.get(rule, -1) for rule in new_rules], dtype=np.int64)
+        kept = kept_rows >= 0
+        added_rows = np.flatnonzero(~kept)
+        if (len(removed) + int(kept.sum()) != len(self.rules)
+                or len(old_rows) != int(kept.sum())
+                or {new_rules[row] for row in added_rows} != set(delta.get('added', []))):
+            raise ValueError("Delta does not apply to the loaded rules")
+
+        # Values still used by kept rules plus those of the added rules
+        kept_codes = index['codes'][kept_rows[kept]]
+        parsed_added = [self.parse_rule(new_rules[row]) for row in added_rows]
+        used_codes = []
+        attr_values = {}
+        for pos, attr in enumerate(index['attributes']):
+            codes = np.unique(kept_codes[:, pos])
+            codes = codes[codes >= 0]
+            used_codes.append(codes)
+            if len(codes):
+                attr_values[attr] = {index['values'][pos][code] for code in codes.tolist()}
+        for rule_attrs in parsed_added:
+            for attr, value in rule_attrs.items():
+                attr_values.setdefault(attr, set()).add(value)
+
+        attributes = sorted(attr_values)
+        values = [sorted(attr_values[attr]) for attr in attributes]
+        value_codes = [{value: code for code, value in enumerate(column_values)}
+                       for column_values in values]
+        attr_positions = {attr: pos for pos, attr in enumerate(attributes)}
+
+        codes = np.full((len(new_rules), len(attributes)), -1, dtype=np.int32)
+        for old_pos, attr in enumerate(index['attributes']):
+            if attr not in attr_positions:
+                continue
+            pos = attr_positions[attr]
+            remap = np.full(len(index['values'][old_pos]) + 1, -1, dtype=np.int32)
+            remap[used_codes[old_pos]] = [value_codes[pos][index['values'][old_pos][code]]
+                                          for code in used_codes[old_pos].tolist()]
+            # Code -1 (absent) maps through the extra last slot to -1
+            codes[kept, pos] = remap[kept_codes[:, old_pos]]
+        for row, rule_attrs in zip(added_rows.tolist(), parsed_added):
+            for attr, value in rule_attrs.items():
+                pos = attr_positions[attr]
+                codes[row, pos] = value_codes[pos][value]
+
+        self.rules = new_rules
+        self._rule_index = {
+            'attributes': attributes,
+            'values': values,
+            'value_codes': value_codes,
+            'codes': codes
+        }
+        self._rule_index_source = self.rules
+
+        statistics = dict(self.rule_statistics)
+        for stat in ('nUP', 'nA'):
+            counts = {rule: count for rule, count in dict(statistics.get(stat, {})).items()
+                      if rule not in removed and rule not in renamed}
+            counts.update(delta.get(stat, {}))
+            statistics[stat] = counts
+        self.rule_statistics = statistics
+        if delta.get('working_columns'):
+            self.set_available_attributes(delta['working_columns'])
+
+        # Kept rules outside one longest in-order run are the ones that moved
+        moved = np.flatnonzero(kept)[~_increasing_subsequence_mask(kept_rows[kept].tolist())]
+        affected = np.concatenate([added_rows, moved])
+        dropped = 0
+        with self._decisions_lock:
+            # The remembered decisions were checked against the old rules above
+            self._decisions_source = self.rules
+            keys = list(self._decisions)
+            stale = [key for key in keys if self._decisions[key] in removed]
+            if len(affected) and keys:
+                request_codes = self.encode_requests([dict(key) for key in keys])
+                hits = self.match_bitmaps(request_codes, affected).any(axis=0)
+                stale.extend(key for key, hit in zip(keys, hits.tolist()) if hit)
+            for key in stale:
+                if self._decisions.pop(key, _UNDECIDED) is not _UNDECIDED:
+                    dropped += 1
+            for key, rule in list(self._decisions.items()):
+                if rule in renamed:
+                    self._decisions[key] = renamed[rule]
+            remaining = len(self._decisions)
+
+        return {
+            'added': len(added_rows),
+            'removed': len(removed),
+            'moved': len(moved),
+            'decisions_dropped': dropped,
+            'decisions_kept': remaining
+        }
+
     def batch_evaluate(self, requests: List[Dict[str, str]]) -> List[Dict]:
         """
         Evaluate multiple access requests
@@ -170,14 +509,137 @@ class PolicyEvaluator:
             requests (List[Dict[str, str]]): List of access requests
             
         Returns:
-            List[Dict]: List of evaluation results
+            List[Dict]: List of evaluation results (same as evaluate_request)
         """
+        if not self.rules:
+            return [self.evaluate_request(request) for request in requests]
+        
+        # Decide all requests at once against the rule index
+        matches = self.first_matching_rules(self.encode_requests(requests))
+        nUP = self.rule_statistics.get('nUP', {})
+        
         results = []
-        for request in requests:
-            result = self.evaluate_request(request)
-            results.append(result)
+        for request, match in zip(requests, matches.tolist()):
+            has_attributes = any(
+                request_value(value) != '' for key, value in request.items()
+                if key in self.available_attributes
+            )
+            if not has_attributes:
+                results.append({
+                    'granted': False,
+                    'message': "Please fill in at least one attribute.",
+                    'matching_rule': None,
+                    'request_details': request
+                })
+            elif match >= 0:
+                rule = self.rules[match]
+                results.append({
+                    'granted': True,
+                    'message': "Access Granted! Request matches a mined policy rule.",
+                    'matching_rule': rule,
+                    'request_details': request,
+                    'rule_statistics': nUP.get(rule, 'N/A')
+                })
+            else:
+                results.append({
+                    'granted': False,
+                    'message': "Access Denied! No matching rule found in the mined policy.",
+                    'matching_rule': None,
+                    'request_details': request
+                })
         
         return results
+
+    def _get_postings(self) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Per attribute, the rule positions grouped by value code, built on first use
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray]]: (rows, bounds) per attribute;
+            rules with value code c are rows[bounds[c]:bounds[c + 1]], in
+            policy order
+        """
+        index = self._get_rule_index()
+        if self._postings is not None and self._postings_source is index:
+            return self._postings
+
+        postings = []
+        for pos, attr_values in enumerate(index['values']):
+            column = np.asarray(index['codes'][:, pos])
+            rows = np.argsort(column, kind='stable')
+            bounds = np.searchsorted(column[rows], np.arange(len(attr_values) + 1))
+            postings.append((rows, bounds))
+
+        self._postings = postings
+        self._postings_source = index
+        return postings
+
+    def first_matching_rules(self, request_codes: np.ndarray) -> np.ndarray:
+        """
+        Find the first rule (in policy order) matching each encoded request
+
+        Same semantics as match_bitmaps, but only rules sharing at least one
+        value with a request are looked at: the postings give those
+        (request, rule) pairs with how many values they share, and a pair
+        matches when that equals the number of the rule's attributes the
+        request fills in. The cost grows with the number of such pairs, not
+        with rules x requests, so small batches (e.g. coalesced single
+        requests) are cheap too. Requests are processed in chunks of about
+        MATCH_PAIR_BUDGET pairs.
+
+        Args:
+            request_codes (np.ndarray): Output of encode_requests
+
+        Returns:
+            np.ndarray: Rule position per request, -1 when no rule matches
+        """
+        index = self._get_rule_index()
+        num_rules, num_attrs = index['codes'].shape
+        first_match = np.full(len(request_codes), -1, dtype=np.int64)
+        if not len(request_codes) or not num_rules or not num_attrs:
+            return first_match
+
+        postings = self._get_postings()
+        present = np.asarray(index['codes']) >= 0
+
+        # Rules sharing each request's value, per attribute
+        starts = np.zeros(request_codes.shape, dtype=np.int64)
+        lengths = np.zeros(request_codes.shape, dtype=np.int64)
+        for pos, (_, bounds) in enumerate(postings):
+            column = request_codes[:, pos]
+            valid = np.flatnonzero(column >= 0)
+            starts[valid, pos] = bounds[column[valid]]
+            lengths[valid, pos] = bounds[column[valid] + 1] - starts[valid, pos]
+        pair_ends = np.cumsum(lengths.sum(axis=1))
+
+        lo = 0
+        while lo < len(request_codes):
+            budget_end = (pair_ends[lo - 1] if lo else 0) + MATCH_PAIR_BUDGET
+            hi = max(lo + 1, int(np.searchsorted(pair_ends, budget_end, side='right')))
+
+            request_parts, rule_parts = [], []
+            for pos, (rows, _) in enumerate(postings):
+                counts = lengths[lo:hi, pos]
+                total = int(counts.sum())
+                if not total:
+                    continue
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                request_parts.append(np.repeat(np.arange(hi - lo), counts))
+                rule_parts.append(rows[np.repeat(starts[lo:hi, pos], counts) + offsets])
+
+            if request_parts:
+                keys = np.concatenate(request_parts) * num_rules + np.concatenate(rule_parts)
+                keys, equal_counts = np.unique(keys, return_counts=True)
+                requests, rules = np.divmod(keys, num_rules)
+                filled = request_codes[lo:hi] != -1
+                matched = equal_counts == (present[rules] & filled[requests]).sum(axis=1)
+                # Keys are sorted by request, then rule: the first pair per request wins
+                requests, rules = requests[matched], rules[matched]
+                decided, first = np.unique(requests, return_index=True)
+                first_match[lo + decided] = rules[first]
+            lo = hi
+
+        return first_match
     
     def get_rule_coverage_stats(self) -> Dict:
         """
@@ -256,17 +718,13 @@ class PolicyEvaluator:
         
         test_requests = []
         
-        # Extract all possible attribute values from rules
-        all_attrs = {}
-        for rule in self.rules:
-            rule_attrs = self.parse_rule(rule)
-            for attr, value in rule_attrs.items():
-                if attr not in all_attrs:
-                    all_attrs[attr] = set()
-                all_attrs[attr].add(value)
+        # Attribute values come from the cached rule index
+        index = self._get_rule_index()
+        all_attrs = dict(zip(index['attributes'], index['values']))
+        if not all_attrs:
+            return []
         
         # Generate test requests
-        import random
         for _ in range(num_requests):
             request = {}
             # Randomly select attributes and values
@@ -276,11 +734,126 @@ class PolicyEvaluator:
             )
             
             for attr in selected_attrs:
-                request[attr] = random.choice(list(all_attrs[attr]))
+                request[attr] = random.choice(all_attrs[attr])
             
             test_requests.append(request)
         
         return test_requests
+
+    def iter_test_request_batches(self, num_requests: int, batch_size: int = 10000,
+                                  seed: Optional[int] = None, grant_ratio: float = 0.5,
+                                  near_miss_ratio: float = 0.25) -> Iterator[List[Dict[str, str]]]:
+        """
+        Generate seeded test requests in batches for load testing
+
+        The stream mixes three kinds of requests:
+        - grant: exactly the atoms of one rule. Every rule gets one before any
+          rule gets a second, as long as num_requests allows it.
+        - near-miss: the atoms of one rule with a single value swapped for
+          another value of the same attribute (or UNSEEN_VALUE if the
+          attribute has only one value).
+        - random: a random subset of attributes with random values, like
+          generate_test_requests. The remaining share goes to these.
+
+        Args:
+            num_requests (int): Total number of requests to generate
+            batch_size (int): Number of requests per yielded batch
+            seed (int): Seed for reproducible streams
+            grant_ratio (float): Share of grant requests (0-1)
+            near_miss_ratio (float): Share of near-miss requests (0-1)
+
+        Yields:
+            List[Dict[str, str]]: Batches of test requests
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if grant_ratio < 0 or near_miss_ratio < 0 or grant_ratio + near_miss_ratio > 1:
+            raise ValueError("grant_ratio and near_miss_ratio must be non-negative and sum to at most 1")
+
+        index = self._get_rule_index()
+        attributes = index['attributes']
+        rule_codes = index['codes']
+        num_rules, num_attrs = rule_codes.shape
+        if num_requests <= 0 or num_rules == 0 or num_attrs == 0:
+            return
+
+        rng = np.random.default_rng(seed)
+        num_values = np.array([len(values) for values in index['values']], dtype=np.int64)
+        # Code -1 (absent) picks None and -2 picks UNSEEN_VALUE
+        lookups = [np.array(list(values) + [UNSEEN_VALUE, None], dtype=object)
+                   for values in index['values']]
+
+        # Fix the exact mix up front so the proportions hold over the whole stream
+        num_grant = min(num_requests, max(int(round(num_requests * grant_ratio)), num_rules))
+        num_near = min(num_requests - num_grant, int(round(num_requests * near_miss_ratio)))
+        kinds = np.repeat(np.array([0, 1, 2], dtype=np.int8),
+                          [num_grant, num_near, num_requests - num_grant - num_near])
+        rng.shuffle(kinds)
+        rule_order = rng.permutation(num_rules)
+        grants_done = 0
+
+        for start in range(0, num_requests, batch_size):
+            batch_kinds = kinds[start:start + batch_size]
+            batch = np.full((len(batch_kinds), num_attrs), -1, dtype=np.int64)
+
+            # Grant: walk a permutation of the rules first, then pick at random
+            grant_rows = np.flatnonzero(batch_kinds == 0)
+            slots = grants_done + np.arange(len(grant_rows))
+            grants_done += len(grant_rows)
+            grant_rules = np.where(slots < num_rules,
+                                   rule_order[np.minimum(slots, num_rules - 1)],
+                                   rng.integers(0, num_rules, len(grant_rows)))
+            batch[grant_rows] = rule_codes[grant_rules]
+
+            # Near-miss: copy a random rule and change one of its values
+            near_rows = np.flatnonzero(batch_kinds == 1)
+            if len(near_rows):
+                near_codes = rule_codes[rng.integers(0, num_rules, len(near_rows))].astype(np.int64)
+                keys = np.where(near_codes >= 0, rng.random(near_codes.shape), -1.0)
+                cols = keys.argmax(axis=1)
+                rows = np.arange(len(near_rows))
+                col_values = num_values[cols]
+                offsets = 1 + (rng.random(len(near_rows)) * np.maximum(col_values - 1, 1)).astype(np.int64)
+                near_codes[rows, cols] = np.where(
+                    col_values > 1, (near_codes[rows, cols] + offsets) % col_values, -2)
+                batch[near_rows] = near_codes
+
+            # Random: between 1 and all attributes, each with a random value
+            random_rows = np.flatnonzero(batch_kinds == 2)
+            if len(random_rows):
+                sizes = rng.integers(1, num_attrs + 1, len(random_rows))
+                ranks = rng.random((len(random_rows), num_attrs)).argsort(axis=1).argsort(axis=1)
+                random_codes = (rng.random((len(random_rows), num_attrs)) * num_values).astype(np.int64)
+                batch[random_rows] = np.where(ranks < sizes[:, None], random_codes, -1)
+
+            columns = [lookups[pos][batch[:, pos]] for pos in range(num_attrs)]
+            yield [
+                {attr: value for attr, value in zip(attributes, row) if value is not None}
+                for row in zip(*columns)
+            ]
+
+    def write_test_requests_ndjson(self, output_file: str, num_requests: int,
+                                   **kwargs) -> int:
+        """
+        Stream seeded test requests to a newline-delimited JSON file
+
+        Args:
+            output_file (str): Output file path
+            num_requests (int): Total number of requests to generate
+            **kwargs: Passed through to iter_test_request_batches
+
+        Returns:
+            int: Number of requests written
+        """
+        written = 0
+        with open(output_file, 'w') as f:
+            for batch in self.iter_test_request_batches(num_requests, **kwargs):
+                f.write('\n'.join(json.dumps(request) for request in batch))
+                f.write('\n')
+                written += len(batch)
+
+        print(f"Wrote {written} test requests to {output_file}")
+        return written
     
     def get_available_attributes(self) -> List[str]:
         """
@@ -324,6 +897,72 @@ class PolicyEvaluator:
         print(f"Evaluation report exported to {output_file}")
         return report
     
+    def stream_evaluation_report(self, requests: Iterable[Dict[str, str]],
+                                 output_file: str = "evaluation_report.jsonl",
+                                 chunk_size: int = 10000) -> Dict:
+        """
+        Evaluate requests chunk by chunk and append results as JSON Lines
+
+        The file starts with a header record (rule statistics), has one
+        'result' record per request and ends with a 'summary' record holding
+        the running counters. Only one chunk of results is in memory at a
+        time, so any iterable of requests (e.g. a generator) can be used.
+
+        Args:
+            requests (Iterable[Dict[str, str]]): Requests to evaluate
+            output_file (str): Output file path
+            chunk_size (int): Number of requests evaluated per chunk
+
+        Returns:
+            Dict: The summary record written at the end of the file
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+
+        requests = iter(requests)
+        total_count = 0
+        granted_count = 0
+        rule_hits = {}
+
+        with open(output_file, 'w') as f:
+            header = {
+                'record': 'header',
+                'rule_count': len(self.rules),
+                'rule_statistics': self.get_rule_coverage_stats()
+            }
+            f.write(json.dumps(header) + '\n')
+
+            while True:
+                chunk = list(islice(requests, chunk_size))
+                if not chunk:
+                    break
+
+                results = self.batch_evaluate(chunk)
+                lines = []
+                for result in results:
+                    if result['granted']:
+                        granted_count += 1
+                        rule = result['matching_rule']
+                        rule_hits[rule] = rule_hits.get(rule, 0) + 1
+                    lines.append(json.dumps({'record': 'result', **result}))
+                total_count += len(results)
+                f.write('\n'.join(lines) + '\n')
+
+            summary = {
+                'record': 'summary',
+                'evaluation_summary': {
+                    'total_requests': total_count,
+                    'granted': granted_count,
+                    'denied': total_count - granted_count,
+                    'grant_rate': granted_count / total_count if total_count else 0
+                },
+                'rule_hits': rule_hits
+            }
+            f.write(json.dumps(summary) + '\n')
+
+        print(f"Evaluation report streamed to {output_file} ({total_count} requests)")
+        return summary
+    
     def set_available_attributes(self, attributes):
         """Set available attributes explicitly"""
         self.available_attributes = set(attributes)
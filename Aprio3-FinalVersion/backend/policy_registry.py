@@ -0,0 +1,220 @@
+"""
+Policy Registry for RHAPSODY API Server
+Author: Ludjina
+Description: Named, versioned policies loaded on demand from results artifacts and evicted under a memory ceiling
+"""
+
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from policy_store import PolicySnapshot, load_policy_artifact
+
+
+POLICY_ID_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+INDEX_FILE = 'index.json'
+
+# Rough per-entry cost of the dicts and lists holding rule strings and counts
+ENTRY_OVERHEAD = 100
+
+
+def estimate_policy_size(snapshot: PolicySnapshot) -> int:
+    """
+    Approximate memory held by a loaded policy, in bytes
+
+    Counts the compiled rule code matrix, the value dictionaries, the rule
+    strings (once in the rule list and once per statistics table) and
+    container overhead.
+    """
+    evaluator = snapshot.evaluator
+    index = evaluator._get_rule_index()
+    size = index['codes'].nbytes
+    for attr_values in index['values']:
+        size += sum(sys.getsizeof(value) for value in attr_values) + 2 * ENTRY_OVERHEAD * len(attr_values)
+
+    rule_bytes = sum(sys.getsizeof(rule) for rule in evaluator.rules)
+    tables = [evaluator.rule_statistics.get('nUP', {}), evaluator.rule_statistics.get('nA', {})]
+    size += rule_bytes * (1 + sum(1 for table in tables if table))
+    size += ENTRY_OVERHEAD * (len(evaluator.rules) + sum(len(table) for table in tables))
+    return size
+
+
+class PolicyRegistry:
+    """
+    Named policies kept next to the results folder and loaded lazily
+
+    Each registered policy is a copy of a results artifact under
+    ``policies_folder`` with a version number that increases every time
+    the ID is registered again. ``get()`` loads a policy on first use and
+    keeps its compiled snapshot for later requests; when the loaded
+    policies exceed ``max_bytes`` the least recently used ones are
+    dropped and reloaded on their next use. Requests already holding an
+    evicted snapshot finish on it.
+    """
+
+    def __init__(self, policies_folder: str, max_bytes: Optional[int] = None):
+        """
+        Initialize the PolicyRegistry
+
+        Args:
+            policies_folder (str): Directory for registered artifacts and the index
+            max_bytes (int): Memory ceiling for loaded policies (None for no limit)
+        """
+        self.policies_folder = policies_folder
+        self.max_bytes = max_bytes
+        os.makedirs(policies_folder, exist_ok=True)
+
+        self._index_file = os.path.join(policies_folder, INDEX_FILE)
+        self._entries = self._read_index()
+        self._loaded = OrderedDict()  # policy_id -> (snapshot, size), least recently used first
+        self._loaded_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _read_index(self) -> Dict:
+        if not os.path.exists(self._index_file):
+            return {}
+        with open(self._index_file, 'r') as f:
+            return json.load(f)
+
+    def _write_index(self):
+        tmp_file = self._index_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_file, self._index_file)
+
+    def register(self, policy_id: str, results_file: str) -> Dict:
+        """
+        Register (or replace) a named policy from a results artifact
+
+        Args:
+            policy_id (str): Name such as 'amazon' or 'university'
+            results_file (str): JSON written by RhapsodyAlgorithm.save_results
+
+        Returns:
+            Dict: The registry entry, including the new version
+        """
+        if not POLICY_ID_PATTERN.match(policy_id or ''):
+            raise ValueError("Policy ID must be 1-64 letters, digits, '.', '_' or '-'")
+
+        # Validate the artifact before it replaces a working policy
+        evaluator, _ = load_policy_artifact(results_file)
+
+        with self._lock:
+            entry = self._entries.get(policy_id, {})
+            version = entry.get('version', 0) + 1
+            filename = f'{policy_id}.json'
+            tmp_file = os.path.join(self.policies_folder, filename + '.tmp')
+            shutil.copyfile(results_file, tmp_file)
+            os.replace(tmp_file, os.path.join(self.policies_folder, filename))
+
+            entry = {
+                'version': version,
+                'file': filename,
+                'rule_count': len(evaluator.rules),
+                'registered_at': time.time()
+            }
+            self._entries[policy_id] = entry
+            self._write_index()
+            # The next get() loads the new version
+            self._evict(policy_id)
+
+        print(f"Registered policy '{policy_id}' version {version} ({entry['rule_count']} rules)")
+        return dict(entry, policy_id=policy_id)
+
+    def unregister(self, policy_id: str) -> bool:
+        """Remove a named policy; returns False if it was not registered"""
+        with self._lock:
+            entry = self._entries.pop(policy_id, None)
+            if entry is None:
+                return False
+            self._write_index()
+            self._evict(policy_id)
+        artifact = os.path.join(self.policies_folder, entry['file'])
+        if os.path.exists(artifact):
+            os.remove(artifact)
+        return True
+
+    def get(self, policy_id: str) -> PolicySnapshot:
+        """
+        Get the snapshot of a named policy, loading it if needed
+
+        Raises:
+            KeyError: If no policy is registered under ``policy_id``
+        """
+        with self._lock:
+            loaded = self._loaded.get(policy_id)
+            if loaded is not None:
+                self._loaded.move_to_end(policy_id)
+                return loaded[0]
+            if policy_id not in self._entries:
+                raise KeyError(policy_id)
+            load_lock = self._load_locks.setdefault(policy_id, threading.Lock())
+
+        # Load outside the registry lock so other tenants keep being served;
+        # concurrent requests for the same cold policy wait for one load
+        with load_lock:
+            with self._lock:
+                loaded = self._loaded.get(policy_id)
+                if loaded is not None:
+                    self._loaded.move_to_end(policy_id)
+                    return loaded[0]
+                entry = self._entries.get(policy_id)
+                if entry is None:
+                    raise KeyError(policy_id)
+
+            evaluator, statistics = load_policy_artifact(os.path.join(self.policies_folder, entry['file']))
+            evaluator._get_rule_index()
+            snapshot = PolicySnapshot(
+                version=entry['version'],
+                evaluator=evaluator,
+                statistics=statistics,
+                created_at=time.time()
+            )
+            size = estimate_policy_size(snapshot)
+
+            with self._lock:
+                if self._entries.get(policy_id) is entry:
+                    self._loaded[policy_id] = (snapshot, size)
+                    self._loaded_bytes += size
+                    self._enforce_limit(keep=policy_id)
+            return snapshot
+
+    def _evict(self, policy_id: str):
+        """Drop a loaded policy (caller holds the lock)"""
+        loaded = self._loaded.pop(policy_id, None)
+        if loaded is not None:
+            self._loaded_bytes -= loaded[1]
+
+    def _enforce_limit(self, keep: str):
+        """Evict least recently used policies until under the ceiling (caller holds the lock)"""
+        if self.max_bytes is None:
+            return
+        for policy_id in list(self._loaded):
+            if self._loaded_bytes <= self.max_bytes:
+                break
+            if policy_id != keep:
+                print(f"Evicting policy '{policy_id}' to stay under the memory limit")
+                self._evict(policy_id)
+
+    def list_policies(self) -> List[Dict]:
+        """Describe every registered policy and whether it is loaded"""
+        with self._lock:
+            policies = []
+            for policy_id, entry in sorted(self._entries.items()):
+                loaded = self._loaded.get(policy_id)
+                policies.append(dict(entry, policy_id=policy_id, loaded=loaded is not None,
+                                     memory_bytes=loaded[1] if loaded else None))
+            return policies
+
+    def memory_usage(self) -> Dict:
+        """Loaded policy memory against the configured ceiling"""
+        with self._lock:
+            return {'loaded_bytes': self._loaded_bytes, 'max_bytes': self.max_bytes,
+                    'loaded_policies': list(self._loaded)}
@@ -0,0 +1,120 @@
+"""
+Policy Store for RHAPSODY API Server
+Author: Ludjina
+Description: Versioned, immutable policy snapshots published atomically for concurrent serving
+"""
+
+import json
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from policy_evaluator import PolicyEvaluator
+
+
+class PolicySnapshot(NamedTuple):
+    """
+    One published policy version
+
+    A snapshot is never modified after it is published. Readers keep a
+    reference for the duration of a request, so a request that started on
+    version N finishes on version N even if N+1 is published meanwhile.
+    """
+    version: int
+    evaluator: PolicyEvaluator
+    statistics: Dict
+    created_at: float
+
+
+class PolicyStore:
+    """
+    Holds the current policy snapshot
+
+    Reads are lock-free: ``current()`` is a single attribute read, and
+    ``publish()`` swaps the reference in one assignment. The lock only
+    serializes publishers so version numbers stay unique and increasing.
+    """
+
+    def __init__(self):
+        self._current = None
+        self._last_version = 0
+        self._publish_lock = threading.Lock()
+
+    def current(self) -> Optional[PolicySnapshot]:
+        """Get the current snapshot, or None if nothing was published"""
+        return self._current
+
+    def publish(self, evaluator: PolicyEvaluator, statistics: Dict = None,
+                version: Optional[int] = None) -> PolicySnapshot:
+        """
+        Publish a new policy version
+
+        The evaluator's rule index is built before the swap, so the first
+        request on the new version does not pay for compiling it.
+
+        Args:
+            evaluator (PolicyEvaluator): Evaluator loaded with the new rules.
+                It must not be modified after publishing.
+            statistics (Dict): Mining statistics (RhapsodyAlgorithm.get_rule_statistics)
+            version (int): Explicit version number, e.g. one shared by several
+                processes; must be higher than the last one
+
+        Returns:
+            PolicySnapshot: The published snapshot
+        """
+        evaluator._get_rule_index()
+        with self._publish_lock:
+            if version is None:
+                version = self._last_version + 1
+            elif version <= self._last_version:
+                raise ValueError(f"Policy version {version} is not newer than {self._last_version}")
+            self._last_version = version
+            snapshot = PolicySnapshot(
+                version=version,
+                evaluator=evaluator,
+                statistics=statistics or {},
+                created_at=time.time()
+            )
+            self._current = snapshot
+        return snapshot
+
+    def last_version(self) -> int:
+        """Highest version published so far (0 if none)"""
+        return self._last_version
+
+    def clear(self):
+        """Withdraw the current policy (version numbers keep increasing)"""
+        self._current = None
+
+
+def load_policy_artifact(results_file: str) -> Tuple[PolicyEvaluator, Dict]:
+    """
+    Build an evaluator and mining statistics from a saved results file
+
+    Args:
+        results_file (str): JSON written by RhapsodyAlgorithm.save_results
+
+    Returns:
+        Tuple[PolicyEvaluator, Dict]: Evaluator ready to publish and statistics
+        in the shape of RhapsodyAlgorithm.get_rule_statistics (only the final
+        rules are listed, the artifact does not keep the others)
+    """
+    with open(results_file, 'r') as f:
+        data = json.load(f)
+
+    final_rules = data.get('final_rules', [])
+    evaluator = PolicyEvaluator(final_rules)
+    evaluator.rule_statistics = {'nUP': data.get('nUP', {}), 'nA': data.get('nA', {})}
+    evaluator.set_available_attributes(data.get('working_columns') or [])
+
+    statistics = {
+        'total_transactions': data.get('total_transactions', 0),
+        'frequent_rules_count': data.get('frequent_rules_count', 0),
+        'reliable_rules_count': data.get('reliable_rules_count', 0),
+        'final_rules_count': data.get('final_rules_count', len(final_rules)),
+        'working_columns': data.get('working_columns'),
+        'rules': {'final': final_rules},
+        'nUP': data.get('nUP', {}),
+        'nA': data.get('nA', {})
+    }
+    return evaluator, statistics
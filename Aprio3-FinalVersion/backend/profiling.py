@@ -0,0 +1,220 @@
+"""
+Stage Profiling for RHAPSODY
+Author: Ludjina
+Description: Opt-in per-stage CPU, stack-sample and allocation profiles of mining runs
+
+RhapsodyAlgorithm.run_algorithm(..., profile=True) wraps each stage in
+StageProfiler.stage(). While a stage runs it is profiled three ways:
+
+- cProfile, for exact call counts and times (saved as .pstats, readable with
+  ``python -m pstats`` or snakeviz)
+- a sampling thread recording the mining thread's stack every few
+  milliseconds, saved as collapsed stacks ("stage;frame;frame count" per
+  line) for flamegraph.pl or speedscope
+- tracemalloc snapshots before and after, for the allocation sites that
+  grew the most and the stage's peak traced memory
+
+Without profiling the stages run in NULL_PROFILER.stage(), a shared
+nullcontext, so the disabled path costs one attribute lookup per stage.
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List
+
+
+SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 25
+
+# Snapshots leave out tracemalloc's own bookkeeping
+_SNAPSHOT_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's stack below a base depth into a Counter of collapsed stacks"""
+
+    def __init__(self, thread_id: int, root: str, base_depth: int, interval: float, counts: Counter):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.base_depth = base_depth
+        self.interval = interval
+        self.counts = counts
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.reverse()
+            self.counts[';'.join([self.root] + stack[self.base_depth:])] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _frame_depth(frame) -> int:
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+class StageProfiler:
+    """
+    Collects profiles for named stages of one run
+
+    ``stages`` holds a summary per stage (wall and CPU time, memory, top
+    functions and allocation sites); save() writes the profiles to disk.
+    """
+
+    def __init__(self, sample_interval: float = SAMPLE_INTERVAL, top: int = TOP_ALLOCATIONS):
+        """
+        Initialize the StageProfiler
+
+        Args:
+            sample_interval (float): Seconds between stack samples
+            top (int): Allocation sites kept per stage
+        """
+        self.sample_interval = sample_interval
+        self.top = top
+        self.stages = []
+        self._profiles = []
+        self._samples = Counter()
+        self._started_tracemalloc = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Profile the enclosed code as stage ``name``"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+        # Samples keep only frames below the code that opened the stage
+        caller = sys._getframe(1)
+        while caller is not None and caller.f_code.co_filename == contextlib.__file__:
+            caller = caller.f_back
+        sampler = _StackSampler(threading.get_ident(), name, _frame_depth(caller),
+                                self.sample_interval, self._samples)
+
+        before = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        profile = cProfile.Profile()
+        wall, cpu = time.perf_counter(), time.process_time()
+
+        sampler.start()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            sampler.stop()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+            self._profiles.append(profile)
+            self.stages.append({
+                'stage': name,
+                'wall_seconds': round(wall, 4),
+                'cpu_seconds': round(cpu, 4),
+                'memory_delta_bytes': current_memory - start_memory,
+                'memory_peak_bytes': peak_memory,
+                'top_functions': self._top_functions(profile),
+                'top_allocations': [
+                    {
+                        'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                        'size_diff_bytes': stat.size_diff,
+                        'count_diff': stat.count_diff,
+                        'size_bytes': stat.size
+                    }
+                    for stat in after.compare_to(before, 'lineno')[:self.top]
+                ]
+            })
+            print(f"Profiled {name}: {wall:.2f}s wall, {cpu:.2f}s CPU, peak {peak_memory / 1e6:.1f} MB traced")
+
+    @staticmethod
+    def _top_functions(profile: cProfile.Profile) -> List[Dict]:
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                'function': f"{os.path.basename(filename)}:{line}({function})",
+                'calls': calls,
+                'total_seconds': round(total, 4),
+                'cumulative_seconds': round(cumulative, 4)
+            })
+        rows.sort(key=lambda row: -row['cumulative_seconds'])
+        return rows[:TOP_FUNCTIONS]
+
+    def save(self, prefix: str) -> List[str]:
+        """
+        Write the profiles next to each other
+
+        Args:
+            prefix (str): Path prefix, e.g. results/job_<id>
+
+        Returns:
+            List[str]: Paths written: <prefix>_profile.pstats (all stages),
+            <prefix>_profile.collapsed (stack samples) and <prefix>_profile.json
+            (per-stage summary with top functions and allocation sites)
+        """
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        paths = []
+
+        if self._profiles:
+            stats = pstats.Stats(self._profiles[0], stream=io.StringIO())
+            for profile in self._profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(prefix + '_profile.pstats')
+            paths.append(prefix + '_profile.pstats')
+
+        with open(prefix + '_profile.collapsed', 'w') as f:
+            for stack, count in sorted(self._samples.items()):
+                f.write(f"{stack} {count}\n")
+        paths.append(prefix + '_profile.collapsed')
+
+        with open(prefix + '_profile.json', 'w') as f:
+            json.dump({
+                'stages': self.stages,
+                'total_wall_seconds': round(sum(stage['wall_seconds'] for stage in self.stages), 4),
+                'sample_interval': self.sample_interval,
+                'samples': sum(self._samples.values())
+            }, f, indent=2)
+        paths.append(prefix + '_profile.json')
+        return paths
+
+
+class _NullProfiler:
+    """Profiler used when profiling is off: every stage is a shared nullcontext"""
+
+    _context = contextlib.nullcontext()
+
+    def stage(self, name: str):
+        return self._context
+
+
+NULL_PROFILER = _NullProfiler()
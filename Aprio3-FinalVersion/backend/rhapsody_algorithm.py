@@ -4,6 +4,12 @@ Author: Ludjina
 Description: Implementation of the RHAPSODY algorithm for ABAC policy mining
 """
 
+import heapq
+import math
+from collections import Counter, deque
+from itertools import combinations
+from statistics import NormalDist
+import numpy as np
 import pandas as pd
 from mlxtend.frequent_patterns import apriori
 from mlxtend.preprocessing import TransactionEncoder
@@ -12,6 +18,11 @@ warnings.filterwarnings('ignore')
 
 import json
 
+from profiling import StageProfiler, NULL_PROFILER
+
+# Value standing for every rare value of a column when collapse_rare is on
+RARE_VALUE = '<rare>'
+
 
 class RhapsodyAlgorithm:
     """
@@ -23,9 +34,15 @@ class RhapsodyAlgorithm:
     Stage 3: Removing Redundant Rules
     """
     
-    def __init__(self, selected_columns=None):
+    def __init__(self, selected_columns=None, inference=None, collapse_rare=False):
         self.data = None
         self.selected_columns = selected_columns
+        # Optional AttributeInference applied to the data before column selection
+        self.inference = inference
+        # Map values seen fewer than T times to 'col=<rare>' instead of dropping them
+        self.collapse_rare = collapse_rare
+        # Column -> values encoded as RARE_VALUE in the last encoding (nA counts them the same way)
+        self._collapsed_values = {}
         self.working_columns = None
         self.freq_rules = []
         self.rel_rules = []
@@ -33,11 +50,16 @@ class RhapsodyAlgorithm:
         self.nUP = {}
         self.nA = {}
         self.transactions = []
+        self.closed_itemsets = []
+        # StageProfiler of the last run_algorithm(profile=True)
+        self.profiler = None
         
     def load_data(self, data_path):
         """Load CSV data from file path"""
         try:
             self.data = pd.read_csv(data_path)
+            if self.inference is not None:
+                self.data = self.inference.apply(self.data)
             if self.selected_columns:
                 # Verify all selected columns exist
                 missing_cols = [col for col in self.selected_columns if col not in self.data.columns]
@@ -58,6 +80,8 @@ class RhapsodyAlgorithm:
     def load_data_from_dataframe(self, df):
         """Load data from pandas DataFrame"""
         self.data = df.copy()
+        if self.inference is not None:
+            self.data = self.inference.apply(self.data)
         
         # Filter to selected columns if specified
         if self.selected_columns:
@@ -73,42 +97,274 @@ class RhapsodyAlgorithm:
         print(f"Working with columns: {self.working_columns}")  # debug line
         return True
         
-    def run_algorithm(self, T, K):
+    def run_algorithm(self, T, K, progress_callback=None, closed=False, top_k=None, profile=False):
         """
         Run the complete RHAPSODY algorithm
         
         Args:
             T (int): Support threshold
             K (float): Reliability threshold (0-1)
+            progress_callback (callable): Optional callback(progress, stage, message)
+                called before each stage and when done
+            closed (bool): Mine closed itemsets with their generators instead of
+                every frequent itemset. The final rules are the same; freq_rules
+                and rel_rules then hold the (reliable) closed itemsets, and nUP/nA
+                only cover those and the final rules.
+            top_k (int): Only find the top_k final rules with the highest
+                coverage (ties broken by fewer atoms, then by rule text).
+                freq_rules then holds the generators explored and rel_rules
+                the reliable, non-redundant rules found on the way.
+            profile (bool): Profile each stage (cProfile, stack samples and
+                tracemalloc); the StageProfiler is left in self.profiler for
+                saving (see profiling.py)
             
         Returns:
             tuple: (final_rules, nUP, nA)
         """
         if self.data is None:
             raise ValueError("No data loaded. Please load data first.")
+        
+        def report(progress, stage, message):
+            if progress_callback:
+                progress_callback(progress, stage, message)
+        
+        self.profiler = StageProfiler() if profile else None
+        profiler = self.profiler or NULL_PROFILER
             
         print(f"Running RHAPSODY with T={T}, K={K}")
         
-        print("\n=== STAGE 1: Computing Frequent Rules ===")
-        self.freq_rules, self.nUP, self.nA = self._stage1(T)
+        if top_k is not None:
+            print(f"\n=== Computing Top {top_k} Rules ===")
+            report(25, 'Top-k search', f'Searching for the {top_k} highest-coverage rules...')
+            with profiler.stage('Top-k search'):
+                self.final_rules = self._mine_top_k(T, K, top_k)
+        elif closed:
+            print("\n=== STAGE 1: Computing Closed Frequent Rules ===")
+            report(25, 'Stage 1', 'Computing closed frequent rules...')
+            with profiler.stage('Stage 1'):
+                self.freq_rules, self.nUP, self.nA = self._stage1_closed(T)
+            
+            print("\n=== STAGE 2: Computing Reliable Rules ===")
+            report(50, 'Stage 2', f'Computing reliable rules from {len(self.freq_rules)} closed rules...')
+            with profiler.stage('Stage 2'):
+                self.rel_rules = self._stage2_closed(T, K)
+            
+            print("\n=== STAGE 3: Removing Redundant Rules ===")
+            report(75, 'Stage 3', f'Selecting shortest rules for {len(self.rel_rules)} reliable closed rules...')
+            with profiler.stage('Stage 3'):
+                self.final_rules = self._stage3_closed()
+        else:
+            print("\n=== STAGE 1: Computing Frequent Rules ===")
+            report(25, 'Stage 1', 'Computing frequent rules...')
+            with profiler.stage('Stage 1'):
+                self.freq_rules, self.nUP, self.nA = self._stage1(T)
+            
+            print("\n=== STAGE 2: Computing Reliable Rules ===")
+            report(50, 'Stage 2', f'Computing reliable rules from {len(self.freq_rules)} frequent rules...')
+            with profiler.stage('Stage 2'):
+                self.rel_rules = self._stage2(T, K)
+            
+            print("\n=== STAGE 3: Removing Redundant Rules ===")
+            report(75, 'Stage 3', f'Removing redundant rules from {len(self.rel_rules)} reliable rules...')
+            with profiler.stage('Stage 3'):
+                self.final_rules = self._stage3()
+        
+        report(95, 'Stage 3', f'Found {len(self.final_rules)} final rules')
+        return self.final_rules, self.nUP, self.nA
+    
+    def run_progressive(self, T, K, sample_sizes=None, confidence=0.95, seed=0,
+                        on_preview=None, progress_callback=None, **mining_options):
+        """
+        Mine growing random samples first, then the full data
+        
+        Each sample is a prefix of one random permutation of the rows, so it
+        is a uniform sample and contains the previous one. T is scaled to the
+        sample size and lowered by the sampling error at ``confidence``, so a
+        rule frequent in the full data is unlikely to be missed. K is a
+        ratio and is used as is.
+        
+        Args:
+            T (int): Support threshold for the full data
+            K (float): Reliability threshold (0-1)
+            sample_sizes (list): Sample sizes to preview (default 1000, 10000 and
+                100000 rows, where smaller than the data)
+            confidence (float): Confidence level of thresholds and error bounds
+            seed (int): Seed of the sampling permutation
+            on_preview (callable): Called with each preview dict (see below)
+            progress_callback (callable): Passed to the full run_algorithm
+            **mining_options: Passed to every run_algorithm call (closed, top_k);
+                profile only applies to the full-data run
+            
+        Returns:
+            tuple: (final_rules, nUP, nA) of the full data
+        
+        A preview has 'sample_size', 'total_rows', 'scaled_T', 'confidence'
+        and 'rules': one dict per provisional rule with its estimated
+        full-data coverage 'nUP_estimate' and the bounds 'nUP_low'/'nUP_high'.
+        """
+        if self.data is None:
+            raise ValueError("No data loaded. Please load data first.")
+        
+        total = len(self.data)
+        if sample_sizes is None:
+            sample_sizes = [1000, 10000, 100000]
+        sample_sizes = sorted(size for size in set(sample_sizes) if 0 < size < total)
+        
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        order = np.random.default_rng(seed).permutation(total)
+        rate = min(T / total, 1.0) if total else 0
+        
+        for refinement, size in enumerate(sample_sizes, start=1):
+            if progress_callback:
+                progress_callback(20, 'Preview', f'Mining a {size}-row sample ({refinement}/{len(sample_sizes)})...')
+            
+            scaled_T = max(1, math.floor(size * rate - z * math.sqrt(size * rate * (1 - rate))))
+            sample = self.data.iloc[np.sort(order[:size])][self.working_columns]
+            sampler = RhapsodyAlgorithm(selected_columns=self.working_columns, collapse_rare=self.collapse_rare)
+            sampler.load_data_from_dataframe(sample)
+            sample_options = {key: value for key, value in mining_options.items() if key != 'profile'}
+            rules, nUP, _ = sampler.run_algorithm(scaled_T, K, **sample_options)
+            
+            # Coverage estimates with a finite population correction
+            correction = math.sqrt((total - size) / (total - 1)) if total > 1 else 0
+            estimates = []
+            for rule in rules:
+                share = nUP[rule] / size
+                margin = z * total * math.sqrt(share * (1 - share) / size) * correction
+                estimates.append({
+                    'rule': rule,
+                    'nUP_estimate': round(share * total, 1),
+                    'nUP_low': max(0, math.floor(share * total - margin)),
+                    'nUP_high': min(total, math.ceil(share * total + margin))
+                })
+            
+            print(f"Preview on {size} of {total} rows: {len(rules)} provisional rules (scaled T={scaled_T})")
+            if on_preview:
+                on_preview({
+                    'refinement': refinement,
+                    'sample_size': size,
+                    'total_rows': total,
+                    'scaled_T': scaled_T,
+                    'confidence': confidence,
+                    'rules': estimates
+                })
+        
+        return self.run_algorithm(T, K, progress_callback=progress_callback, **mining_options)
+    
+    def run_windowed(self, T, K, timestamps, window, freq='D', on_window=None):
+        """
+        Mine a sliding time window over the data, one slide per time bucket
+        
+        Rows are grouped into buckets of ``freq`` (e.g. 'D' or 'h') and the
+        window covers the last ``window`` buckets. Each slide is handled by
+        a SlidingWindowMiner, which adds the new bucket's itemset counts,
+        subtracts the expired bucket's and re-derives Stages 2 and 3 only
+        where coverage changed. Every window's rules equal those of
+        run_algorithm on the rows of that window.
         
-        print("\n=== STAGE 2: Computing Reliable Rules ===")
-        self.rel_rules = self._stage2(T, K)
+        Args:
+            T (int): Support threshold per window
+            K (float): Reliability threshold (0-1)
+            timestamps (str or array-like): Time column of the data (not mined)
+                or one timestamp per row
+            window (int): Buckets per window
+            freq (str): Bucket length as a pandas frequency
+            on_window (callable): Called after each slide with a dict of
+                'start', 'end' (bucket labels), 'rows' and 'final_rules'
+            
+        Returns:
+            tuple: (final_rules, nUP, nA) of the last window
+        """
+        if self.data is None:
+            raise ValueError("No data loaded. Please load data first.")
+        
+        if isinstance(timestamps, str):
+            times = self.data[timestamps]
+            columns = [col for col in self.working_columns if col != timestamps]
+        else:
+            times = pd.Series(np.asarray(timestamps), index=self.data.index)
+            columns = list(self.working_columns)
+        buckets = pd.to_datetime(times).dt.floor(freq)
+        if buckets.isna().any():
+            raise ValueError("Every row needs a valid timestamp for windowed mining")
         
-        print("\n=== STAGE 3: Removing Redundant Rules ===")
-        self.final_rules = self._stage3()
+        miner = SlidingWindowMiner(T, K, window, columns)
+        groups = {label: rows for label, rows in self.data[columns].groupby(buckets, sort=True)}
+        empty = self.data[columns].iloc[:0]
+        labels = pd.date_range(buckets.min(), buckets.max(), freq=freq) if len(buckets) else []
         
+        for label in labels:
+            miner.slide(label, groups.get(label, empty))
+            if on_window:
+                on_window({
+                    'start': miner.labels[0],
+                    'end': miner.labels[-1],
+                    'rows': miner.total,
+                    'final_rules': miner.final_rules
+                })
+        
+        self.working_columns = columns
+        self.freq_rules = miner.freq_rules
+        self.rel_rules = miner.rel_rules
+        self.final_rules = miner.final_rules
+        self.nUP, self.nA = miner.statistics()
+        self.transactions = [None] * miner.total
         return self.final_rules, self.nUP, self.nA
     
-    def _stage1(self, T):
+    def _rare_values(self, min_count):
         """
-        Stage 1: Compute FreqRules, nU×P, and nA
+        Values of each working column seen fewer than min_count times
+        
+        An atom covering fewer than T transactions cannot be part of a
+        frequent rule, so leaving it out of the encoding does not change
+        any mined rule; it only narrows the encoded matrix. With
+        collapse_rare the values become RARE_VALUE instead, which adds a
+        'col=<rare>' atom per column (and can add rules using it).
+        
+        Args:
+            min_count (int): Minimum count of a value to keep it (T)
+            
+        Returns:
+            tuple: (column -> set of rare values, atoms removed)
+        """
+        rare_values = {}
+        for col in self.working_columns:
+            counts = self.data[col].value_counts()
+            rare = counts.index[counts < min_count]
+            if len(rare):
+                rare_values[col] = set(rare)
+        return rare_values, sum(len(rare) for rare in rare_values.values())
+    
+    def _encode_transactions(self, min_count=None):
+        """
+        Build the atom set of every row and its one-hot encoding
+        
+        Args:
+            min_count (int): Leave out atoms covering fewer transactions
+                (see _rare_values); None keeps every atom
+        
+        Returns:
+            tuple: (boolean array of shape (transactions, atoms), atom names)
         """
-        # Create atoms for each transaction
+        rare_values = {}
+        if min_count is not None and min_count > 1:
+            rare_values, removed = self._rare_values(min_count)
+            if removed:
+                action = f"collapsed into '{RARE_VALUE}'" if self.collapse_rare else "left out"
+                print(f"{removed} atoms seen fewer than {min_count} times {action}")
+        self._collapsed_values = rare_values if self.collapse_rare else {}
+        
+        # Create atoms for each transaction. Rare values are dropped from the
+        # atoms of the full rows, so the remaining atoms are formatted exactly
+        # as without pruning (e.g. ints of a row upcast to float stay floats)
         def create_atoms(row):
             atoms = []
             for col in self.working_columns:  
                 if pd.notna(row[col]):  # Handle NaN values
+                    if col in rare_values and row[col] in rare_values[col]:
+                        if self.collapse_rare:
+                            atoms.append(f"{col}={RARE_VALUE}")
+                        continue
                     atoms.append(f"{col}={row[col]}")
             return frozenset(atoms)
     
@@ -119,7 +375,23 @@ class RhapsodyAlgorithm:
         # Encode transactions for frequent itemset mining
         te = TransactionEncoder()
         te_array = te.fit(self.transactions).transform(self.transactions)
-        df_encoded = pd.DataFrame(te_array, columns=te.columns_)
+        return te_array, te.columns_
+    
+    @staticmethod
+    def _atom_tidsets(te_array):
+        """Tidset of every atom as an int: bit t is set when transaction t contains the atom"""
+        return [int.from_bytes(np.packbits(te_array[:, col], bitorder='little').tobytes(), 'little')
+                for col in range(te_array.shape[1])]
+    
+    def _stage1(self, T):
+        """
+        Stage 1: Compute FreqRules, nU×P, and nA
+        """
+        te_array, columns = self._encode_transactions(min_count=T)
+        if len(columns) == 0:
+            print("No frequent itemsets found with the given threshold")
+            return [], {}, {}
+        df_encoded = pd.DataFrame(te_array, columns=columns)
         
         # Calculate minimum support
         min_support = T / len(self.transactions)
@@ -140,7 +412,8 @@ class RhapsodyAlgorithm:
             itemset = row['itemsets']
             rule = " ∧ ".join(sorted(itemset))
             freq_rules.append(rule)
-            nUP[rule] = int(row['support'] * len(self.transactions))
+            # Round: support * n can land just below the integer count
+            nUP[rule] = int(round(row['support'] * len(self.transactions)))
         
         print(f"Generated {len(freq_rules)} frequent rules")
         
@@ -150,11 +423,15 @@ class RhapsodyAlgorithm:
             nA[rule] = 0
         
         # Count how many transactions satisfy each rule
+        collapsed = self._collapsed_values
         for _, row in self.data.iterrows():
             request_atoms = set()
             for col in self.working_columns:  
                 if pd.notna(row[col]):
-                    request_atoms.add(f"{col}={row[col]}")
+                    if col in collapsed and row[col] in collapsed[col]:
+                        request_atoms.add(f"{col}={RARE_VALUE}")
+                    else:
+                        request_atoms.add(f"{col}={row[col]}")
             
             for rule in freq_rules:
                 rule_atoms = set(rule.split(" ∧ "))
@@ -260,7 +537,314 @@ class RhapsodyAlgorithm:
         r2_atoms = set(r2.split(" ∧ "))
         
         return len(r1_atoms) < len(r2_atoms)
-    
+
+    def _stage1_closed(self, T):
+        """
+        Stage 1 (closed mode): Compute closed frequent rules and their generators
+
+        Every frequent itemset has the same coverage as its closure (the
+        largest itemset matched by exactly the same transactions), so the
+        frequent itemsets fall into one class per closed itemset. Only the
+        generators of each class (its minimal itemsets) and the closed
+        itemset itself are needed by Stages 2 and 3. Generators are mined
+        level-wise on bitset tidsets: a generator's subsets are generators,
+        and an itemset is one only if it is matched by fewer transactions
+        than each of its immediate subsets.
+        """
+        te_array, columns = self._encode_transactions(min_count=T)
+        total = len(self.transactions)
+        self.closed_itemsets = []
+
+        min_support = T / total if total else 0
+        print(f"Minimum support: {min_support:.4f} (T={T}, total transactions={total})")
+
+        item_tids = self._atom_tidsets(te_array)
+        frequent_items = [col for col, tid in enumerate(item_tids) if tid.bit_count() >= T]
+
+        # Generators per level: itemset (sorted atom positions) -> (tidset, support).
+        # Atoms in every transaction are only generators of the top class
+        # (alongside the empty itemset) and are not extended.
+        generators = []
+        level = {}
+        for col in frequent_items:
+            support = item_tids[col].bit_count()
+            generators.append(((col,), item_tids[col], support))
+            if support < total:
+                level[(col,)] = (item_tids[col], support)
+
+        while level:
+            by_prefix = {}
+            for itemset in sorted(level):
+                by_prefix.setdefault(itemset[:-1], []).append(itemset)
+
+            next_level = {}
+            for group in by_prefix.values():
+                for pos, first in enumerate(group):
+                    for second in group[pos + 1:]:
+                        candidate = first + (second[-1],)
+                        subsets = [candidate[:drop] + candidate[drop + 1:] for drop in range(len(candidate))]
+                        if any(subset not in level for subset in subsets):
+                            continue
+                        tid = level[first][0] & item_tids[second[-1]]
+                        support = tid.bit_count()
+                        if support < T or support >= min(level[subset][1] for subset in subsets):
+                            continue
+                        next_level[candidate] = (tid, support)
+                        generators.append((candidate, tid, support))
+            level = next_level
+
+        # Group generators by tidset; each group is one closed itemset's class
+        classes = {}
+        for itemset, tid, support in generators:
+            if tid not in classes:
+                closure = tuple(col for col in frequent_items if item_tids[col] & tid == tid)
+                classes[tid] = {'items': closure, 'tid': tid, 'support': support, 'generators': []}
+            classes[tid]['generators'].append(itemset)
+
+        def rule_of(itemset):
+            return " ∧ ".join(sorted(columns[col] for col in itemset))
+
+        def rule_order(entry):
+            # Order of apriori's output: by length, then atoms in sorted order
+            return (len(entry['items']), sorted(columns[col] for col in entry['items']))
+
+        self.closed_itemsets = sorted(classes.values(), key=rule_order)
+        self._closed_by_tid = classes
+        self._item_tids = item_tids
+        self._frequent_items = frequent_items
+        self._rule_of = rule_of
+
+        closed_rules = []
+        nUP = {}
+        for entry in self.closed_itemsets:
+            entry['rule'] = rule_of(entry['items'])
+            closed_rules.append(entry['rule'])
+            nUP[entry['rule']] = entry['support']
+
+        print(f"Generated {len(closed_rules)} closed frequent rules from {len(generators)} generators")
+        return closed_rules, nUP, dict(nUP)
+
+    def _stage2_closed(self, T, K):
+        """
+        Stage 2 (closed mode): Compute reliability per closed class
+
+        A rule is unreliable when some frequent refinement r2 has
+        Conf(r2) < K. Conf grows with |r2_U×P|, so only the refinement with
+        the smallest coverage matters, and that is always a closed itemset.
+        For a closed itemset Z this is the smallest coverage among closed
+        itemsets strictly containing it; the other rules of Z's class have Z
+        itself as a further refinement, with coverage equal to their own.
+        """
+        # Closed supersets have more atoms, so visit larger itemsets first
+        min_refinement = {}
+        for entry in sorted(self.closed_itemsets, key=lambda e: -len(e['items'])):
+            items = set(entry['items'])
+            smallest = None
+            for col in self._frequent_items:
+                if col in items:
+                    continue
+                tid = entry['tid'] & self._item_tids[col]
+                if tid.bit_count() < T:
+                    continue
+                refinement = self._closed_by_tid[tid]
+                coverage = min_refinement.get(tid, refinement['support'])
+                if smallest is None or coverage < smallest:
+                    smallest = coverage
+            if smallest is not None:
+                min_refinement[entry['tid']] = smallest
+
+        rel_rules = []
+        for entry in self.closed_itemsets:
+            support = entry['support']
+            smallest = min_refinement.get(entry['tid'])
+            if smallest is not None:
+                # The closed itemset and every rule of its class share this test
+                reliable = smallest / (support + smallest) >= K
+                entry['reliable_members'] = 'all' if reliable else None
+            else:
+                # Only the closed itemset itself refines the other rules of the
+                # class, with confidence 0.5
+                entry['reliable_members'] = 'all' if K <= 0.5 else 'closed'
+            if entry['reliable_members']:
+                rel_rules.append(entry['rule'])
+
+        print(f"Unreliable closed rules: {len(self.closed_itemsets) - len(rel_rules)}")
+        print(f"Reliable closed rules: {len(rel_rules)}")
+
+        return rel_rules
+
+    def _count_nA(self, rules):
+        """
+        nA of each rule as _stage1 counts it
+
+        _stage1 matches rules against atoms built from each column's own
+        values, so nA can differ from nU×P when a row's values were
+        formatted differently in the transactions (ints next to float or
+        NaN columns). Values collapsed into RARE_VALUE match 'col=<rare>'.
+        """
+        columns = {}
+        atom_masks = {}
+        counts = {}
+        for rule in rules:
+            matched = np.ones(len(self.data), dtype=bool)
+            for atom in rule.split(" ∧ "):
+                if atom not in atom_masks:
+                    col, value = atom.split('=', 1)
+                    if col not in columns:
+                        values = self.data[col]
+                        columns[col] = np.where(values.notna(), values.astype(str), None)
+                        if col in self._collapsed_values:
+                            rare = values.isin(list(self._collapsed_values[col])).to_numpy()
+                            columns[col][rare] = RARE_VALUE
+                    atom_masks[atom] = columns[col] == value
+                matched &= atom_masks[atom]
+            counts[rule] = int(matched.sum())
+        return counts
+
+    def _stage3_closed(self):
+        """
+        Stage 3 (closed mode): Keep the shortest reliable rules of each class
+
+        Rules of one class have equal coverage, so a reliable rule is
+        redundant exactly when a reliable subset of it is in the same class.
+        When the whole class is reliable its generators remain, otherwise
+        only the closed itemset does.
+        """
+        short_rules = []
+        for entry in self.closed_itemsets:
+            if entry['reliable_members'] == 'all':
+                itemsets = entry['generators']
+            elif entry['reliable_members'] == 'closed':
+                itemsets = [entry['items']]
+            else:
+                continue
+            for itemset in itemsets:
+                rule = self._rule_of(itemset)
+                self.nUP[rule] = entry['support']
+                short_rules.append(rule)
+
+        # Same order as _stage3: by nA, ties in apriori order (length, then atoms)
+        self.nA.update(self._count_nA(short_rules))
+        short_rules.sort(key=lambda rule: (self.nA[rule], rule.count(" ∧ "), rule.split(" ∧ ")))
+
+        print(f"Final concise rules: {len(short_rules)}")
+
+        return short_rules
+
+    def _mine_top_k(self, T, K, k):
+        """
+        Find the k reliable, non-redundant rules with the highest coverage
+
+        Uses the class structure of closed mode: the final rules are the
+        generators of reliable classes (or the closed itemset alone when
+        only it is reliable). Generators are popped from a heap in order of
+        decreasing coverage, so once k final rules are known, the coverage
+        of the k-th one becomes the support threshold and everything below
+        it is never generated. Reliability of a class is decided by a
+        depth-first search for a refinement with T ≤ |r2_U×P| and
+        Conf(r2) < K, which stops as soon as one is found.
+        """
+        te_array, columns = self._encode_transactions(min_count=T)
+        item_tids = self._atom_tidsets(te_array)
+        supports = [tid.bit_count() for tid in item_tids]
+        frequent_items = [col for col in range(len(columns)) if supports[col] >= T]
+
+        def rule_of(itemset):
+            return " ∧ ".join(sorted(columns[col] for col in itemset))
+
+        tid_cache = {}
+
+        def tid_of(itemset):
+            tid = tid_cache.get(itemset)
+            if tid is None:
+                tid = item_tids[itemset[0]] if len(itemset) == 1 else tid_of(itemset[:-1]) & item_tids[itemset[-1]]
+                tid_cache[itemset] = tid
+            return tid
+
+        def has_unreliable_refinement(tid, support):
+            # Refinements only lose coverage, so stop descending once one is below T
+            # or once Conf(r2) < K was found
+            stack, seen = [tid], {tid}
+            while stack:
+                node = stack.pop()
+                for col in frequent_items:
+                    child = node & item_tids[col]
+                    if child == node or child in seen:
+                        continue
+                    child_support = child.bit_count()
+                    if child_support < T:
+                        continue
+                    if child_support / (support + child_support) < K:
+                        return True
+                    seen.add(child)
+                    stack.append(child)
+            return False
+
+        found = []  # (coverage, atoms, rule)
+        best = []  # min-heap of the k highest coverages found so far
+        explored = []
+        class_status = {}  # tidset -> reliable members: 'all', 'closed' or None
+        threshold = T
+        heap = [(-supports[col], (col,)) for col in frequent_items]
+        heapq.heapify(heap)
+
+        while heap:
+            negative_support, itemset = heapq.heappop(heap)
+            support = -negative_support
+            if support < threshold:
+                break
+            explored.append(rule_of(itemset))
+            tid = tid_of(itemset)
+
+            if tid not in class_status:
+                has_refinement = any(T <= (tid & item_tids[col]).bit_count() < support for col in frequent_items)
+                if has_refinement:
+                    class_status[tid] = None if has_unreliable_refinement(tid, support) else 'all'
+                else:
+                    class_status[tid] = 'all' if K <= 0.5 else 'closed'
+                if class_status[tid] == 'closed':
+                    closure = tuple(col for col in frequent_items if item_tids[col] & tid == tid)
+                    found.append((support, len(closure), rule_of(closure)))
+                    heapq.heappush(best, support)
+            if class_status[tid] == 'all':
+                found.append((support, len(itemset), rule_of(itemset)))
+                heapq.heappush(best, support)
+
+            # Raise the threshold to the k-th best coverage (ties are kept)
+            while len(best) > k:
+                heapq.heappop(best)
+            if len(best) == k:
+                threshold = max(threshold, best[0])
+
+            # Extend generators only: an itemset is one when it covers fewer
+            # transactions than each of its immediate subsets
+            for col in frequent_items:
+                if col <= itemset[-1]:
+                    continue
+                candidate = itemset + (col,)
+                candidate_support = tid_of(candidate).bit_count()
+                if candidate_support < threshold:
+                    continue
+                subsets = [candidate[:drop] + candidate[drop + 1:] for drop in range(len(candidate))]
+                if all(candidate_support < tid_of(subset).bit_count() for subset in subsets):
+                    heapq.heappush(heap, (-candidate_support, candidate))
+
+        found.sort(key=lambda f: (-f[0], f[1], f[2].split(" ∧ ")))
+
+        self.freq_rules = explored
+        self.rel_rules = [rule for _, _, rule in found]
+        self.nUP = {rule: support for support, _, rule in found}
+        self.nA = self._count_nA(self.rel_rules)
+
+        # Same order as _stage3: by nA, ties in apriori order (length, then atoms)
+        top = [rule for _, _, rule in found[:k]]
+        top.sort(key=lambda rule: (self.nA[rule], rule.count(" ∧ "), rule.split(" ∧ ")))
+
+        print(f"Explored {len(explored)} generators, found {len(found)} reliable rules")
+        print(f"Final concise rules: {len(top)}")
+
+        return top
+
     def display_results(self, rules_type="final"):
         """Display rules with their statistics"""
         if rules_type == "frequent":
@@ -320,6 +904,237 @@ class RhapsodyAlgorithm:
         print(f"Results saved to {output_path}")
 
 
+class SlidingWindowMiner:
+    """
+    Incremental RHAPSODY over a window of the last ``window`` time buckets
+    
+    Each bucket keeps the coverage of every itemset occurring in it (all
+    atom subsets of its distinct rows, so this suits the few attribute
+    columns of access logs). Window coverage is the sum over its buckets
+    and is updated by adding the new bucket and subtracting the expired
+    one; only itemsets occurring in those two buckets change.
+    
+    Stage 2 depends on the smallest coverage among a rule's frequent
+    refinements, kept per frequent rule and recomputed (longest rules
+    first, through their one-atom refinements) only for changed rules.
+    Stage 3 marks a reliable rule redundant when a reliable rule with one
+    atom less has the same coverage (any shorter equivalent rule implies
+    one); it is re-checked for changed rules and their one-atom
+    refinements.
+    
+    nA is counted the same way, as its own window sum, since it can differ
+    from coverage (see RhapsodyAlgorithm._count_nA); final rules are
+    ordered by it like Stage 3 orders them.
+    """
+    
+    def __init__(self, T, K, window, columns):
+        """
+        Initialize the SlidingWindowMiner
+        
+        Args:
+            T (int): Support threshold per window
+            K (float): Reliability threshold (0-1)
+            window (int): Buckets per window
+            columns (list): Attribute columns to mine
+        """
+        if window < 1:
+            raise ValueError("The window needs at least one bucket")
+        self.T = T
+        self.K = K
+        self.window = window
+        self.columns = list(columns)
+        self.labels = deque()
+        self._buckets = deque()  # (rows, Counter of rule -> coverage, Counter of rule -> nA) per bucket
+        self.total = 0
+        self.counts = {}  # rule -> coverage in the window
+        self.na_counts = {}  # rule -> nA in the window
+        self._frequent = set()
+        self._refinements = {}  # frequent rule -> frequent rules with one more atom
+        self._min_refinement = {}  # frequent rule -> smallest refinement coverage (None if none)
+        self._reliable = set()
+        self._final = set()
+    
+    @staticmethod
+    def _atoms(rule):
+        return rule.split(" ∧ ")
+    
+    def _one_atom_less(self, rule):
+        atoms = self._atoms(rule)
+        if len(atoms) == 1:
+            return []
+        return [" ∧ ".join(atoms[:drop] + atoms[drop + 1:]) for drop in range(len(atoms))]
+    
+    def count_bucket(self, rows):
+        """
+        Coverage and nA of every itemset in a bucket's rows
+        
+        Coverage uses atoms formatted as in _encode_transactions: a row of
+        DataFrame.apply(axis=1) holds the common dtype of the columns, so
+        e.g. ints next to a float or NaN column become floats. nA matches
+        each column's own values, as RhapsodyAlgorithm._count_nA does.
+        
+        Args:
+            rows (pd.DataFrame): The bucket's rows (mined columns)
+            
+        Returns:
+            tuple: (Counter of rule -> rows it covers, Counter of rule -> nA)
+        """
+        if len(rows) == 0:
+            return Counter(), Counter()
+        frame = rows[self.columns]
+        row_values = frame.to_numpy()
+        transaction_atoms = pd.DataFrame({
+            col: [f"{col}={value}" if pd.notna(value) else None for value in row_values[:, pos]]
+            for pos, col in enumerate(self.columns)
+        })
+        column_atoms = pd.DataFrame({
+            col: np.where(frame[col].notna(), col + '=' + frame[col].astype(str), None)
+            for col in self.columns
+        })
+        counts = self._itemset_counts(transaction_atoms)
+        if column_atoms.equals(transaction_atoms):
+            return counts, counts
+        return counts, self._itemset_counts(column_atoms)
+    
+    @staticmethod
+    def _itemset_counts(atom_frame):
+        """Rows covered by every itemset of a frame of atoms (None for missing values)"""
+        counts = Counter()
+        for row_atoms, weight in atom_frame.value_counts(dropna=False, sort=False).items():
+            if not isinstance(row_atoms, tuple):
+                row_atoms = (row_atoms,)
+            # Sorted atoms give every subset in rule form directly
+            atoms = sorted(atom for atom in row_atoms if isinstance(atom, str))
+            for size in range(1, len(atoms) + 1):
+                for itemset in combinations(atoms, size):
+                    counts[" ∧ ".join(itemset)] += weight
+        return counts
+    
+    @staticmethod
+    def _add_counts(window_counts, bucket_counts, sign):
+        for rule, count in bucket_counts.items():
+            remaining = window_counts.get(rule, 0) + sign * count
+            if remaining:
+                window_counts[rule] = remaining
+            else:
+                del window_counts[rule]
+    
+    def slide(self, label, rows):
+        """
+        Add a bucket and expire the oldest one beyond the window
+        
+        Args:
+            label: Bucket label (e.g. its start time)
+            rows (pd.DataFrame): The bucket's rows
+            
+        Returns:
+            list: Final rules of the new window
+        """
+        added, added_na = self.count_bucket(rows)
+        self.labels.append(label)
+        self._buckets.append((len(rows), added, added_na))
+        self.total += len(rows)
+        self._add_counts(self.counts, added, 1)
+        self._add_counts(self.na_counts, added_na, 1)
+        changed = set(added)
+        
+        if len(self._buckets) > self.window:
+            self.labels.popleft()
+            expired_rows, expired, expired_na = self._buckets.popleft()
+            self.total -= expired_rows
+            self._add_counts(self.counts, expired, -1)
+            self._add_counts(self.na_counts, expired_na, -1)
+            changed.update(expired)
+        
+        self._update(changed)
+        return self.final_rules
+    
+    def _update(self, changed):
+        """Re-derive frequency, reliability and redundancy of changed rules"""
+        T, K = self.T, self.K
+        
+        # Stage 1: frequency and the one-atom refinement links (shorter rules
+        # first, so a new frequent rule finds its parents already linked)
+        for rule in sorted(changed, key=lambda rule: len(self._atoms(rule))):
+            frequent = self.counts.get(rule, 0) >= T
+            if frequent == (rule in self._frequent):
+                continue
+            if frequent:
+                self._frequent.add(rule)
+                self._refinements.setdefault(rule, set())
+                for parent in self._one_atom_less(rule):
+                    self._refinements[parent].add(rule)
+            else:
+                self._frequent.discard(rule)
+                self._refinements.pop(rule, None)
+                self._min_refinement.pop(rule, None)
+                self._reliable.discard(rule)
+                self._final.discard(rule)
+                for parent in self._one_atom_less(rule):
+                    if parent in self._refinements:
+                        self._refinements[parent].discard(rule)
+        
+        # Stage 2: every subset of a changed rule is itself a changed rule (it
+        # occurs in the same bucket rows), so only changed rules need their
+        # smallest refinement recomputed
+        affected = sorted((rule for rule in changed if rule in self._frequent),
+                          key=lambda rule: -len(self._atoms(rule)))
+        for rule in affected:
+            smallest = None
+            for refinement in self._refinements[rule]:
+                coverage = self.counts[refinement]
+                below = self._min_refinement.get(refinement)
+                if below is not None and below < coverage:
+                    coverage = below
+                if smallest is None or coverage < smallest:
+                    smallest = coverage
+            self._min_refinement[rule] = smallest
+            
+            coverage = self.counts[rule]
+            if smallest is None or smallest / (coverage + smallest) >= K:
+                self._reliable.add(rule)
+            else:
+                self._reliable.discard(rule)
+        
+        # Stage 3: a changed rule can change the redundancy of its one-atom refinements
+        recheck = set(affected)
+        for rule in affected:
+            recheck.update(self._refinements[rule])
+        for rule in recheck:
+            coverage = self.counts[rule]
+            redundant = any(parent in self._reliable and self.counts[parent] == coverage
+                            for parent in self._one_atom_less(rule))
+            if rule in self._reliable and not redundant:
+                self._final.add(rule)
+            else:
+                self._final.discard(rule)
+    
+    @staticmethod
+    def _mining_order(rule):
+        # Order of apriori's output: by length, then atoms in sorted order
+        atoms = rule.split(" ∧ ")
+        return (len(atoms), atoms)
+    
+    @property
+    def freq_rules(self):
+        return sorted(self._frequent, key=self._mining_order)
+    
+    @property
+    def rel_rules(self):
+        return sorted(self._reliable, key=self._mining_order)
+    
+    @property
+    def final_rules(self):
+        """Final rules ordered like run_algorithm (by nA, then mining order)"""
+        return sorted(self._final, key=lambda rule: (self.na_counts.get(rule, 0), self._mining_order(rule)))
+    
+    def statistics(self):
+        """nUP and nA of the window's frequent rules, as run_algorithm computes them"""
+        nUP = {rule: self.counts[rule] for rule in self._frequent}
+        nA = {rule: self.na_counts.get(rule, 0) for rule in self._frequent}
+        return nUP, nA
+
+
 # Standalone functions for backward compatibility
 def rhapsody_algorithm(data_path, T, K, selected_columns=None):
     """
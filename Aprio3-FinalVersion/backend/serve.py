@@ -0,0 +1,111 @@
+"""
+Multi-Worker Server for RHAPSODY API
+Author: Ludjina
+Description: Pre-forked worker processes serving api_server from one shared, memory-mapped compiled policy
+
+Usage:
+    python serve.py --workers 4 --port 5000 [--policy results/latest_results.json]
+
+Every worker maps the compiled policy in --shared-dir read-only, so adding
+workers adds evaluation throughput without another copy of the policy.
+When a mining job finishes in any worker, the new policy is compiled into
+the same directory and all workers switch to it within a second.
+
+api_server:app can also run under another WSGI server (e.g.
+``gunicorn -w 4 api_server:app``) with RHAPSODY_SHARED_POLICY_DIR set.
+Each mining job is claimed and run by one worker; the others read its
+status from the shared job records and pass cancellations on to it.
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def compile_policy_artifact(results_file, shared_dir):
+    """Compile a results artifact into the shared directory as the next version"""
+    from policy_store import load_policy_artifact
+    from shared_policy import publish_compiled_policy
+
+    evaluator, statistics = load_policy_artifact(results_file)
+    publish_compiled_policy(evaluator, shared_dir, statistics)
+
+
+def _serve_worker(host, port, fd):
+    """Run one worker: a threaded WSGI server on the inherited listening socket"""
+    from werkzeug.serving import make_server
+    import api_server
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    server = make_server(host, port, api_server.app, threaded=True, fd=fd)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the RHAPSODY API with several worker processes')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--shared-dir', default=os.path.join('results', 'compiled'),
+                        help='Directory holding the shared compiled policy')
+    parser.add_argument('--policy', default=None,
+                        help='Results JSON to compile and serve at startup')
+    args = parser.parse_args()
+
+    os.environ['RHAPSODY_SHARED_POLICY_DIR'] = args.shared_dir
+    if args.policy:
+        compile_policy_artifact(args.policy, args.shared_dir)
+
+    # Imported before forking so workers share the loaded modules copy-on-write
+    from werkzeug.serving import get_sockaddr, select_address_family
+    import api_server  # noqa: F401
+
+    if 'fork' not in multiprocessing.get_all_start_methods() or args.workers <= 1:
+        if args.workers > 1:
+            print("Multiple workers need fork(); starting a single worker instead")
+        api_server.app.run(host=args.host, port=args.port, threaded=True)
+        return
+
+    family = select_address_family(args.host, args.port)
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(get_sockaddr(args.host, args.port, family))
+    listener.listen(128)
+    listener.set_inheritable(True)
+
+    context = multiprocessing.get_context('fork')
+
+    def start_worker():
+        process = context.Process(target=_serve_worker, args=(args.host, args.port, listener.fileno()))
+        process.start()
+        return process
+
+    workers = [start_worker() for _ in range(args.workers)]
+    print(f"Serving RHAPSODY API on {args.host}:{args.port} with {args.workers} workers "
+          f"(shared policy: {args.shared_dir})")
+
+    def stop(signum, frame):
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            process.join(timeout=5)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Replace workers that die so capacity stays constant
+    while True:
+        time.sleep(1)
+        for position, process in enumerate(workers):
+            if not process.is_alive():
+                print(f"Worker {process.pid} exited with code {process.exitcode}; restarting")
+                workers[position] = start_worker()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+"""
+Shared Compiled Policy for RHAPSODY Multi-Worker Serving
+Author: Ludjina
+Description: Compiled policies stored as memory-mapped arrays that every worker process maps read-only
+"""
+
+import contextlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from policy_evaluator import PolicyEvaluator
+from policy_store import load_policy_artifact
+
+try:
+    import fcntl
+except ImportError:  # Windows: multi-worker serving needs fork(), so one publisher
+    fcntl = None
+
+
+POINTER_FILE = 'CURRENT'
+PUBLISH_LOCK_FILE = '.publish.lock'
+KEEP_VERSIONS = 2
+
+
+class _MappedStrings(Sequence):
+    """Read-only list of strings backed by a memory-mapped unicode array"""
+
+    def __init__(self, array: np.ndarray):
+        self._array = array
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [str(value) for value in self._array[position]]
+        return str(self._array[position])
+
+    def __iter__(self):
+        return (str(value) for value in self._array)
+
+
+class _SortedLookup(Mapping):
+    """
+    Read-only mapping over a sorted, memory-mapped key array
+
+    Lookups use binary search, so no per-process hash table is built.
+    Without ``values`` a key maps to its position (used for value codes);
+    entries whose value is -1 are treated as missing.
+    """
+
+    def __init__(self, keys: np.ndarray, values: Optional[np.ndarray] = None):
+        self._keys = keys
+        self._values = values
+
+    def _position(self, key) -> int:
+        if not len(self._keys):
+            raise KeyError(key)
+        position = int(np.searchsorted(self._keys, key))
+        if position >= len(self._keys) or self._keys[position] != key:
+            raise KeyError(key)
+        return position
+
+    def __getitem__(self, key):
+        position = self._position(key)
+        if self._values is None:
+            return position
+        value = int(self._values[position])
+        if value < 0:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for position, key in enumerate(self._keys):
+            if self._values is None or self._values[position] >= 0:
+                yield str(key)
+
+    def __len__(self):
+        if self._values is None:
+            return len(self._keys)
+        return int((self._values >= 0).sum())
+
+
+class SharedPolicyEvaluator(PolicyEvaluator):
+    """
+    PolicyEvaluator over a compiled policy directory
+
+    Rule strings, the rule code matrix, attribute value dictionaries and the
+    final rules' nUP/nA counts are memory-mapped read-only. Worker processes
+    mapping the same directory therefore share one copy through the page
+    cache instead of each parsing and compiling the policy.
+    """
+
+    def __init__(self, policy_dir: str):
+        """
+        Map a compiled policy written by export_compiled_policy
+
+        Args:
+            policy_dir (str): Version directory of the compiled policy
+        """
+        with open(os.path.join(policy_dir, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+
+        def mapped(name):
+            return np.load(os.path.join(policy_dir, f'{name}.npy'), mmap_mode='r')
+
+        super().__init__(_MappedStrings(mapped('rules')))
+        self.policy_dir = policy_dir
+        self.set_available_attributes(self.meta['available_attributes'])
+
+        rule_keys = mapped('rule_keys')
+        self.rule_statistics = {
+            'nUP': _SortedLookup(rule_keys, mapped('nup')),
+            'nA': _SortedLookup(rule_keys, mapped('na'))
+        }
+
+        values = [mapped(f'values_{pos}') for pos in range(len(self.meta['attributes']))]
+        self._rule_index = {
+            'attributes': list(self.meta['attributes']),
+            'values': values,
+            'value_codes': [_SortedLookup(attr_values) for attr_values in values],
+            'codes': mapped('codes')
+        }
+        self._rule_index_source = self.rules
+
+    def get_statistics(self) -> Dict:
+        """Mining statistics in the shape of RhapsodyAlgorithm.get_rule_statistics"""
+        statistics = dict(self.meta['statistics'])
+        statistics['rules'] = {'final': self.rules}
+        statistics['nUP'] = self.rule_statistics['nUP']
+        statistics['nA'] = self.rule_statistics['nA']
+        return statistics
+
+
+def _string_array(values) -> np.ndarray:
+    """Fixed-width unicode array (at least one character wide)"""
+    values = [str(value) for value in values]
+    width = max((len(value) for value in values), default=1) or 1
+    return np.array(values, dtype=f'<U{width}')
+
+
+def read_current_version(shared_dir: str) -> Optional[str]:
+    """Name of the version directory the shared pointer refers to, if any"""
+    try:
+        with open(os.path.join(shared_dir, POINTER_FILE), 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def export_compiled_policy(evaluator: PolicyEvaluator, shared_dir: str, version: int,
+                           statistics: Dict = None, source: Dict = None) -> str:
+    """
+    Compile a policy into ``shared_dir`` and make it the current version
+
+    The arrays are written to a new version directory first; the pointer
+    file is then replaced atomically, so readers see either the old or the
+    new version. Only the newest KEEP_VERSIONS versions are kept (already
+    mapped files stay valid after deletion).
+
+    Args:
+        evaluator (PolicyEvaluator): Evaluator holding the policy
+        shared_dir (str): Directory shared by all worker processes
+        version (int): Policy version number workers should report
+        statistics (Dict): Mining statistics (counts and working columns are kept)
+        source (Dict): Description of the artifact compiled, stored in the metadata
+
+    Returns:
+        str: Path of the new version directory
+    """
+    os.makedirs(shared_dir, exist_ok=True)
+    index = evaluator._get_rule_index()
+    statistics = statistics or {}
+
+    version_name = f'policy-{version:08d}-{time.time_ns()}'
+    version_dir = os.path.join(shared_dir, version_name)
+    tmp_dir = version_dir + '.tmp'
+    os.makedirs(tmp_dir)
+
+    rules = _string_array(evaluator.rules)
+    order = np.argsort(rules, kind='stable')
+    nUP = evaluator.rule_statistics.get('nUP', {})
+    nA = evaluator.rule_statistics.get('nA', {})
+
+    arrays = {
+        'rules': rules,
+        'codes': np.ascontiguousarray(index['codes'], dtype=np.int32),
+        'rule_keys': rules[order],
+        'nup': np.array([nUP.get(evaluator.rules[pos], -1) for pos in order], dtype=np.int64),
+        'na': np.array([nA.get(evaluator.rules[pos], -1) for pos in order], dtype=np.int64)
+    }
+    for pos, attr_values in enumerate(index['values']):
+        arrays[f'values_{pos}'] = _string_array(attr_values)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+
+    meta = {
+        'version': version,
+        'attributes': list(index['attributes']),
+        'available_attributes': sorted(evaluator.available_attributes),
+        'statistics': {
+            'total_transactions': statistics.get('total_transactions', 0),
+            'frequent_rules_count': statistics.get('frequent_rules_count', 0),
+            'reliable_rules_count': statistics.get('reliable_rules_count', 0),
+            'final_rules_count': statistics.get('final_rules_count', len(evaluator.rules)),
+            'working_columns': statistics.get('working_columns')
+        },
+        'source': source
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_dir, version_dir)
+
+    pointer_tmp = os.path.join(shared_dir, f'{POINTER_FILE}.{os.getpid()}.tmp')
+    with open(pointer_tmp, 'w') as f:
+        f.write(version_name)
+    os.replace(pointer_tmp, os.path.join(shared_dir, POINTER_FILE))
+
+    versions = sorted(name for name in os.listdir(shared_dir)
+                      if name.startswith('policy-') and not name.endswith('.tmp'))
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(shared_dir, name), ignore_errors=True)
+
+    print(f"Compiled policy version {version} written to {version_dir}")
+    return version_dir
+
+
+@contextlib.contextmanager
+def _publish_lock(shared_dir: str):
+    """Exclusive lock over version allocation and export, shared by all processes"""
+    os.makedirs(shared_dir, exist_ok=True)
+    with open(os.path.join(shared_dir, PUBLISH_LOCK_FILE), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _last_exported_version(shared_dir: str) -> int:
+    """Highest version compiled into ``shared_dir`` (the newest is never pruned)"""
+    versions = [0]
+    for name in os.listdir(shared_dir):
+        parts = name.split('-')
+        if name.startswith('policy-') and len(parts) > 1 and parts[1].isdigit():
+            versions.append(int(parts[1]))
+    return max(versions)
+
+
+def publish_compiled_policy(evaluator: PolicyEvaluator, shared_dir: str, statistics: Dict = None,
+                            source: Dict = None) -> int:
+    """
+    Compile a policy into ``shared_dir`` as the next version
+
+    The version number is allocated and the policy exported under one
+    lock, so processes publishing at the same time get distinct,
+    increasing versions and the pointer never moves back to an older one.
+
+    Returns:
+        int: The version published
+    """
+    with _publish_lock(shared_dir):
+        version = _last_exported_version(shared_dir) + 1
+        export_compiled_policy(evaluator, shared_dir, version, statistics, source=source)
+    return version
+
+
+def withdraw_compiled_policy(shared_dir: str):
+    """Remove the shared pointer so workers stop serving the compiled policy"""
+    try:
+        os.remove(os.path.join(shared_dir, POINTER_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def _artifact_signature(results_file: str) -> Dict:
+    stat = os.stat(results_file)
+    return {'path': os.path.abspath(results_file), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_compiled_artifact(results_file: str, cache_dir: str) -> Tuple[PolicyEvaluator, Dict]:
+    """
+    Load a results artifact through a compiled, memory-mapped cache
+
+    If ``cache_dir`` holds a compiled copy of exactly this artifact (same
+    path, size and modification time) it is mapped directly, skipping JSON
+    parsing and index compilation. Otherwise the artifact is loaded and
+    compiled, and the cache is refreshed for the next start.
+
+    Args:
+        results_file (str): JSON written by RhapsodyAlgorithm.save_results
+        cache_dir (str): Directory for the compiled copy
+
+    Returns:
+        Tuple[PolicyEvaluator, Dict]: Evaluator ready to publish and its statistics
+    """
+    signature = _artifact_signature(results_file)
+    current = read_current_version(cache_dir)
+    if current:
+        try:
+            evaluator = SharedPolicyEvaluator(os.path.join(cache_dir, current))
+            if evaluator.meta.get('source') == signature:
+                return evaluator, evaluator.get_statistics()
+        except (OSError, ValueError, KeyError):
+            pass
+
+    evaluator, statistics = load_policy_artifact(results_file)
+    try:
+        export_compiled_policy(evaluator, cache_dir, 1, statistics, source=signature)
+    except OSError as e:
+        print(f"Could not cache compiled policy in {cache_dir}: {str(e)}")
+    return evaluator, statistics
+
+
+class SharedPolicyWatcher:
+    """
+    Keeps a process's PolicyStore in sync with a shared compiled policy
+
+    ``refresh()`` is called on the request path. It reads the pointer file
+    at most once per ``interval`` seconds and only takes a lock when a new
+    version has to be mapped and published.
+    """
+
+    def __init__(self, shared_dir: str, policy_store, interval: float = 1.0):
+        """
+        Initialize the SharedPolicyWatcher
+
+        Args:
+            shared_dir (str): Directory written by export_compiled_policy
+            policy_store (PolicyStore): Store to publish mapped versions into
+            interval (float): Seconds between pointer checks
+        """
+        self.shared_dir = shared_dir
+        self.policy_store = policy_store
+        self.interval = interval
+        self._loaded_name = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False):
+        """Map and publish the shared policy if its pointer changed"""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        self._next_check = now + self.interval
+
+        name = read_current_version(self.shared_dir)
+        if name == self._loaded_name:
+            return
+
+        with self._lock:
+            if name == self._loaded_name:
+                return
+            if name is None:
+                # Policy withdrawn (e.g. /api/reset on another worker)
+                self.policy_store.clear()
+            else:
+                evaluator = SharedPolicyEvaluator(os.path.join(self.shared_dir, name))
+                if evaluator.meta['version'] > self.policy_store.last_version():
+                    self.policy_store.publish(evaluator, evaluator.get_statistics(),
+                                              version=evaluator.meta['version'])
+            self._loaded_name = name
@@ -36,13 +36,30 @@ const RhapsodyInterface = () => {
   // API base URL - adjust if needed
   const API_BASE = '/api';
 
-  // Poll mining status
+  // Follow mining status: pushed over Server-Sent Events, polling as fallback
   useEffect(() => {
     let interval;
+    let events;
     if (miningStatus.is_running) {
-      interval = setInterval(checkMiningStatus, 1000);
+      if (window.EventSource) {
+        events = new EventSource(`${API_BASE}/status/stream`);
+        events.addEventListener('status', (event) => {
+          const status = JSON.parse(event.data);
+          setMiningStatus(status);
+          if (status.complete && !status.error) {
+            fetchRules();
+          }
+        });
+        events.onerror = () => {
+          events.close();
+          interval = setInterval(checkMiningStatus, 1000);
+        };
+      } else {
+        interval = setInterval(checkMiningStatus, 1000);
+      }
     }
     return () => {
+      if (events) events.close();
       if (interval) clearInterval(interval);
     };
   }, [miningStatus.is_running]);